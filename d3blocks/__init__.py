@@ -1,13 +1,3 @@
-from d3blocks.d3blocks import D3Blocks
-from datazets import get as import_example
-from d3blocks.utils import (
-    normalize,
-    scale,
-    adjmat2vec,
-    vec2adjmat,
-    convert_flare2source_target,
-    )
-
 __author__ = 'Erdogan Taskesen'
 __email__ = 'erdogant@gmail.com'
 __version__ = '1.8.3'
@@ -24,6 +14,38 @@ _log_handler.setLevel(logging.DEBUG)
 _logger.addHandler(_log_handler)
 _logger.propagate = False
 
+# Public objects are imported on first access to keep "import d3blocks" fast.
+import importlib
+
+_LAZY_OBJECTS = {
+    'D3Blocks': ('d3blocks.d3blocks', 'D3Blocks'),
+    'import_example': ('datazets', 'get'),
+    'normalize': ('d3blocks.utils', 'normalize'),
+    'scale': ('d3blocks.utils', 'scale'),
+    'adjmat2vec': ('d3blocks.utils', 'adjmat2vec'),
+    'vec2adjmat': ('d3blocks.utils', 'vec2adjmat'),
+    'convert_flare2source_target': ('d3blocks.utils', 'convert_flare2source_target'),
+    }
+_LAZY_MODULES = ['d3blocks', 'utils', 'render', 'profiler', 'cache', 'serialize', 'tables', 'edges', 'events', 'colors', 'benchmarks']
+
+__all__ = [*_LAZY_OBJECTS.keys()]
+
+
+def __getattr__(name):
+    if name in _LAZY_OBJECTS:
+        module, attr = _LAZY_OBJECTS[name]
+        value = getattr(importlib.import_module(module), attr)
+        # Store the object so that __getattr__ is only used once per name.
+        globals()[name] = value
+        return value
+    if name in _LAZY_MODULES:
+        return importlib.import_module('%s.%s' %(__name__, name))
+    raise AttributeError('module %r has no attribute %r' %(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_OBJECTS) | set(_LAZY_MODULES))
+
 
 # module level doc-string
 __doc__ = """
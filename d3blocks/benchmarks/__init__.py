@@ -0,0 +1,8 @@
+"""Benchmarks of the d3blocks charts with synthetic data.
+
+Run from the command line:
+
+    python -m d3blocks.benchmarks --sizes 1e2 1e3 1e4 --save baseline.json
+    python -m d3blocks.benchmarks --sizes 1e2 1e3 1e4 --baseline baseline.json
+
+"""
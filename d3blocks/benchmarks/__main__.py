@@ -0,0 +1,5 @@
+"""Run the benchmarks: python -m d3blocks.benchmarks --help"""
+import sys
+from d3blocks.benchmarks.benchmark import main
+
+sys.exit(main())
@@ -0,0 +1,280 @@
+"""Benchmark every block at scaled input sizes.
+
+The charts are created with D3Blocks(profile=True) so that the time, peak memory and html size are available per
+pipeline stage. Results are stored as JSON and can be compared against a stored baseline to detect regressions.
+
+Library     : d3blocks
+Author      : E.Taskesen
+Mail        : erdogant@gmail.com
+Github      : https://github.com/d3blocks/d3blocks
+License     : GPL3
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import logging
+import numpy as np
+import pandas as pd
+
+from d3blocks import D3Blocks
+from d3blocks import render
+from d3blocks.benchmarks import generators
+
+logger = logging.getLogger(__name__)
+
+# Full range of input sizes (--all-sizes).
+SIZES = [100, 1000, 10000, 100000, 1000000]
+
+
+# %% Blocks
+def _chord(d3, n, filepath):
+    d3.chord(generators.edges(n), filepath=filepath, showfig=False)
+
+
+def _sankey(d3, n, filepath):
+    d3.sankey(generators.edges(n, acyclic=True), filepath=filepath, showfig=False)
+
+
+def _heatmap(d3, n, filepath):
+    df = generators.adjmat(n)
+    d3.heatmap(df, color=[str(i % 5) for i in range(df.shape[0])], filepath=filepath, showfig=False)
+
+
+def _matrix(d3, n, filepath):
+    d3.matrix(generators.adjmat(n), filepath=filepath, showfig=False)
+
+
+def _radialgraph(d3, n, filepath):
+    d3.radialgraph(generators.edges(n), filepath=filepath, showfig=False)
+
+
+def _scatter(d3, n, filepath):
+    df = generators.points(n)
+    d3.scatter(df['x'].values, df['y'].values, color=df['label'].values, size=df['size'].values, filepath=filepath, showfig=False)
+
+
+def _violin(d3, n, filepath):
+    df = generators.points(n)
+    d3.violin(x=df['label'].values, y=df['y'].values, filepath=filepath, showfig=False)
+
+
+def _movingbubbles(d3, n, filepath):
+    d3.movingbubbles(generators.events(n), filepath=filepath, showfig=False)
+
+
+def _timeseries(d3, n, filepath):
+    d3.timeseries(generators.wide(n), filepath=filepath, showfig=False)
+
+
+def _tree(d3, n, filepath):
+    d3.tree(generators.tree_edges(n), filepath=filepath, showfig=False)
+
+
+def _treemap(d3, n, filepath):
+    d3.treemap(generators.hierarchy(n), filepath=filepath, showfig=False)
+
+
+def _circlepacking(d3, n, filepath):
+    d3.circlepacking(generators.tree_edges(n), filepath=filepath, showfig=False)
+
+
+# Block name -> function that creates the chart for n rows.
+BLOCKS = {
+    'chord': _chord,
+    'sankey': _sankey,
+    'heatmap': _heatmap,
+    'matrix': _matrix,
+    'radialgraph': _radialgraph,
+    'scatter': _scatter,
+    'violin': _violin,
+    'movingbubbles': _movingbubbles,
+    'timeseries': _timeseries,
+    'tree': _tree,
+    'treemap': _treemap,
+    'circlepacking': _circlepacking,
+}
+
+
+# %% Run
+def run(blocks=None, sizes=[100, 1000, 10000], repeat=1, outdir=None, logger=logger):
+    """Run the benchmarks.
+
+    Parameters
+    ----------
+    blocks : list of str, (default: None)
+        Blocks to benchmark. None runs all blocks in BLOCKS.
+    sizes : list of int, (default: [100, 1000, 10000])
+        Number of input rows. Sizes up to 1e6 are supported but can take long for the slower blocks.
+    repeat : int, (default: 1)
+        Number of repetitions. The fastest repetition is reported.
+    outdir : str, (default: None)
+        Directory to write the html files. None uses a temporary directory.
+
+    Returns
+    -------
+    dict
+        'meta': Versions and platform.
+        'results': List with the profile for each block and size.
+
+    """
+    if blocks is None: blocks = [*BLOCKS.keys()]
+    tmpdir = None
+    if outdir is None:
+        tmpdir = tempfile.TemporaryDirectory(prefix='d3blocks_benchmark_')
+        outdir = tmpdir.name
+    os.makedirs(outdir, exist_ok=True)
+    # Compile the templates up front so that the first block is not penalized.
+    render.warmup(logger=None)
+
+    results = []
+    try:
+        for block in blocks:
+            for n in sizes:
+                n = int(n)
+                best = None
+                for _ in range(repeat):
+                    d3 = D3Blocks(verbose='error', support=False, profile=True)
+                    try:
+                        BLOCKS[block](d3, n, os.path.join(outdir, '%s_%d.html' %(block, n)))
+                    except Exception as e:
+                        if logger is not None: logger.error('[%s] with [%d] rows failed: %s' %(block, n, e))
+                        best = {'error': str(e)}
+                        break
+                    if (best is None) or (d3.last_profile['time'] < best['time']):
+                        best = d3.last_profile
+                result = {'block': block, 'size': n}
+                result.update({key: value for key, value in best.items() if key != 'chart'})
+                results.append(result)
+                if logger is not None and 'error' not in result:
+                    logger.info('[%s] rows: %d, time: %.3f sec, peak memory: %.1f MB, html: %.1f KB' %(block, n, result['time'], result['peak_memory'] / 1e6, result['payload_size'] / 1e3))
+    finally:
+        if tmpdir is not None: tmpdir.cleanup()
+
+    return {'meta': _meta(), 'results': results}
+
+
+def _meta():
+    import d3blocks
+    return {'d3blocks': d3blocks.__version__,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+
+
+# %% Report
+def to_frame(report):
+    """Convert the results into a DataFrame with one row per block, size and stage."""
+    rows = []
+    for result in report['results']:
+        if 'error' in result:
+            rows.append({'block': result['block'], 'size': result['size'], 'stage': 'error'})
+            continue
+        rows.append({'block': result['block'], 'size': result['size'], 'stage': 'total', 'calls': 1, 'time': result['time'], 'self_time': result['time'], 'peak_memory': result['peak_memory'], 'payload_size': result['payload_size']})
+        for stage, record in result['stages'].items():
+            rows.append({'block': result['block'], 'size': result['size'], 'stage': stage, **record})
+    return pd.DataFrame(rows)
+
+
+def save(report, filepath):
+    """Save the report as JSON."""
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+def load(filepath):
+    """Load a report from JSON."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# %% Regression
+def compare(report, baseline, tolerance=0.25, min_time=0.05):
+    """Compare a report against a baseline.
+
+    Parameters
+    ----------
+    report : dict
+        Output of run().
+    baseline : dict
+        Output of run() that is used as reference.
+    tolerance : float, (default: 0.25)
+        Allowed relative increase of the time, peak memory and html size.
+    min_time : float, (default: 0.05)
+        Time differences below this number of seconds are ignored because they are dominated by noise.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per block, size and metric with the baseline value, the new value, the ratio and whether it is a
+        regression.
+
+    """
+    reference = {(r['block'], r['size']): r for r in baseline['results'] if 'error' not in r}
+    rows = []
+    for result in report['results']:
+        key = (result['block'], result['size'])
+        if (key not in reference) or ('error' in result): continue
+        for metric in ['time', 'peak_memory', 'payload_size']:
+            old, new = reference[key].get(metric), result.get(metric)
+            if old is None or new is None: continue
+            ratio = new / old if old > 0 else np.inf
+            regression = ratio > (1 + tolerance)
+            if metric == 'time' and (new - old) < min_time: regression = False
+            rows.append({'block': key[0], 'size': key[1], 'metric': metric, 'baseline': old, 'value': new, 'ratio': ratio, 'regression': regression})
+    return pd.DataFrame(rows, columns=['block', 'size', 'metric', 'baseline', 'value', 'ratio', 'regression'])
+
+
+# %% Main
+def main(argv=None):
+    """Command line interface.
+
+    Examples
+    --------
+    >>> # Run all blocks and store the baseline
+    >>> python -m d3blocks.benchmarks --sizes 1e2 1e3 1e4 --save baseline.json
+    >>> #
+    >>> # Compare against the baseline. The exit code is 1 when a regression is detected.
+    >>> python -m d3blocks.benchmarks --sizes 1e2 1e3 1e4 --baseline baseline.json
+
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m d3blocks.benchmarks', description='Benchmark the d3blocks charts.')
+    parser.add_argument('--blocks', nargs='+', default=None, choices=[*BLOCKS.keys()], help='Blocks to benchmark (default: all).')
+    parser.add_argument('--sizes', nargs='+', type=float, default=[1e2, 1e3, 1e4], help='Number of input rows, e.g., 1e2 1e3 1e4 1e5 1e6.')
+    parser.add_argument('--all-sizes', action='store_true', help='Run all sizes from 1e2 to 1e6.')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of repetitions. The fastest one is reported.')
+    parser.add_argument('--outdir', default=None, help='Directory for the html files (default: temporary directory).')
+    parser.add_argument('--save', default=None, help='Save the results to this JSON file.')
+    parser.add_argument('--baseline', default=None, help='Compare the results against this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative increase before a regression is reported.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='[{asctime}] [{name}] [{levelname}] {msg}', style='{', datefmt='%d-%m-%Y %H:%M:%S')
+    logger.setLevel(logging.INFO)
+    sizes = SIZES if args.all_sizes else [int(n) for n in args.sizes]
+    report = run(blocks=args.blocks, sizes=sizes, repeat=args.repeat, outdir=args.outdir)
+
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+        print(to_frame(report))
+    if args.save is not None:
+        save(report, args.save)
+
+    if args.baseline is not None:
+        diff = compare(report, load(args.baseline), tolerance=args.tolerance)
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+            print(diff)
+        if diff['regression'].any():
+            print('Regression detected in: %s' %(', '.join(sorted(set(diff.loc[diff['regression'], 'block'])))))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
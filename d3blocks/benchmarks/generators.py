@@ -0,0 +1,153 @@
+"""Synthetic data generators for the benchmarks.
+
+All generators are offline and deterministic for a given seed.
+
+Library     : d3blocks
+Author      : E.Taskesen
+Mail        : erdogant@gmail.com
+Github      : https://github.com/d3blocks/d3blocks
+License     : GPL3
+"""
+
+import numpy as np
+import pandas as pd
+from d3blocks.utils import vec2adjmat
+
+
+# %% Edge lists
+def edges(n, n_nodes=None, acyclic=False, seed=0):
+    """Edge list with source, target and weight.
+
+    Parameters
+    ----------
+    n : int
+        Number of rows.
+    n_nodes : int, (default: None)
+        Number of unique nodes. None uses sqrt(n) nodes with a minimum of 10 and a maximum of 500.
+    acyclic : bool, (default: False)
+        Only create edges from a lower to a higher node number, which results in a directed acyclic graph.
+    seed : int, (default: 0)
+        Random seed.
+
+    Returns
+    -------
+    pd.DataFrame with the columns 'source', 'target' and 'weight'.
+
+    """
+    rng = np.random.default_rng(seed)
+    if n_nodes is None: n_nodes = int(np.clip(np.sqrt(n), 10, 500))
+    source = rng.integers(0, n_nodes - 1, n)
+    if acyclic:
+        target = source + 1 + (rng.integers(0, n_nodes, n) % (n_nodes - 1 - source))
+    else:
+        target = (source + rng.integers(1, n_nodes, n)) % n_nodes
+    names = np.array(['node %d' %(i) for i in range(n_nodes)], dtype=object)
+    return pd.DataFrame({'source': names[source], 'target': names[target], 'weight': rng.integers(1, 100, n).astype(float)})
+
+
+def adjmat(n, seed=0):
+    """Square adjacency matrix with approximately sqrt(n) rows and columns."""
+    df = edges(n, seed=seed)
+    return vec2adjmat(df['source'], df['target'], weight=df['weight'])
+
+
+# %% Point clouds
+def points(n, n_classes=5, seed=0):
+    """Point cloud with x, y, class label and size.
+
+    Returns
+    -------
+    pd.DataFrame with the columns 'x', 'y', 'label' and 'size'.
+
+    """
+    rng = np.random.default_rng(seed)
+    label = rng.integers(0, n_classes, n)
+    x = rng.normal(size=n) + label
+    y = rng.normal(size=n) * (1 + label / n_classes)
+    names = np.array(['class %d' %(i) for i in range(n_classes)], dtype=object)
+    return pd.DataFrame({'x': x, 'y': y, 'label': names[label], 'size': rng.integers(1, 10, n)})
+
+
+# %% Event logs
+def events(n, n_states=5, seed=0):
+    """Event log with a sample_id, a state and the datetime of the state change.
+
+    Each sample has on average 10 events. The events are sorted on datetime.
+
+    Returns
+    -------
+    pd.DataFrame with the columns 'datetime', 'sample_id' and 'state'.
+
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = max(1, n // 10)
+    sample_id = np.sort(rng.integers(0, n_samples, n))
+    # Seconds between two events of the same sample. The first event of a sample starts within the first day.
+    delta = rng.integers(60, 4 * 3600, n)
+    first = np.r_[True, sample_id[1:] != sample_id[:-1]]
+    delta[first] = rng.integers(0, 86400, first.sum())
+    offset = pd.Series(delta).groupby(sample_id).cumsum().values
+    states = np.array(['state %d' %(i) for i in range(n_states)], dtype=object)
+    df = pd.DataFrame({'datetime': pd.Timestamp('2024-01-01') + pd.to_timedelta(offset, unit='s'),
+                       'sample_id': sample_id,
+                       'state': states[rng.integers(0, n_states, n)]})
+    return df.sort_values('datetime', kind='stable').reset_index(drop=True)
+
+
+# %% Wide frames
+def wide(n, n_columns=10, seed=0):
+    """Wide frame with a datetime column and random walks.
+
+    Returns
+    -------
+    pd.DataFrame with the columns 'datetime' and 'column 0', 'column 1', ...
+
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(np.round(rng.normal(size=(n, n_columns)).cumsum(axis=0), 3), columns=['column %d' %(i) for i in range(n_columns)])
+    df['datetime'] = (pd.Timestamp('2000-01-01') + pd.to_timedelta(np.arange(n), unit='h')).strftime('%d-%m-%Y %H:%M:%S')
+    return df
+
+
+# %% Hierarchies
+def hierarchy(n, depth=3, branching=None, seed=0):
+    """Hierarchy with one column per level and a weight.
+
+    Parameters
+    ----------
+    n : int
+        Number of rows (leaves).
+    depth : int, (default: 3)
+        Number of levels.
+    branching : int, (default: None)
+        Number of children per node. None uses n ** (1 / depth).
+
+    Returns
+    -------
+    pd.DataFrame with the columns 'level 0', 'level 1', ... and 'weight'.
+
+    """
+    rng = np.random.default_rng(seed)
+    if branching is None: branching = max(2, int(np.ceil(n ** (1 / depth))))
+    df = pd.DataFrame()
+    path = np.zeros(n, dtype=np.int64)
+    for level in range(depth):
+        path = path * branching + rng.integers(0, branching, n)
+        df['level %d' %(level)] = ['L%d-%d' %(level, p) for p in path]
+    df['weight'] = rng.integers(1, 100, n).astype(float)
+    return df
+
+
+def tree_edges(n, seed=0):
+    """Edge list of a random tree with n edges.
+
+    Returns
+    -------
+    pd.DataFrame with the columns 'source', 'target' and 'weight'.
+
+    """
+    rng = np.random.default_rng(seed)
+    child = np.arange(1, n + 1)
+    # Every node is attached to a random earlier node, which guarantees a tree without cycles.
+    parent = (rng.random(n) * child).astype(np.int64)
+    return pd.DataFrame({'source': ['n%d' %(i) for i in parent], 'target': ['n%d' %(i) for i in child], 'weight': rng.integers(1, 100, n).astype(float)})
@@ -0,0 +1,305 @@
+"""Render cache.
+
+Opt-in, content-addressed cache of rendered charts (see D3Blocks(cache_dir=...)). The key is a stable hash of the input
+data and all arguments of the chart call, which fully determine the node properties, edge properties and config. When a
+chart is called again with the same inputs, the html is copied from the cache without computing the properties or
+rendering the template. The properties and config are stored with the html and restored, so that they can be edited and
+shown again. The least recently used entries are removed when the cache is full.
+
+Library     : d3blocks
+Author      : E.Taskesen
+Mail        : erdogant@gmail.com
+Github      : https://github.com/d3blocks/d3blocks
+License     : GPL3
+"""
+
+import os
+import json
+import time
+import pickle
+import uuid
+import hashlib
+import functools
+import logging
+from pathlib import Path
+import numpy as np
+import pandas as pd
+try:
+    from d3blocks import __version__
+    from d3blocks.tables import PropertyTable
+except:
+    from tables import PropertyTable
+    __version__ = None
+
+logger = logging.getLogger(__name__)
+
+# Version of the key. Increase when the hashing changes so that old entries are not used.
+CACHE_VERSION = 1
+# Directory of the package. The templates and assets of the blocks are in the d3js directory of every block.
+PACKAGE_DIR = Path(__file__).resolve().parent
+# Arguments of the chart functions that only determine where and how the output is shown and not the html itself.
+OUTPUT_ARGUMENTS = ['filepath', 'showfig', 'return_html', 'overwrite']
+
+
+# %% Hashing
+def _update(h, obj):
+    """Feed the object into the hash in a type-aware and process-independent manner."""
+    if isinstance(obj, pd.DataFrame):
+        h.update(b'DataFrame')
+        _update(h, [str(column) for column in obj.columns])
+        _update(h, [str(dtype) for dtype in obj.dtypes])
+        h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        h.update(type(obj).__name__.encode())
+        _update(h, [str(obj.name), str(obj.dtype)])
+        h.update(pd.util.hash_pandas_object(obj).values.tobytes())
+    elif isinstance(obj, PropertyTable):
+        h.update(type(obj).__name__.encode())
+        _update(h, obj.frame)
+    elif isinstance(obj, np.ndarray):
+        h.update(('ndarray%s%s' %(obj.dtype, obj.shape)).encode())
+        if obj.dtype == object:
+            h.update(pd.util.hash_pandas_object(pd.Series(obj.ravel()), index=False).values.tobytes())
+        else:
+            h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update(b'dict%d' %(len(obj)))
+        for key in sorted(obj, key=repr):
+            _update(h, key)
+            _update(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'%s%d' %(type(obj).__name__.encode(), len(obj)))
+        for item in obj:
+            _update(h, item)
+    elif obj is None or isinstance(obj, (str, bool, int, float, np.generic, Path)):
+        h.update(('%s:%r;' %(type(obj).__name__, obj)).encode())
+    else:
+        raise TypeError('Input of type [%s] can not be hashed.' %(type(obj).__name__))
+
+
+@functools.lru_cache(maxsize=None)
+def source_version():
+    """Return a hash of the d3blocks version and the templates and assets of all blocks.
+
+    Rendered charts of another d3blocks version or with modified templates are not served from a persistent cache.
+    The hash is computed once per process.
+    """
+    h = hashlib.sha256(('d3blocks-%s' %(__version__)).encode())
+    for path in sorted(PACKAGE_DIR.glob('*/d3js/*')):
+        if path.is_file():
+            h.update(path.relative_to(PACKAGE_DIR).as_posix().encode())
+            h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def make_key(*objects):
+    """Return a stable hash of the objects.
+
+    Parameters
+    ----------
+    objects : Various
+        DataFrames, Series, arrays, dicts, lists and scalars.
+
+    Returns
+    -------
+    str
+        sha256 hex digest. None when one of the objects can not be hashed.
+
+    """
+    h = hashlib.sha256(('d3blocks-cache-%d-%s' %(CACHE_VERSION, source_version())).encode())
+    try:
+        for obj in objects:
+            _update(h, obj)
+    except TypeError as e:
+        if logger is not None: logger.info('%s The render cache is not used.' %(e))
+        return None
+    return h.hexdigest()
+
+
+# %% Cache
+class RenderCache:
+    """Content-addressed cache of rendered html files.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory to store the rendered charts. The directory is created when it does not exist.
+    max_entries : int, (default: 128)
+        Maximum number of charts in the cache. The least recently used charts are removed first.
+    max_bytes : int, (default: None)
+        Maximum total size of the cache in bytes. None does not limit the size.
+
+    Examples
+    --------
+    >>> d3 = D3Blocks(cache_dir='c://temp//d3blocks_cache')
+    >>> d3.chord(df)  # Rendered and stored in the cache
+    >>> d3.chord(df)  # Copied from the cache
+    >>> d3.cache.info()
+    >>> d3.cache.clear()
+
+    """
+
+    def __init__(self, cache_dir, max_entries=128, max_bytes=None):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key, ext='.html'):
+        return os.path.join(self.cache_dir, key + ext)
+
+    def get(self, key):
+        """Return the path of the cached html and mark it as recently used, or None when the key is not cached."""
+        if key is None: return None
+        filepath = self._path(key)
+        try:
+            os.utime(filepath)
+        except FileNotFoundError:
+            return None
+        return filepath
+
+    def read(self, key):
+        """Return the cached html."""
+        with open(self._path(key), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def state(self, key):
+        """Return the stored node_properties, edge_properties and config of the chart, or None when not stored."""
+        try:
+            with open(self._path(key, '.pkl'), 'rb') as f:
+                return pickle.load(f)
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def chunks(self, key, size=1 << 16):
+        """Yield the cached html in chunks without reading the full file in memory."""
+        with open(self._path(key), 'r', encoding='utf-8') as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk: return
+                yield chunk
+
+    def put(self, key, chart, html=None, filepath=None, state=None):
+        """Store the html in the cache.
+
+        Parameters
+        ----------
+        key : str
+            Output of make_key().
+        chart : str
+            Name of the chart.
+        html : str, (default: None)
+            Rendered html.
+        filepath : str, (default: None)
+            Path of the rendered html file. Used when html is None.
+        state : dict, (default: None)
+            The node_properties, edge_properties and config of the chart that are restored on a hit (see state()).
+            Objects that can not be pickled are not stored.
+
+        """
+        if key is None: return
+        tmpfile = '%s.%s.tmp' %(self._path(key), uuid.uuid4().hex[:12])
+        try:
+            if state is not None:
+                try:
+                    data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+                except (pickle.PicklingError, TypeError, AttributeError) as e:
+                    if logger is not None: logger.info('Render cache: the properties of [%s] can not be stored: %s' %(chart, e))
+                else:
+                    with open(tmpfile + '.pkl', 'xb') as f:
+                        f.write(data)
+                    os.replace(tmpfile + '.pkl', self._path(key, '.pkl'))
+            if html is not None:
+                with open(tmpfile, 'x', encoding='utf-8') as f:
+                    f.write(html)
+            else:
+                with open(filepath, 'rb') as source, open(tmpfile, 'xb') as f:
+                    while True:
+                        chunk = source.read(1 << 20)
+                        if not chunk: break
+                        f.write(chunk)
+            with open(self._path(key, '.json'), 'w', encoding='utf-8') as f:
+                json.dump({'chart': chart, 'created': time.time()}, f)
+            os.replace(tmpfile, self._path(key))
+        except BaseException:
+            for path in [tmpfile, tmpfile + '.pkl']:
+                if os.path.isfile(path): os.remove(path)
+            raise
+        if logger is not None: logger.info('Render cache: stored [%s] as [%s].' %(chart, key))
+        self._evict()
+
+    def info(self):
+        """Inspect the cache.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per cached chart with the key, chart name, size in bytes of the html and stored properties,
+            creation time and last time used. The most recently used chart is on top.
+
+        """
+        rows = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.html'): continue
+            key = filename[:-5]
+            try:
+                stat = os.stat(self._path(key))
+            except FileNotFoundError:
+                continue
+            size = stat.st_size
+            if os.path.isfile(self._path(key, '.pkl')): size += os.path.getsize(self._path(key, '.pkl'))
+            meta = {}
+            if os.path.isfile(self._path(key, '.json')):
+                with open(self._path(key, '.json'), 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            rows.append({'key': key,
+                         'chart': meta.get('chart', None),
+                         'size': size,
+                         'created': pd.to_datetime(meta.get('created', stat.st_mtime), unit='s'),
+                         'last_used': pd.to_datetime(stat.st_mtime, unit='s'),
+                         })
+        df = pd.DataFrame(rows, columns=['key', 'chart', 'size', 'created', 'last_used'])
+        return df.sort_values('last_used', ascending=False).reset_index(drop=True)
+
+    def clear(self, chart=None):
+        """Remove charts from the cache.
+
+        Parameters
+        ----------
+        chart : str, (default: None)
+            Only remove the charts with this name, e.g., 'chord'. None removes all charts.
+
+        Returns
+        -------
+        int
+            Number of removed charts.
+
+        """
+        df = self.info()
+        if chart is not None: df = df.loc[df['chart'] == chart]
+        for key in df['key']:
+            self._remove(key)
+        if logger is not None: logger.info('Render cache: removed %d charts.' %(df.shape[0]))
+        return df.shape[0]
+
+    def _remove(self, key):
+        for ext in ['.html', '.json', '.pkl']:
+            try:
+                os.remove(self._path(key, ext))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        """Remove the least recently used charts until the limits are met."""
+        df = self.info()
+        total = df['size'].sum()
+        for i in range(df.shape[0] - 1, -1, -1):
+            too_many = (self.max_entries is not None) and (i + 1 > self.max_entries)
+            too_large = (self.max_bytes is not None) and (total > self.max_bytes)
+            if not (too_many or too_large): break
+            if logger is not None: logger.info('Render cache: evict [%s].' %(df['key'].iloc[i]))
+            self._remove(df['key'].iloc[i])
+            total -= df['size'].iloc[i]
+
+    def __len__(self):
+        return self.info().shape[0]
@@ -7,14 +7,22 @@ Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 """
 from ismember import ismember
-import colourmap
 import numpy as np
-from jinja2 import Environment, PackageLoader
 
 try:
-    from .. utils import set_colors, pre_processing, convert_dataframe_dict, set_path, update_config, set_labels, create_unique_dataframe, write_html_file, include_save_to_svg_script
+    from .. utils import set_colors, pre_processing, convert_dataframe_dict, set_path, update_config, set_labels, create_unique_dataframe, write_html_stream, include_save_to_svg_script, intern_labels, working_copy
+    from .. render import get_template
+    from .. colors import generate
+    from .. profiler import profile_stage
+    from .. import serialize
+    from .. tables import NodeTable
 except:
-    from utils import set_colors, pre_processing, convert_dataframe_dict, set_path, update_config, set_labels, create_unique_dataframe, write_html_file, include_save_to_svg_script
+    from utils import set_colors, pre_processing, convert_dataframe_dict, set_path, update_config, set_labels, create_unique_dataframe, write_html_stream, include_save_to_svg_script, intern_labels, working_copy
+    from render import get_template
+    from colors import generate
+    from profiler import profile_stage
+    import serialize
+    from tables import NodeTable
 
 # %% Set configuration properties
 def set_config(config={}, **kwargs):
@@ -22,7 +30,7 @@ def set_config(config={}, **kwargs):
     logger = kwargs.get('logger', None)
     config['chart'] = 'Chord'
     config['title'] = kwargs.get('title', 'Chord - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'chord.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'chord.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [900, 900])
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
@@ -58,8 +66,8 @@ def set_node_properties(df, **kwargs):
 
     Returns
     -------
-    dict_labels : dictionary()
-        Dictionary containing the label properties.
+    node_properties : NodeTable
+        Label properties. The properties of a label can be changed with node_properties.get(label)['color'] = '#000000'.
 
     """
     cmap = kwargs.get('cmap', 'tab20')
@@ -73,14 +81,12 @@ def set_node_properties(df, **kwargs):
     # Set opacity properties
     opacity = np.repeat(opacity, len(uilabels))
     # Create unique label/node colors
-    colors = colourmap.generate(len(uilabels), cmap=cmap, scheme='hex', verbose=0)
+    colors = generate(len(uilabels), cmap=cmap)
 
-    # Make dict
-    dict_labels = {}
-    for i, label in enumerate(uilabels):
-        dict_labels[label] = {'id': i, 'label': label, 'color': colors[i], 'opacity': opacity[i]}
+    # Store the properties in columns with one row per label.
+    node_properties = NodeTable({'id': np.arange(len(uilabels)), 'label': uilabels, 'color': colors, 'opacity': opacity}, labels=uilabels)
     # Return
-    return dict_labels
+    return node_properties
 
 
 # %% Set Edge properties
@@ -124,22 +130,25 @@ def set_edge_properties(df, **kwargs):
         DataFrame.
 
     """
-    df = df.copy()
     node_properties = kwargs.get('node_properties')
     logger = kwargs.get('logger', None)
     color = kwargs.get('color', 'source')
     opacity = kwargs.get('opacity', 'source')
     cmap = kwargs.get('cmap', 'tab20')
 
-    # Create unique dataframe, udpate weights
+    # Create unique dataframe, udpate weights. This is a new frame: the input is not modified and is not copied first.
     df = create_unique_dataframe(df, logger=logger)
 
     # Convert dict/frame.
     df = convert_dataframe_dict(df, frame=True)
+    # Pre processing
+    df = pre_processing(df)
 
-    # Convert to dict/frame.
-    nodes = convert_dataframe_dict(node_properties, frame=False)
-    df = convert_dataframe_dict(df, frame=True)
+    # The label table is built once. The source and target are coded once for the edge opacity and color.
+    codes = {}
+    if node_properties is not None:
+        nodes = NodeTable.as_table(node_properties)
+        table, (codes['source'], codes['target']) = intern_labels(nodes, df['source'], df['target'], missing='ignore')
 
     if isinstance(opacity, (list, np.ndarray)) and (len(opacity)!=df.shape[0]):
         raise Exception('Input parameter "opacity" should be of same size of dataframe.')
@@ -147,12 +156,12 @@ def set_edge_properties(df, **kwargs):
         # Set to dataframe.
         if logger is not None: logger.info('Set edge-opacity using the column "opacity" of the input DataFrame.')
         # opacity = df['opacity'].values
-    elif (nodes is not None) and isinstance(opacity, str) and (opacity=='source' or opacity=='target'):
+    elif (node_properties is not None) and isinstance(opacity, str) and (opacity=='source' or opacity=='target'):
         # Set to source or target node color.
         if logger is not None: logger.info('Set edge-opacity based on the [%s] node-opacity.' %(opacity))
         df['opacity'] = 0.8
-        for key in nodes.keys():
-            df.loc[df[opacity]==key, 'opacity']=nodes.get(key)['opacity']
+        code = codes[opacity]
+        df.loc[code >= 0, 'opacity'] = table['opacity'].values[code[code >= 0]]
     elif isinstance(opacity, (int, float)):
         # In case one opacity is defined.
         if logger is not None: logger.info('Set edge-opacity to [%s].' %(opacity))
@@ -163,20 +172,17 @@ def set_edge_properties(df, **kwargs):
         if logger is not None: logger.info('Set edge-opacity to default value (0.8).')
         df['opacity'] = 0.8
 
-    # Pre processing
-    df = pre_processing(df)
-
     # Set colors based on source or target
     if (color is None) and np.any(df.columns=='color'):
         # Set to dataframe.
         if logger is not None: logger.info('Set edge-colors using the column "color" of the input DataFrame.')
         color = df['color'].values
-    elif (nodes is not None) and (isinstance(color, str)) and (color=='source' or color=='target'):
+    elif (node_properties is not None) and (isinstance(color, str)) and (color=='source' or color=='target'):
         # Set to source or target node color.
         if logger is not None: logger.info('Set edge-colors based on the [%s] node-color.' %(color))
         df['color'] = '#000000'
-        for key in nodes.keys():
-            df.loc[df[color]==key, 'color'] = nodes.get(key)['color']
+        code = codes[color]
+        df.loc[code >= 0, 'color'] = table['color'].values[code[code >= 0]]
     elif isinstance(color, str) and (color[0]=='#') and (len(color)==7):
         # In case one hex color is defined.
         if logger is not None: logger.info('Set all edge-colors to [%s].' %(color))
@@ -228,16 +234,17 @@ def show(df, **kwargs):
     config = config.copy()
 
     # Convert dict/frame.
-    df = convert_dataframe_dict(df.copy(), frame=True)
-    node_properties = convert_dataframe_dict(node_properties, frame=False)
+    df = convert_dataframe_dict(working_copy(df), frame=True)
+    node_properties = NodeTable.as_table(node_properties)
 
     # Transform dataframe into input form for d3
     df.reset_index(inplace=True, drop=True)
-    df['source_id'] = list(map(lambda x: node_properties.get(x)['id'], df['source']))
-    df['target_id'] = list(map(lambda x: node_properties.get(x)['id'], df['target']))
+    table, (source, target) = intern_labels(node_properties, df['source'], df['target'])
+    df['source_id'] = table['id'].values[source]
+    df['target_id'] = table['id'].values[target]
 
     # Create the data from the input of javascript
-    X = get_data_ready_for_d3(df, node_properties)
+    X = get_data_ready_for_d3(df, table)
     # Write to HTML
     return write_html(X, config, logger=logger)
 
@@ -291,30 +298,24 @@ def write_html(X, config, logger=None):
         'SAVE_BUTTON_STOP': show_save_button[1],
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.chord', package_path='d3js'))
+    index_template = get_template('chord', 'chord.html.j2')
 
-    index_template = jinja_env.get_template('chord.html.j2')
-
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
 
 
-def get_data_ready_for_d3(df, labels):
+@profile_stage('get_data_ready_for_d3')
+def get_data_ready_for_d3(df, table):
     """Convert the source-target data into d3 compatible data.
 
     Parameters
     ----------
     df : pd.DataFrame()
-        Input data.
-    labels : dict
-        Dictionary containing hex colorlabels for the classes.
-        The labels are derived using the function: labels = d3blocks.set_label_properties()
+        Input data with the columns source_id and target_id.
+    table : pd.DataFrame()
+        Label table with one row per label (see intern_labels).
 
     Returns
     -------
@@ -322,28 +323,23 @@ def get_data_ready_for_d3(df, labels):
         Converted data into a string that is d3 compatible.
 
     """
-    # Set the nodes in an increasing id-order
-    list_id = np.array(list(map(lambda x: labels.get(x)['id'], df['source'])) + list(map(lambda x: labels.get(x)['id'], df['target'])))
-    list_name = np.array(list(map(lambda x: labels.get(x)['label'], df['source'])) + list(map(lambda x: labels.get(x)['label'], df['target'])))
-    _, idx = np.unique(list_id, return_index=True)
+    # Set the nodes that are used in the links in an increasing id-order
+    table = table.set_index('id', drop=False).loc[np.unique(np.r_[df['source_id'].values, df['target_id'].values])]
 
     # Set the nodes
-    X = '{"nodes":['
-    for i in idx:
-        color = labels.get(list_name[i])['color']
-        opacity = labels.get(list_name[i])['opacity']
-        X = X + '{"name":"' + list_name[i] + '",'
-        X = X + '"color":"' + color + '",'
-        X = X + '"opacity":' + str(opacity)
-        X = X + '}, '
-    X = X[:-1] + '],'
+    nodes = serialize.records({'name': serialize.strings(table['label'].values),
+                               'color': serialize.strings(table['color'].values),
+                               'opacity': serialize.numbers(table['opacity'].values),
+                               })
 
     # Set the links
-    # source_target_id = list(zip(list(map(lambda x: labels.get(x)['id'], df['source'])),  list(map(lambda x: labels.get(x)['id'], df['target']))))
-    X = X + ' "links":['
-    for _, row in df.iterrows():
-        X = X + '{"source":' + str(row['source_id']) + ',"target":' + str(row['target_id']) + ',"value":' + str(row['weight']) + ',"opacity":' + str(row['opacity']) + ',"color":' + '"' + str(row['color']) + '"' + '},'
-    X = X[:-1] + ']}'
+    links = serialize.records({'source': serialize.numbers(df['source_id'].values),
+                               'target': serialize.numbers(df['target_id'].values),
+                               'value': serialize.numbers(df['weight'].values),
+                               'opacity': serialize.numbers(df['opacity'].values),
+                               'color': serialize.strings(df['color'].values),
+                               })
+    X = '{"nodes":' + serialize.array(nodes) + ',"links":' + serialize.array(links) + '}'
 
     # Return
     return X
@@ -6,12 +6,18 @@ Mail        : erdogant@gmail.com
 Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 """
-from jinja2 import Environment, PackageLoader
+import numpy as np
 
 try:
-    from .. utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_file, is_circular, include_save_to_svg_script
+    from .. utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_stream, is_circular, include_save_to_svg_script, working_copy
+    from .. render import get_template, write_assets
+    from .. profiler import profile_stage
+    from .. tables import NodeTable
 except:
-    from utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_file, is_circular, include_save_to_svg_script
+    from utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_stream, is_circular, include_save_to_svg_script, working_copy
+    from render import get_template, write_assets
+    from profiler import profile_stage
+    from tables import NodeTable
 
 
 # %% Set configuration properties
@@ -21,7 +27,7 @@ def set_config(config={}, margin={}, font={}, border={}, **kwargs):
     # Store configurations
     config['chart'] ='circlepacking'
     config['title'] = kwargs.get('title', 'Circlepacking - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'circlepacking.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'circlepacking.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [900, 1920])
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
@@ -59,7 +65,7 @@ def set_edge_properties(df, **kwargs):
 
     """
     logger = kwargs.get('logger', None)
-    df = df.copy()
+    df = working_copy(df)
     # Convert NumPy types to regular Python types for proper JSON serialization
     df = pre_processing(df, labels=[str(x) for x in df.columns.values[:-1]], logger=logger)
     return df
@@ -77,8 +83,8 @@ def set_node_properties(df, **kwargs):
 
     Returns
     -------
-    dict_labels : dictionary()
-        Dictionary containing the label properties.
+    node_properties : NodeTable
+        Label properties. The properties of a label can be changed with node_properties.get(label)['value'] = 10.
 
     """
     # Get unique label
@@ -87,21 +93,19 @@ def set_node_properties(df, **kwargs):
     size = kwargs.get('size')
     uilabels = set_labels(df, col_labels=col_labels, logger=logger)
 
-    dict_labels = {}
-    for i, label in enumerate(uilabels):
-        # Convert NumPy types to regular Python types for proper JSON serialization
-        label_str = str(label)
-        if size=='sum':
-            if df.loc[df['source']==label_str].empty:
-                weight = df.loc[df['target']==label_str]['weight'].sum()
-            else:
-                weight = df.loc[df['source']==label_str]['weight'].sum()
-        else:
-            weight = 1
-        # Store
-        dict_labels[label_str] = {'id': i, 'label': label_str, 'value': weight}
+    # Convert NumPy types to regular Python types for proper JSON serialization
+    uilabels = [str(label) for label in uilabels]
+    if size=='sum':
+        # Sum of the weights where the label is the source, or otherwise where the label is the target.
+        source = df.groupby('source', sort=False)['weight'].sum().reindex(uilabels)
+        target = df.groupby('target', sort=False)['weight'].sum().reindex(uilabels)
+        weight = source.fillna(target).fillna(0).astype(df['weight'].dtype).values
+    else:
+        weight = np.ones(len(uilabels), dtype=int)
+    # Store the properties in columns with one row per label.
+    node_properties = NodeTable({'id': np.arange(len(uilabels)), 'label': uilabels, 'value': weight}, labels=uilabels)
     # Return
-    return dict_labels
+    return node_properties
 
 
 def show(df, **kwargs):
@@ -123,15 +127,15 @@ def show(df, **kwargs):
         Dictionary containing updated configuration keys.
 
     """
-    df = df.copy()
+    df = working_copy(df)
     node_properties = kwargs.get('node_properties', None)
     logger = kwargs.get('logger', None)
     config = update_config(kwargs, logger)
     config = config.copy()
 
     # Convert dict/frame.
-    node_properties = convert_dataframe_dict(node_properties, frame=False)
-    df = convert_dataframe_dict(df.copy(), frame=True)
+    node_properties = NodeTable.as_table(node_properties)
+    df = convert_dataframe_dict(df, frame=True)
 
     # Transform dataframe into input form for d3
     df.reset_index(inplace=True, drop=True)
@@ -141,13 +145,15 @@ def show(df, **kwargs):
     X = convert_to_links_format(df, logger=logger)
 
     # Check whether dataframe is circular
-    if is_circular(df, logger):
-        logger.warning("The dataframe contains circularity or self-link which can not be handled by this chart!")
+    cycles = is_circular(df, logger)
+    if cycles:
+        logger.warning("The dataframe contains circularity or self-link which can not be handled by this chart! Number of cycles: %d. Nodes in the first cycle: %s" %(len(cycles), cycles[0][:25]))
 
     # Write to HTML
-    return write_html(X, config, node_properties, logger)
+    return write_html(X, config, node_properties.to_dict(), logger)
 
 
+@profile_stage('get_data_ready_for_d3')
 def convert_to_links_format(df, logger):
     logger.debug("Setting up data for d3js..")
     links = []
@@ -199,17 +205,12 @@ def write_html(X, config, node_properties, logger=None):
         'SAVE_TO_SVG_SCRIPT': save_script,
         'SAVE_BUTTON_START': show_save_button[0],
         'SAVE_BUTTON_STOP': show_save_button[1],
+        'ASSETS': write_assets('circlepacking', config, logger=logger),
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.circlepacking', package_path='d3js'))
-
-    index_template = jinja_env.get_template('circlepacking.html.j2')
+    index_template = get_template('circlepacking', 'circlepacking.html.j2')
 
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
@@ -0,0 +1,116 @@
+"""Colors.
+
+Color resolution of the blocks. The colors of a colormap are generated once per (cmap, n) and kept in a lookup table.
+Class labels are mapped to colors via their integer codes, so that coloring many points is one gather from the lookup
+table. Hex colors are validated on the characters of the numpy string array instead of per element.
+
+Library     : d3blocks
+Author      : E.Taskesen
+Mail        : erdogant@gmail.com
+Github      : https://github.com/d3blocks/d3blocks
+License     : GPL3
+"""
+
+import re
+import functools
+import numpy as np
+import pandas as pd
+
+# Valid hex color: '#' followed by 6 hexadecimal characters.
+_HEX = re.compile(r'#[0-9a-fA-F]{6}')
+
+
+# %% Validation
+def _is_hex_chars(values):
+    """Check the characters of an array of numpy strings."""
+    n = values.shape[0]
+    width = values.dtype.itemsize // 4
+    if width < 7: return np.zeros(n, dtype=bool)
+    chars = np.ascontiguousarray(values).view(np.uint32).reshape(n, width)
+    digits = chars[:, 1:7]
+    ok = (chars[:, 0] == ord('#'))
+    ok &= np.all(((digits >= ord('0')) & (digits <= ord('9'))) | ((digits >= ord('a')) & (digits <= ord('f'))) | ((digits >= ord('A')) & (digits <= ord('F'))), axis=1)
+    # The remaining characters are the padding of shorter strings.
+    if width > 7: ok &= np.all(chars[:, 7:] == 0, axis=1)
+    return ok
+
+
+def is_hex(values):
+    """Return for every value whether it is a hex color, such as '#ff0000'.
+
+    Parameters
+    ----------
+    values : str or array-like
+        Colors.
+
+    Returns
+    -------
+    bool or np.ndarray of bool
+        One bool for a single string.
+
+    """
+    if isinstance(values, str): return _HEX.fullmatch(values) is not None
+    values = np.asarray(values)
+    if values.ndim != 1: values = values.ravel()
+    if values.dtype.kind == 'U':
+        return _is_hex_chars(values)
+    if values.dtype == object and pd.api.types.infer_dtype(values, skipna=False) == 'string':
+        return _is_hex_chars(values.astype(str))
+    return np.array([isinstance(value, str) and _HEX.fullmatch(value) is not None for value in values], dtype=bool)
+
+
+# %% Colormaps
+@functools.lru_cache(maxsize=256)
+def _lut(cmap, n, method):
+    import colourmap
+    lut = np.asarray(colourmap.generate(n, cmap=cmap, method=method, scheme='hex', verbose=0))
+    lut.flags.writeable = False
+    return lut
+
+
+def generate(n, cmap='Set1', method='matplotlib'):
+    """Return n hex colors of the colormap.
+
+    The colors are the same as colourmap.generate(n, cmap=cmap, scheme='hex') and are generated once per (cmap, n).
+
+    Parameters
+    ----------
+    n : int
+        Number of colors.
+    cmap : str, (default: 'Set1')
+        Colormap.
+    method : str, (default: 'matplotlib')
+        'matplotlib' or 'seaborn'.
+
+    Returns
+    -------
+    np.ndarray
+        Hex colors.
+
+    """
+    return _lut(cmap, int(n), method).copy()
+
+
+def fromlist(y, cmap='Set1', method='matplotlib'):
+    """Return the hex color of the class label of every value.
+
+    The colors are the same as colourmap.fromlist(y, cmap=cmap, scheme='hex')[0]: the sorted unique labels get the colors
+    of the colormap in order.
+
+    Parameters
+    ----------
+    y : array-like
+        Class labels.
+    cmap : str, (default: 'Set1')
+        Colormap.
+    method : str, (default: 'matplotlib')
+        'matplotlib' or 'seaborn'.
+
+    Returns
+    -------
+    np.ndarray
+        Hex colors in the same order as y.
+
+    """
+    codes, uiy = pd.factorize(np.asarray(y).ravel(), sort=True, use_na_sentinel=False)
+    return _lut(cmap, len(uiy), method)[codes]
@@ -3,7 +3,6 @@ import os
 from sys import platform
 
 import pandas as pd
-import requests
 from urllib.parse import urlparse
 import logging
 import numpy as np
@@ -11,52 +10,160 @@ import zipfile
 import webbrowser
 import random
 import time
-import datazets as dz
-import d3graph as d3network
+import functools
+import importlib
+import inspect
 
 try:
-    from d3blocks.elasticgraph.elasticgraph import Elasticgraph
-    import d3blocks.movingbubbles.Movingbubbles as Movingbubbles
-    import d3blocks.timeseries.Timeseries as Timeseries
-    import d3blocks.sankey.Sankey as Sankey
-    import d3blocks.imageslider.Imageslider as Imageslider
-    import d3blocks.chord.Chord as Chord
-    import d3blocks.scatter.Scatter as Scatter
-    import d3blocks.violin.Violin as Violin
-    import d3blocks.particles.Particles as Particles
-    import d3blocks.heatmap.Heatmap as Heatmap
-    import d3blocks.matrix.Matrix as Matrix
-    import d3blocks.treemap.Treemap as Treemap
-    import d3blocks.circlepacking.Circlepacking as Circlepacking
-    import d3blocks.tree.Tree as Tree
-    import d3blocks.radialgraph.Radialgraph as Radialgraph
-    import d3blocks.maps.Maps as Maps
     import d3blocks.utils as utils
+    import d3blocks.profiler as profiler
+    import d3blocks.render as render
+    import d3blocks.cache as cache
+    import d3blocks.edges as edges
+    import d3blocks.events as events
 except:
     # ###################### DEBUG ONLY ###################
-    from elasticgraph.elasticgraph import Elasticgraph
-    import movingbubbles.Movingbubbles as Movingbubbles
-    import timeseries.Timeseries as Timeseries
-    import sankey.Sankey as Sankey
-    import imageslider.Imageslider as Imageslider
-    import chord.Chord as Chord
-    import scatter.Scatter as Scatter
-    import violin.Violin as Violin
-    import particles.Particles as Particles
-    import heatmap.Heatmap as Heatmap
-    import matrix.Matrix as Matrix
-    import treemap.Treemap as Treemap
-    import circlepacking.Circlepacking as Circlepacking
-    import tree.Tree as Tree
-    import radialgraph.Radialgraph as Radialgraph
-    import maps.Maps as Maps
     import utils
+    import profiler
+    import render
+    import cache
+    import edges
+    import events
     # #####################################################
 
+# Chart modules are imported on first use (see get_chart_module) to keep "import d3blocks" fast.
+CHART_MODULES = {
+    'Movingbubbles': 'movingbubbles.Movingbubbles',
+    'Timeseries': 'timeseries.Timeseries',
+    'Sankey': 'sankey.Sankey',
+    'Imageslider': 'imageslider.Imageslider',
+    'Chord': 'chord.Chord',
+    'Scatter': 'scatter.Scatter',
+    'Violin': 'violin.Violin',
+    'Particles': 'particles.Particles',
+    'Heatmap': 'heatmap.Heatmap',
+    'Matrix': 'matrix.Matrix',
+    'Treemap': 'treemap.Treemap',
+    'Circlepacking': 'circlepacking.Circlepacking',
+    'Tree': 'tree.Tree',
+    'Radialgraph': 'radialgraph.Radialgraph',
+    'Maps': 'maps.Maps',
+    'Elasticgraph': 'elasticgraph.elasticgraph',
+    }
+
 logger = logging.getLogger(__name__)
 if not logger.hasHandlers():
     logging.basicConfig(level=logging.INFO, format='[{asctime}] [{name}] [{levelname}] {msg}', style='{', datefmt='%d-%m-%Y %H:%M:%S')
 
+
+def _check_memory(func):
+    """Check the input data and one working copy of it against max_memory before the chart is created.
+
+    The working copy is the edge_properties: the show stage runs with copy-on-write and does not copy them again.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if hasattr(self, 'config') and self.config.get('max_memory', None) is not None:
+            nbytes = utils.data_size(*args, *kwargs.values())
+            utils.check_memory(2 * nbytes, self.config['max_memory'], 'the input data and its working copy', logger=logger)
+        return func(self, *args, **kwargs)
+    return wrapper
+
+
+def _profile_chart(func):
+    """Record the profile of the chart call in last_profile when profiling is enabled."""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not getattr(self, 'profile', False):
+            return func(self, *args, **kwargs)
+        with profiler.Profile(func.__name__) as prof:
+            html = func(self, *args, **kwargs)
+            # Size of the output that is shipped: the written file or otherwise the returned html.
+            filepath = self.config.get('filepath', None) if hasattr(self, 'config') else None
+            if filepath and os.path.isfile(filepath):
+                prof.payload_size = os.path.getsize(filepath)
+            elif isinstance(html, str):
+                prof.payload_size = len(html.encode('utf-8'))
+        self.last_profile = prof.result()
+        logger.info('Profile of [%s]: %.3f sec.' %(func.__name__, self.last_profile['time']))
+        return html
+    return wrapper
+
+
+def _cache_chart(func):
+    """Copy the html from the render cache when the chart is called again with unchanged inputs.
+
+    The key is computed from the input data and all arguments that determine the html. The node_properties are part of
+    the key when they are reused (reset_properties=False). On a hit, the properties are not computed and the template
+    is not rendered. The node_properties, edge_properties and config that are stored with the html are restored instead.
+    Charts without stored properties are created again.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if getattr(self, 'cache', None) is None:
+            return func(self, *args, **kwargs)
+
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        arguments = {name: value for name, value in arguments.arguments.items() if name != 'self'}
+        filepath = arguments.get('filepath', None)
+        # The filename is part of the html of some charts and external assets are only used when written to disk.
+        state = {'filename': None if filepath is None else (os.path.basename(str(filepath)) or 'd3blocks.html'),
+                 'frame': self.config.get('frame', True),
+                 'support': self.config.get('support', None),
+                 'assets': self.config.get('assets', 'inline'),
+                 }
+        if (not arguments.get('reset_properties', True)) and hasattr(self, 'node_properties'):
+            state['node_properties'] = self.node_properties
+        # Data that is read from a file is part of the key by the size and modification time of the file.
+        data = arguments.get('df', None)
+        if isinstance(data, (str, os.PathLike)) and os.path.isfile(data):
+            stat = os.stat(data)
+            state['data_file'] = [stat.st_size, stat.st_mtime_ns]
+        key = cache.make_key(func.__name__, {name: value for name, value in arguments.items() if name not in cache.OUTPUT_ARGUMENTS}, state)
+
+        # Cache miss: create the chart and store the written file or the returned html with the properties.
+        state = self.cache.state(key) if self.cache.get(key) is not None else None
+        if state is None:
+            html = func(self, *args, **kwargs)
+            if key is not None:
+                state = {'node_properties': getattr(self, 'node_properties', None), 'edge_properties': getattr(self, 'edge_properties', None), 'config': self.config}
+                if self.config.get('filepath', None) and os.path.isfile(self.config['filepath']):
+                    self.cache.put(key, func.__name__, filepath=self.config['filepath'], state=state)
+                elif isinstance(html, str):
+                    self.cache.put(key, func.__name__, html=html, state=state)
+            return html
+
+        # Cache hit: restore the properties and config, and copy the html to the filepath.
+        logger.info('Render cache: [%s] is unchanged and copied from [%s].' %(func.__name__, key))
+        self._clean(clean_config=True, logger=None)
+        self.chart = set_chart_func(func.__name__, logger=None)
+        self.node_properties = state['node_properties']
+        self.edge_properties = state['edge_properties']
+        # The settings of this instance that are not part of the key are kept.
+        self.config = {**state['config'], 'max_memory': self.config.get('max_memory', None), 'unique_filename': self.config.get('unique_filename', False)}
+        self.config.update({'filepath': utils.set_path(filepath, logger, unique=self.config.get('unique_filename', False)),
+                            'showfig': arguments.get('showfig', False),
+                            'notebook': arguments.get('notebook', False),
+                            'overwrite': arguments.get('overwrite', True),
+                            'return_html': arguments.get('return_html', False),
+                            })
+        keep_html = self.config['return_html'] or self.config['notebook'] or (self.config['filepath'] is None)
+        if self.config['filepath'] is None:
+            html = self.cache.read(key)
+        else:
+            render.write_assets(func.__name__, self.config, logger=logger)
+            chunks = [] if keep_html else None
+            utils._write_atomic(self.config, self.cache.chunks(key), logger, keep=chunks)
+            html = ''.join(chunks) if keep_html else None
+
+        self.display(html)
+        return html if self.config['return_html'] else None
+    return wrapper
+
+
 #%%
 class D3Blocks():
     """D3Blocks.
@@ -74,6 +181,25 @@ class D3Blocks():
             * 'text': I support this project with a text add.
             * 'image': I support this project with an image add.
             * False: I want to support in a different manner: https://d3blocks.github.io/d3blocks/pages/html/Documentation.html
+    assets : String, (default: 'inline')
+            How the vendored d3 libraries (and other static files) are embedded in the html.
+            * 'inline': Libraries are included in every html file. The html file is fully stand-alone.
+            * 'external': Libraries are written once to an 'assets' directory next to the html file with a content-hash filename and are referenced with <script src>.
+    profile : Bool, (default: False)
+            Record the wall time and peak allocated memory per pipeline stage of every chart call in d3.last_profile.
+            The stages are: set_node_properties, set_edge_properties, pre_processing, get_data_ready_for_d3, render and write.
+            Note that tracing the memory slows down the chart considerably.
+    cache_dir : String, (default: None)
+            Directory of the render cache. Charts that are called again with unchanged data and parameters are copied from the cache instead of being recomputed.
+            Inspect and clear the cache with d3.cache.info() and d3.cache.clear(). The imageslider, matrix, d3graph and elasticgraph charts are not cached.
+            * None: No caching.
+    cache_size : int, (default: 128)
+            Maximum number of charts in the render cache. The least recently used charts are removed first.
+    max_memory : int or String, (default: None)
+            Memory budget of a chart in bytes or with a unit, such as '500MB' or '2GB'. An error is raised before the input is processed or the html is rendered when the estimated memory exceeds the budget.
+            * None: No budget.
+    unique_filename : Bool, (default: False)
+            Add a random suffix to the filename of every chart, such as 'chord-3f2a9c1b0d4e.html'. Use this when several processes render the same chart into the same directory. The path of the last chart is in d3.config['filepath'].
 
     Returns
     -------
@@ -87,7 +213,7 @@ class D3Blocks():
 
     """
 
-    def __init__(self, chart: str = None, frame: bool = True, verbose: (int, str) = 'info', support: str = 'text') -> None:
+    def __init__(self, chart: str = None, frame: bool = True, verbose: (int, str) = 'info', support: str = 'text', assets: str = 'inline', profile: bool = False, cache_dir: str = None, cache_size: int = 128, max_memory: (int, str) = None, unique_filename: bool = False) -> None:
         """Initialize d3blocks with user-defined parameters."""
         # Set the logger
         if chart is not None: chart = str.capitalize(chart)
@@ -103,9 +229,18 @@ class D3Blocks():
         self.config['chart'] = chart
         self.config['frame'] = frame
         self.config['support'] = utils.get_support(support)
+        self.config['assets'] = assets
+        self.config['max_memory'] = utils.parse_memory(max_memory)
+        self.config['unique_filename'] = unique_filename
         self.config['curpath'] = os.path.dirname(os.path.abspath(__file__))
         self.logger = logger
+        self.profile = profile
+        self.last_profile = None
+        self.cache = cache.RenderCache(cache_dir, max_entries=cache_size) if cache_dir is not None else None
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def particles(self,
                   text: str,
                   radius: int = 3,
@@ -209,7 +344,7 @@ class D3Blocks():
 
         # Set config
         self.config['chart'] ='Particles'
-        self.config['filepath'] = utils.set_path(filepath, logger)
+        self.config['filepath'] = utils.set_path(filepath, logger, unique=self.config.get('unique_filename', False))
         self.config['title'] = title
         self.config['showfig'] = showfig
         self.config['overwrite'] = overwrite
@@ -222,15 +357,19 @@ class D3Blocks():
         self.config['spacing'] = spacing
         self.config['notebook'] = notebook
         self.config['save_button'] = save_button
-        self.chart = eval('Particles')
+        self.chart = set_chart_func('Particles', logger)
 
         # Create the plot
-        html = Particles.show(text, self.config, logger)
+        self.config['return_html'] = return_html
+        html = self.chart.show(text, self.config, logger)
         # Display the chart
         self.display(html)
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def violin(self,
                x,
                y,
@@ -397,15 +536,19 @@ class D3Blocks():
         # Store properties
         self.config = self.chart.set_config(config=self.config, filepath=filepath, title=title, showfig=showfig, overwrite=overwrite, figsize=figsize, cmap=cmap, bins=bins, ylim=ylim, x_order=x_order, reset_properties=reset_properties, notebook=notebook, fontsize=fontsize, fontsize_axis=fontsize_axis, save_button=save_button, logger=logger)
         # Remvove quotes from source-target node_properties
-        self.edge_properties = self.chart.set_edge_properties(x, y, config=self.config, color=color, size=size, stroke=stroke, opacity=opacity, tooltip=tooltip, cmap=self.config['cmap'], x_order=self.config['x_order'], fontsize=self.config['fontsize'], logger=logger)
+        with profiler.stage('set_edge_properties'):
+            self.edge_properties = self.chart.set_edge_properties(x, y, config=self.config, color=color, size=size, stroke=stroke, opacity=opacity, tooltip=tooltip, cmap=self.config['cmap'], x_order=self.config['x_order'], fontsize=self.config['fontsize'], logger=logger)
         # Set default label properties
         if self.config['reset_properties'] or (not hasattr(self, 'node_properties')):
             self.set_node_properties(np.unique(self.edge_properties['x'].values), cmap=self.config['cmap'])
         # Create the plot
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def scatter(self,
                 x,
                 y,
@@ -437,6 +580,8 @@ class D3Blocks():
                 save_button: bool = True,
                 return_html: bool = False,
                 reset_properties=True,
+                density_method='auto',
+                density_grid=128,
                 ):
         """Scatterplot block.
 
@@ -481,6 +626,13 @@ class D3Blocks():
                 * None: Do not use gradient.
                 * opaque: Towards the edges the points become more transparant. This will stress the dense areas and make scatter plot tidy.
                 * '#FFFFFF': Towards the edges it smooths into this color
+        density_method : String, (default: 'auto')
+            Method to determine the density for c_gradient.
+                * 'exact': Gaussian kernel density estimate. The computation time is quadratic in the number of points.
+                * 'grid': Kernel density on a grid using the FFT. Fast for large number of points and close to the exact density.
+                * 'auto': 'exact' for class labels up to 5000 points and 'grid' for larger class labels.
+        density_grid : int, (default: 128)
+            Number of grid points per dimension for the density_method 'grid'. Larger values are closer to the exact density.
         opacity: float or list/array [0-1]
             Opacity of the dot. Shoud be same size as (x,y)
         tooltip: list of labels with same size as (x,y)
@@ -712,16 +864,19 @@ class D3Blocks():
         # Store properties
         self.config = self.chart.set_config(config=self.config, filepath=filepath, title=title, showfig=showfig, overwrite=overwrite, figsize=figsize, cmap=cmap, scale=scale, ylim=ylim, xlim=xlim, label_radio=label_radio, color_background=color_background, reset_properties=reset_properties, notebook=notebook, jitter=jitter, save_button=save_button, logger=logger)
         # Check exceptions
-        Scatter.check_exceptions(x, y, x1, y1, x2, y2, x3, y3, size, color, tooltip, logger)
+        self.chart.check_exceptions(x, y, x1, y1, x2, y2, x3, y3, size, color, tooltip, logger)
         # Set node properties
         self.set_node_properties()
         # Set edge properties
-        self.set_edge_properties(x, y, x1=x1, y1=y1, x2=x2, y2=y2, x3=x3, y3=y3, color=color, size=size, tooltip=tooltip, opacity=opacity, c_gradient=c_gradient, stroke=stroke, cmap=self.config['cmap'], scale=self.config['scale'], jitter=self.config['jitter'], logger=logger)
+        self.set_edge_properties(x, y, x1=x1, y1=y1, x2=x2, y2=y2, x3=x3, y3=y3, color=color, size=size, tooltip=tooltip, opacity=opacity, c_gradient=c_gradient, density_method=density_method, density_grid=density_grid, stroke=stroke, cmap=self.config['cmap'], scale=self.config['scale'], jitter=self.config['jitter'], logger=logger)
         # Create the plot
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def chord(self,
               df,
               color='source',
@@ -757,6 +912,7 @@ class D3Blocks():
                 * "weight"
                 * "color" (optional)
                 * "opacity" (optional)
+            Edges that do not fit in memory can be given as a CSV or Parquet file or as an iterator of DataFrame chunks. The weights of duplicate (source, target) pairs are then summed (see edges.aggregate).
         color: (default: 'source')
             Link colors in Hex notation. Should be the same size as input DataFrame.
                 * "source" : Color edges/links similar to that of source-color node.
@@ -927,6 +1083,8 @@ class D3Blocks():
         * https://d3blocks.github.io/d3blocks/pages/html/Chord.html
 
         """
+        # Aggregate the edges of a file or of chunks
+        df = edges.aggregate(df, logger=logger)
         # Cleaning
         self._clean(clean_config=reset_properties, logger=logger)
         # Store chart
@@ -939,10 +1097,12 @@ class D3Blocks():
         # Set edge properties
         self.set_edge_properties(df, color=color, opacity=opacity, cmap=cmap, logger=logger)
         # Create the plot
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
     def imageslider(self,
                     img_before,
                     img_after,
@@ -1049,20 +1209,21 @@ class D3Blocks():
         self.config['scale'] = scale
         self.config['colorscale'] = colorscale
         self.config['background'] = background
-        self.config['filepath'] = utils.set_path(filepath, logger)
+        self.config['filepath'] = utils.set_path(filepath, logger, unique=self.config.get('unique_filename', False))
         self.config['title'] = title
         self.config['showfig'] = showfig
         self.config['overwrite'] = overwrite
         self.config['notebook'] = notebook
         self.config['figsize'] = figsize
         self.config['save_button'] = False
-        self.chart = eval('Imageslider')
+        self.chart = set_chart_func('Imageslider', logger)
         # if self.config['filepath'] is None: raise Exception('filepath can not be None.')
 
         # Preprocessing
-        self.config = Imageslider.preprocessing(self.config, logger=logger)
+        self.config = self.chart.preprocessing(self.config, logger=logger)
         # Create the plot
-        html = Imageslider.show(self.config, logger)
+        self.config['return_html'] = return_html
+        html = self.chart.show(self.config, logger)
         # Open the webbrowser
         # self.open_browser(logger=logger)
         # Display the chart
@@ -1070,6 +1231,9 @@ class D3Blocks():
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def sankey(self,
                df,
                color=None,
@@ -1103,6 +1267,7 @@ class D3Blocks():
                 * 'source'
                 * 'target'
                 * 'weight'
+            Edges that do not fit in memory can be given as a CSV or Parquet file or as an iterator of DataFrame chunks. The weights of duplicate (source, target) pairs are then summed (see edges.aggregate).
         color : dict or None.
             Dictionary containing node with color information.
                 color={'Nuclear': '#FF0000', 'Wind':'#FF0000'}
@@ -1232,6 +1397,8 @@ class D3Blocks():
         * https://d3blocks.github.io/d3blocks/pages/html/Sankey.html
 
         """
+        # Aggregate the edges of a file or of chunks
+        df = edges.aggregate(df, logger=logger)
         # Cleaning
         self._clean(clean_config=reset_properties, logger=logger)
         # Store chart
@@ -1246,10 +1413,13 @@ class D3Blocks():
         # Set edge properties
         self.set_edge_properties(df)
         # Create the plot and return html
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def movingbubbles(self,
                       df,
                       datetime: str = 'datetime',
@@ -1264,6 +1434,8 @@ class D3Blocks():
                       damper: float = 1,
                       fontsize: int = 14,
                       timedelta: str = 'minutes',
+                      max_ticks: int = 10000,
+                      resample: str = None,
                       standardize: str = 'samplewise',
                       speed: dict = {"slow": 1000, "medium": 200, "fast": 50},
                       figsize = [700, 800],
@@ -1275,6 +1447,7 @@ class D3Blocks():
                       overwrite: bool = True,
                       notebook: bool = False,
                       save_button: bool = True,
+                      packed: bool = False,
                       return_html: bool = False,
                       reset_properties: bool = True,
                       ):
@@ -1292,8 +1465,9 @@ class D3Blocks():
 
         Parameters
         ----------
-        df : Input data, pd.DataFrame()
-            Input data.
+        df : pd.DataFrame(), str or iterator of pd.DataFrame
+            Input data. Event logs that do not fit in memory can be given as a CSV or Parquet file or as an iterator of
+            DataFrames. The events are sorted with bounded memory and only standardize='samplewise' is supported.
         datetime : str, (default: 'datetime')
             Name of the column with the datetime.
         sample_id : str, (default: 'sample_id')
@@ -1332,6 +1506,14 @@ class D3Blocks():
                 * 'seconds'
                 * 'minutes'
                 * 'days'
+                * 'auto': The smallest unit for which the longest timeline has at most max_ticks ticks.
+        max_ticks : int, (default: 10000)
+            Maximum number of ticks of the animation for timedelta='auto'.
+        resample : str, (default: None)
+            Downsample the events of every sample_id into time buckets before standardizing. The state of a bucket is
+            the state of its last event and consecutive buckets with the same state are merged.
+                * None: No downsampling.
+                * '5min', 'h', 'D': Fixed frequency of the buckets.
 
         standardize : str. (default: None)
             Method to standardize the data.
@@ -1386,6 +1568,9 @@ class D3Blocks():
         save_button : bool, (default: True)
                 * True: Save button is shown in the HTML to save the image in svg.
                 * False: No save button is shown in the HTML.
+        packed : bool, (default: False)
+                * True: The sequences are run-length merged and stored as base64 encoded integer arrays in the HTML, which is much smaller for large datasets.
+                * False: The sequences are stored as text.
         return_html : bool, (default: False)
                 * True: Return html
                 * False: Nothing is returned
@@ -1472,17 +1657,23 @@ class D3Blocks():
         # Store chart
         self.chart = set_chart_func('Movingbubbles', logger)
         # Store properties
-        self.config = self.chart.set_config(config=self.config, filepath=filepath, title=title, showfig=showfig, overwrite=overwrite, figsize=figsize, timedelta=timedelta, speed=speed, damper=damper, note=note, time_notes=time_notes, fontsize=fontsize, standardize=standardize, center=center, datetime=datetime, sample_id=sample_id, state=state, reset_properties=reset_properties, cmap=cmap, dt_format=dt_format, notebook=notebook, color_method=color_method, save_button=save_button, logger=logger)
+        self.config = self.chart.set_config(config=self.config, filepath=filepath, title=title, showfig=showfig, overwrite=overwrite, figsize=figsize, timedelta=timedelta, max_ticks=max_ticks, resample=resample, speed=speed, damper=damper, note=note, time_notes=time_notes, fontsize=fontsize, standardize=standardize, center=center, datetime=datetime, sample_id=sample_id, state=state, reset_properties=reset_properties, cmap=cmap, dt_format=dt_format, notebook=notebook, color_method=color_method, save_button=save_button, packed=packed, logger=logger)
+        # Event logs from a file or from chunks are read once. The states are known afterwards.
+        if edges.is_edge_source(df):
+            df = events.read_events(df, sample_id=sample_id, datetime=datetime, state=state, dt_format=dt_format, standardize=standardize, minimum_time=timedelta, logger=logger)
         # Set node properties
         if self.config['reset_properties'] or (not hasattr(self, 'node_properties')):
-            self.set_node_properties(df[self.config['state']].values, center=self.config['center'], cmap=self.config['cmap'], logger=logger)
+            self.set_node_properties(df.states if isinstance(df, events.EventLog) else df[self.config['state']].values, center=self.config['center'], cmap=self.config['cmap'], logger=logger)
         # Set edge properties
-        self.set_edge_properties(df, timedelta=self.config['timedelta'], state=self.config['state'], datetime=self.config['datetime'], sample_id=self.config['sample_id'], size=size, color=color, standardize=self.config['standardize'], dt_format=self.config['dt_format'], logger=logger)
+        self.set_edge_properties(df, timedelta=self.config['timedelta'], state=self.config['state'], datetime=self.config['datetime'], sample_id=self.config['sample_id'], size=size, color=color, standardize=self.config['standardize'], dt_format=self.config['dt_format'], resample=self.config['resample'], logger=logger)
         # Create the plot
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def timeseries(self,
                    df,
                    datetime='datetime',
@@ -1626,6 +1817,7 @@ class D3Blocks():
         # Set edge properties
         self.set_edge_properties(df, dt_format=self.config['dt_format'], datetime=self.config['datetime'], logger=logger)
         # Create the plot
+        self.config['return_html'] = return_html
         html = self.chart.show(self.edge_properties, config=self.config, node_properties=self.node_properties, logger=logger)
         # Display the chart
         self.display(html)
@@ -1633,6 +1825,9 @@ class D3Blocks():
             return html
 
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def heatmap(self,
                 df,
                 scaler='zscore',
@@ -1670,6 +1865,7 @@ class D3Blocks():
         ----------
         df : pd.DataFrame()
             Input data. The index and column names are used for the row/column naming.
+            Edges with the columns source, target and weight can also be given as a CSV or Parquet file or as an iterator of DataFrame chunks (see edges.aggregate).
         scaler : str, (default: 'zscore')
             Scale the edge-width using the following scaler:
             'zscore' : Scale values to Z-scores.
@@ -1806,6 +2002,8 @@ class D3Blocks():
         * https://erdogant.github.io/clusteval/
 
         """
+        # Aggregate the edges of a file or of chunks
+        df = edges.aggregate(df, logger=logger)
         if len(df.columns.unique())!=len(df.columns):
             logger.warning('[Input data should contain unique column names otherwise d3js randomly removes the non-unique ones.')
         if len(df.index.unique())!=len(df.index):
@@ -1827,12 +2025,15 @@ class D3Blocks():
         # Color on cluster labels
         self.chart.set_colors(df, node_properties=self.node_properties, config=self.config, logger=logger)
         # Set edge properties
-        self.edge_properties = self.chart.set_edge_properties(df, config=self.config, logger=logger)
+        with profiler.stage('set_edge_properties'):
+            self.edge_properties = self.chart.set_edge_properties(df, config=self.config, logger=logger)
         # Create the plot
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
     def matrix(self,
                df,
                scale=False,
@@ -1858,6 +2059,7 @@ class D3Blocks():
         ----------
         df : pd.DataFrame()
             Input data. The index and column names are used for the row/column naming.
+            Edges with the columns source, target and weight can also be given as a CSV or Parquet file or as an iterator of DataFrame chunks (see edges.aggregate).
         scale : Bool, (default: True).
             Scale data in range Scaling in range by X*(100/max(X)).
                 * True: Scale the values.
@@ -1946,6 +2148,10 @@ class D3Blocks():
         * https://github.com/d3/d3-scale-chromatic
 
         """
+        # Aggregate the edges of a file or of chunks into the adjacency matrix
+        if edges.is_edge_source(df):
+            df = edges.aggregate(df, logger=logger)
+            df = self.vec2adjmat(df['source'], df['target'], weight=df['weight'], symmetric=True)
         if len(df.columns.unique())!=len(df.columns):
             logger.warning('Input data should contain unique column names otherwise d3js randomly removes the non-unique ones.')
         if len(df.index.unique())!=len(df.index):
@@ -1972,6 +2178,8 @@ class D3Blocks():
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
     def d3graph(self,
                 df,
                 color='cluster',
@@ -2215,7 +2423,7 @@ class D3Blocks():
         # Set configs
         self.config['chart'] ='network'
         self.config['title'] = title
-        self.config['filepath'] = utils.set_path(filepath)
+        self.config['filepath'] = utils.set_path(filepath, unique=self.config.get('unique_filename', False))
         self.config['figsize'] = figsize
         self.config['showfig'] = showfig
         self.config['overwrite'] = overwrite
@@ -2234,6 +2442,7 @@ class D3Blocks():
         # Remvove quotes from source-target labels
         df = utils.remove_quotes(df)
         # Initialize network graph
+        import d3graph as d3network
         self.D3graph = d3network.d3graph(collision=collision, charge=charge, link_tension=link_tension, slider=slider, support=support)
         # Convert vector to adjmat
         adjmat = d3network.vec2adjmat(df['source'], df['target'], weight=df['weight'])
@@ -2268,6 +2477,8 @@ class D3Blocks():
         # Display the chart
         # return self.display(html)
 
+    @_check_memory
+    @_profile_chart
     def elasticgraph(self,
                      df,
                      scaler='zscore',
@@ -2394,7 +2605,7 @@ class D3Blocks():
         # Set configs
         self.config['chart'] ='elasticgraphh'
         self.config['title'] = title
-        self.config['filepath'] = utils.set_path(filepath)
+        self.config['filepath'] = utils.set_path(filepath, unique=self.config.get('unique_filename', False))
         self.config['figsize'] = figsize
         self.config['showfig'] = showfig
         self.config['overwrite'] = overwrite
@@ -2412,7 +2623,8 @@ class D3Blocks():
         # Remvove quotes from source-target labels
         df = utils.remove_quotes(df)
         # Initialize network d3-elasticgraph-network
-        self.Elasticgraph = Elasticgraph(collision=collision, charge=charge, radius=size, hull_offset=hull_offset, single_click_expand=single_click_expand, sticky=sticky, label_zoom_threshold=label_zoom_threshold)
+        import d3graph as d3network
+        self.Elasticgraph = get_chart_module('Elasticgraph').Elasticgraph(collision=collision, charge=charge, radius=size, hull_offset=hull_offset, single_click_expand=single_click_expand, sticky=sticky, label_zoom_threshold=label_zoom_threshold)
         # Convert vector to adjmat
         adjmat = d3network.vec2adjmat(df['source'], df['target'], weight=df['weight'])
         # Create default graph
@@ -2423,6 +2635,9 @@ class D3Blocks():
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def tree(self,
              df: pd.DataFrame,
              hierarchy = [1, 2, 3, 4, 5, 6, 7, 8],
@@ -2599,11 +2814,14 @@ class D3Blocks():
         # Set edge properties
         self.set_edge_properties(df)
         # Create the plot
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def radialgraph(self,
                      df: pd.DataFrame,
                      center: str = None,
@@ -2666,6 +2884,7 @@ class D3Blocks():
         df : pd.DataFrame()
             Input data containing the following columns:
                 * 'source', 'target', 'weight'
+            Edges that do not fit in memory can be given as a CSV or Parquet file or as an iterator of DataFrame chunks. The weights of duplicate (source, target) pairs are then summed (see edges.aggregate).
         center : str, (default: None)
             Focal node name. None: highest-degree node is chosen automatically.
             A node name: concentric rings by hop-distance from that node.
@@ -2769,6 +2988,8 @@ class D3Blocks():
         * https://d3blocks.github.io/d3blocks/pages/html/RadialGraph.html
 
         """
+        # Aggregate the edges of a file or of chunks
+        df = edges.aggregate(df, logger=logger)
         # Create unique dataframe, update weights
         df = utils.create_unique_dataframe(df, method='sum', logger=logger)
         # Cleaning
@@ -2819,10 +3040,13 @@ class D3Blocks():
             min_weight=min_weight,
         )
         # Create the plot
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def treemap(self,
                 df: pd.DataFrame,
                 margin = {"top": 40, "right": 10, "bottom": 10, "left": 10},
@@ -2835,7 +3059,8 @@ class D3Blocks():
                 overwrite: bool = True,
                 notebook: bool = False,
                 return_html: bool = False,
-                reset_properties: bool = True):
+                reset_properties: bool = True,
+                aggregate: bool = False):
         """Treemap block.
 
         A Treemap chart is a visualization to hierarchically show the data as a set of nested rectangles.
@@ -2848,6 +3073,7 @@ class D3Blocks():
             Input data containing the following columns:
                 * 'source', 'target', 'weight'
                 * 'level0', 'level1', 'level2', 'weight'
+                * Any number of level columns, in order of hierarchy from left to right, followed by 'weight'.
         margin : dict.
             margin, in pixels.
                 * {"top": 40, "right": 10, "bottom": 10, "left": 10}
@@ -2888,6 +3114,9 @@ class D3Blocks():
         reset_properties : bool, (default: True)
                 * True: Reset the node_properties at each run.
                 * False: Use the d3.node_properties()
+        aggregate : bool, (default: False)
+                * True: Rows with the same path are combined into one rectangle and the weights are summed.
+                * False: Every row is a rectangle.
 
         Returns
         -------
@@ -2972,7 +3201,7 @@ class D3Blocks():
         # Store chart
         self.chart = set_chart_func('Treemap', logger)
         # Store properties
-        self.config = self.chart.set_config(config=self.config, filepath=filepath, border=border, font=font, title=title, showfig=showfig, overwrite=overwrite, figsize=figsize, margin=margin, reset_properties=reset_properties, notebook=notebook, save_button=False, logger=logger)
+        self.config = self.chart.set_config(config=self.config, filepath=filepath, border=border, font=font, title=title, showfig=showfig, overwrite=overwrite, figsize=figsize, margin=margin, reset_properties=reset_properties, notebook=notebook, save_button=False, aggregate=aggregate, logger=logger)
         # Cleaning of data
         # Convert NumPy types to regular Python types for proper JSON serialization
         df = utils.pre_processing(df, labels=[str(x) for x in df.columns.values[:-1]], logger=logger)
@@ -2982,10 +3211,13 @@ class D3Blocks():
         # Set edge properties
         self.set_edge_properties(df)
         # Create the plot
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def circlepacking(self,
                       df,
                       size: str ='sum',
@@ -3152,10 +3384,13 @@ class D3Blocks():
         # Set edge properties
         self.set_edge_properties(df)
         # Create the plot
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
+    @_check_memory
+    @_profile_chart
+    @_cache_chart
     def maps(self,
              df,
              size=10,
@@ -3328,7 +3563,7 @@ class D3Blocks():
         # Set edge properties
         self.set_edge_properties(countries)
         # Create the plot
-        html = self.show()
+        html = self.show(return_html=return_html)
         if return_html:
             return html
 
@@ -3368,7 +3603,8 @@ class D3Blocks():
 
         # Compute edge properties for the specified chart.
         if self.chart is not None:
-            edge_properties = self.chart.set_edge_properties(*args, config=self.config, node_properties=self.node_properties, **kwargs)
+            with profiler.stage('set_edge_properties'):
+                edge_properties = self.chart.set_edge_properties(*args, config=self.config, node_properties=self.node_properties, **kwargs)
 
         # Convert to frame/dictionary
         # self.edge_properties = utils.convert_dataframe_dict(edge_properties, frame=self.config['frame'], chart=self.config['chart'], logger=logger)
@@ -3396,7 +3632,8 @@ class D3Blocks():
         if self.config['chart']=='Sankey' and hasattr(self, 'config') and kwargs.get('fontsize', None) is None:
             kwargs['fontsize'] = self.config['fontsize']
         if self.chart is not None:
-            labels = self.chart.set_node_properties(*args, **kwargs)
+            with profiler.stage('set_node_properties'):
+                labels = self.chart.set_node_properties(*args, **kwargs)
         else:
             raise Exception(logger.error('You need to specify the chart during initialization. Hint: d3 = D3Blocks(chart="movingbubbles")'))
 
@@ -3431,6 +3668,13 @@ class D3Blocks():
         notebook : bool
                 * True: Use IPython to show chart in notebooks.
                 * False: Do not use IPython.
+        assets : String, (default: None)
+                * None: Use the setting of the initialization.
+                * 'inline': Include the d3 libraries in the html file.
+                * 'external': Write the d3 libraries once to the 'assets' directory next to the html file.
+        return_html : bool, (default: True)
+                * True: Return the html.
+                * False: Stream the html to disk without keeping it in memory and return None.
         kwargs : Various
             Other options are possible depending on the chart that is being used.
 
@@ -3455,10 +3699,16 @@ class D3Blocks():
         if kwargs.get('node_properties', None) is not None:
             self.node_properties = kwargs.get('node_properties')
             kwargs.pop('node_properties')
+        if kwargs.get('assets', None) is not None:
+            self.config['assets'] = kwargs.get('assets')
+        kwargs.pop('assets', None)
+        # The html is only kept in memory when it is returned or shown in a notebook.
+        self.config['return_html'] = kwargs.pop('return_html', True)
 
-        # Create the plot
+        # Create the plot. The edge_properties are not copied again: only the columns that are changed are copied.
         if self.chart is not None:
-            html = self.chart.show(self.edge_properties, config=self.config, node_properties=self.node_properties, logger=logger, **kwargs)
+            with utils.copy_on_write():
+                html = self.chart.show(self.edge_properties, config=self.config, node_properties=self.node_properties, logger=logger, **kwargs)
 
         # Display the chart
         self.display(html)
@@ -3502,8 +3752,11 @@ class D3Blocks():
             chart = self.config.get('chart', None)
             frame = self.config.get('frame', True)
             support = self.config.get('support', 'text')
+            assets = self.config.get('assets', 'inline')
+            max_memory = self.config.get('max_memory', None)
+            unique_filename = self.config.get('unique_filename', False)
             curpath = self.config.get('curpath', os.path.dirname(os.path.abspath(__file__)))
-            self.config = {'chart': chart, 'frame': frame, 'curpath': curpath, 'notebook': False, 'support': support}
+            self.config = {'chart': chart, 'frame': frame, 'curpath': curpath, 'notebook': False, 'support': support, 'assets': assets, 'max_memory': max_memory, 'unique_filename': unique_filename}
 
     @staticmethod
     def vec2adjmat(source, target, weight=None, symmetric=True, aggfunc='sum'):
@@ -3574,7 +3827,7 @@ class D3Blocks():
         >>> vector = d3.adjmat2vec(adjmat)
 
         """
-        return d3network.adjmat2vec(df, min_weight=min_weight)
+        return utils.adjmat2vec(df, min_weight=min_weight)
 
     def import_example(self, data, n=10000, c=300, date_start="17-12-1903 00:00:00", date_stop="17-12-1903 23:59:59", overwrite=False):
         """Import example dataset from github source.
@@ -3621,6 +3874,7 @@ class D3Blocks():
         if np.isin(data, ['animals', 'mnist', 'movingbubbles', 'random_time', 'timeseries', 'southern_nebula_internet', 'climate']):
             return _import_example(data=data, n=n, c=c, date_start=date_start, date_stop=date_stop, dt_format='%d-%m-%Y %H:%M:%S', logger=logger)
         else:
+            import datazets as dz
             return dz.get(data=data, verbose=get_logger(), overwrite=overwrite)
 
 
@@ -3675,13 +3929,14 @@ def _import_example(data, n=10000, c=1000, date_start=None, date_stop=None, dt_f
     if data=='movingbubbles':
         url='https://erdogant.github.io/datasets/movingbubbles.zip'
     elif data=='random_time':
-        return Movingbubbles.generate_data_with_random_datetime(n, c=c, date_start=date_start, date_stop=date_stop, dt_format=dt_format, logger=logger)
+        return get_chart_module('Movingbubbles').generate_data_with_random_datetime(n, c=c, date_start=date_start, date_stop=date_stop, dt_format=dt_format, logger=logger)
     elif data=='timeseries':
         df = pd.DataFrame(np.random.randint(0, n, size=(n, 6)), columns=list('ABCDEF'))
         df['datetime'] = list(map(lambda x: random_date(date_start, date_stop, random.random(), dt_format=dt_format), range(0, n)), dt_format=dt_format)
         return df
     elif data=='bigbang':
         # Initialize
+        import d3graph as d3network
         d3model = d3network.d3graph()
         df = d3model.import_example('bigbang')[0]
         return d3network.adjmat2vec(df)
@@ -3729,7 +3984,7 @@ def _import_example(data, n=10000, c=1000, date_start=None, date_stop=None, dt_f
     # Import local dataset
     logger.info('Import dataset: [%s]' %(data))
     if data=='movingbubbles':
-        X = Movingbubbles.import_example(csvfile)
+        X = get_chart_module('Movingbubbles').import_example(csvfile)
         labels = "{'index': '0', 'short': 'Sleeping', 'desc': 'Sleeping'}, {'index': '1', 'short': 'Personal Care', 'desc': 'Personal Care'}, {'index': '2', 'short': 'Eating & Drinking', 'desc': 'Eating and Drinking'}, {'index': '3', 'short': 'Education', 'desc': 'Education'}, {'index': '4', 'short': 'Work', 'desc': 'Work and Work-Related Activities'}, {'index': '5', 'short': 'Housework', 'desc': 'Household Activities'}, {'index': '6', 'short': 'Household Care', 'desc': 'Caring for and Helping Household Members'}, {'index': '7', 'short': 'Non-Household Care', 'desc': 'Caring for and Helping Non-Household Members'}, {'index': '8', 'short': 'Shopping', 'desc': 'Consumer Purchases'}, {'index': '9', 'short': 'Pro. Care Services', 'desc': 'Professional and Personal Care Services'}, {'index': '10', 'short': 'Leisure', 'desc': 'Socializing, Relaxing, and Leisure'}, {'index': '11', 'short': 'Sports', 'desc': 'Sports, Exercise, and Recreation'}, {'index': '12', 'short': 'Religion', 'desc': 'Religious and Spiritual Activities'}, {'index': '13', 'short': 'Volunteering', 'desc': 'Volunteer Activities'}, {'index': '14', 'short': 'Phone Calls', 'desc': 'Telephone Calls'}, {'index': '15', 'short': 'Misc.', 'desc': 'Other'}, {'index': '16', 'short': 'Traveling', 'desc': 'Traveling'}"
         df = {}
         df['type'] = 'movingbubbles'
@@ -3799,6 +4054,7 @@ def wget(url, writepath):
     None.
 
     """
+    import requests
     r = requests.get(url, stream=True)
     with open(writepath, "wb") as fd:
         for chunk in r.iter_content(chunk_size=1024):
@@ -3912,10 +4168,37 @@ def set_chart_func(chart=None, logger=None):
     if chart is not None:
         if logger is not None: logger.info('Initializing [%s]' %(chart))
         chart = str.capitalize(chart)
-        if np.isin(chart, ['Maps', 'Chord', 'Sankey', 'Timeseries', 'Violin', 'Movingbubbles', 'Scatter', 'Heatmap', 'Matrix', 'Treemap', 'Tree', 'Circlepacking', 'Radialgraph']):
-            chart=eval(chart)
+        if chart in CHART_MODULES:
+            chart = get_chart_module(chart)
         else:
             if logger is not None: logger.info('%s is not yet implemented in such manner.' %(chart))
             chart = None
 
     return chart
+
+
+def get_chart_module(chart):
+    """Import the module of a chart on first use.
+
+    Parameters
+    ----------
+    chart : str
+        Name of the chart, e.g., 'Sankey'.
+
+    Returns
+    -------
+    Module of the chart.
+
+    """
+    if __package__:
+        return importlib.import_module('%s.%s' %(__package__, CHART_MODULES[chart]))
+    # ###################### DEBUG ONLY ###################
+    return importlib.import_module(CHART_MODULES[chart])
+
+
+def __getattr__(name):
+    # Chart modules remain available as attributes of this module, e.g., d3blocks.d3blocks.Sankey.
+    if name in CHART_MODULES:
+        module = get_chart_module(name)
+        return module.Elasticgraph if name == 'Elasticgraph' else module
+    raise AttributeError('module %r has no attribute %r' %(__name__, name))
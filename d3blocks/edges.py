@@ -0,0 +1,212 @@
+"""Edges.
+
+Aggregation of edge lists that do not fit in memory. The edges are read in chunks from an iterator of DataFrames or
+from a CSV or Parquet file. The weights of duplicate (source, target) pairs are summed per chunk with integer codes of
+the interned labels, and only the aggregated edge table is created.
+
+Library     : d3blocks
+Author      : E.Taskesen
+Mail        : erdogant@gmail.com
+Github      : https://github.com/d3blocks/d3blocks
+License     : GPL3
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+# Number of rows that are read per chunk from a file.
+CHUNKSIZE = 1_000_000
+# The source and target codes are combined into one int64 key.
+_SHIFT = np.int64(32)
+_MASK = np.int64((1 << 32) - 1)
+
+
+# %% Aggregator
+class EdgeAggregator:
+    """Sum the weights of (source, target) pairs over chunks of edges.
+
+    Parameters
+    ----------
+    source : str, (default: 'source')
+        Column with the source labels.
+    target : str, (default: 'target')
+        Column with the target labels.
+    weight : str, (default: 'weight')
+        Column with the weights. Chunks without this column get weight 1 per edge.
+
+    Examples
+    --------
+    >>> agg = EdgeAggregator()
+    >>> for chunk in pd.read_csv('edges.csv', chunksize=100000):
+    >>>     agg.update(chunk)
+    >>> df = agg.result()
+
+    """
+
+    def __init__(self, source='source', target='target', weight='weight'):
+        self.source = source
+        self.target = target
+        self.weight = weight
+        self.labels = pd.Index([], dtype=object)
+        self.n_rows = 0
+        self._keys, self._weights = [], []
+        self._size, self._pending = 0, 0
+
+    def _intern(self, values):
+        """Return the code of every label. New labels are appended to the labels."""
+        codes = self.labels.get_indexer(values)
+        new = codes < 0
+        if np.any(new):
+            self.labels = self.labels.append(pd.Index(pd.unique(values[new]), dtype=object))
+            codes[new] = self.labels.get_indexer(values[new])
+        return codes.astype(np.int64)
+
+    def update(self, df):
+        """Add a chunk of edges.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Chunk with the source, target and optionally the weight column.
+
+        """
+        if not np.all(np.isin([self.source, self.target], df.columns)):
+            raise Exception('The chunks of edges should contain the columns [%s] and [%s].' %(self.source, self.target))
+        source = df[self.source].to_numpy(dtype=object)
+        target = df[self.target].to_numpy(dtype=object)
+        weight = df[self.weight].to_numpy(dtype=float) if self.weight in df.columns else np.ones(len(df))
+        self.n_rows += len(df)
+
+        # Edges without source or target are removed and missing weights are not counted, as in groupby().sum().
+        keep = ~(pd.isna(source) | pd.isna(target))
+        if not np.all(keep): source, target, weight = source[keep], target[keep], weight[keep]
+        weight = np.where(np.isnan(weight), 0, weight)
+        if len(source) == 0: return
+        codes = self._intern(np.concatenate([source, target]))
+        if len(self.labels) > _MASK: raise Exception('The number of unique labels exceeds %d.' %(_MASK))
+        key = (codes[:len(source)] << _SHIFT) | codes[len(source):]
+
+        ukey, inverse = np.unique(key, return_inverse=True)
+        self._keys.append(ukey)
+        self._weights.append(np.bincount(inverse, weights=weight, minlength=len(ukey)))
+        self._pending += len(ukey)
+        # Merge the partial sums once they are larger than the aggregated edges.
+        if self._pending > max(CHUNKSIZE, self._size): self._compact()
+
+    def _compact(self):
+        if len(self._keys) > 1:
+            ukey, inverse = np.unique(np.concatenate(self._keys), return_inverse=True)
+            self._keys, self._weights = [ukey], [np.bincount(inverse, weights=np.concatenate(self._weights), minlength=len(ukey))]
+        self._size = len(self._keys[0]) if self._keys else 0
+        self._pending = 0
+
+    def result(self):
+        """Return the aggregated edges.
+
+        Returns
+        -------
+        pd.DataFrame
+            Columns source, target and weight with one row per unique pair, sorted on source and target.
+
+        """
+        self._compact()
+        key = self._keys[0] if self._keys else np.zeros(0, dtype=np.int64)
+        weight = self._weights[0] if self._weights else np.zeros(0)
+        labels = self.labels.to_numpy()
+        df = pd.DataFrame({'source': labels[key >> _SHIFT], 'target': labels[key & _MASK], 'weight': weight})
+        try:
+            df = df.sort_values(by=['source', 'target'], kind='stable', ignore_index=True)
+        except TypeError:
+            # Labels of mixed types can not be sorted.
+            pass
+        return df
+
+
+# %% Reading
+def is_edge_source(data):
+    """Return True when the edges are given as a file path or as an iterator of chunks instead of a DataFrame."""
+    if isinstance(data, (pd.DataFrame, pd.Series, np.ndarray, dict, list, tuple)): return False
+    return isinstance(data, (str, os.PathLike)) or hasattr(data, '__iter__')
+
+
+def read_chunks(data, chunksize=CHUNKSIZE, columns=None):
+    """Yield the rows of the data in chunks of DataFrames.
+
+    Parameters
+    ----------
+    data : str, os.PathLike, pd.DataFrame or iterator of pd.DataFrame
+        CSV (.csv, .csv.gz, .txt) or Parquet (.parquet, .pq) file, a DataFrame or an iterator of DataFrames.
+    chunksize : int, (default: 1_000_000)
+        Number of rows per chunk that is read from a file.
+    columns : list of str, (default: None)
+        Columns that are read from a file. None reads all columns.
+
+    """
+    if isinstance(data, pd.DataFrame):
+        yield data
+        return
+    if not isinstance(data, (str, os.PathLike)):
+        for chunk in data:
+            if not isinstance(chunk, pd.DataFrame): raise Exception('The chunks should be DataFrames and not [%s].' %(type(chunk).__name__))
+            yield chunk
+        return
+
+    filepath = os.fspath(data)
+    if not os.path.isfile(filepath): raise Exception('File with edges does not exist: [%s]' %(filepath))
+    if filepath.lower().endswith(('.parquet', '.pq')):
+        if pq is None: raise Exception('Reading Parquet files requires pyarrow: pip install pyarrow')
+        parquet = pq.ParquetFile(filepath)
+        if columns is not None: columns = [col for col in columns if col in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        usecols = None if columns is None else (lambda col: col in columns)
+        yield from pd.read_csv(filepath, chunksize=chunksize, usecols=usecols)
+
+
+def aggregate(data, source='source', target='target', weight='weight', chunksize=CHUNKSIZE, logger=None):
+    """Aggregate edges from a file or from an iterator of chunks into one edge table.
+
+    DataFrames are returned as is, so that the blocks keep their behavior for data that is in memory.
+
+    Parameters
+    ----------
+    data : str, os.PathLike, pd.DataFrame or iterator of pd.DataFrame
+        Edges with the source, target and optionally the weight column (see read_chunks).
+    source : str, (default: 'source')
+        Column with the source labels.
+    target : str, (default: 'target')
+        Column with the target labels.
+    weight : str, (default: 'weight')
+        Column with the weights.
+    chunksize : int, (default: 1_000_000)
+        Number of rows per chunk that is read from a file.
+    logger : logging.Logger, optional
+        A logger object to output log messages (optional)
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns source, target and weight with the summed weight per unique (source, target) pair.
+
+    Examples
+    --------
+    >>> from d3blocks import edges
+    >>> df = edges.aggregate('edges.parquet')
+    >>> # The blocks also accept the file or an iterator of chunks directly.
+    >>> d3.chord(pd.read_csv('edges.csv', chunksize=100000))
+
+    """
+    if not is_edge_source(data): return data
+    agg = EdgeAggregator(source=source, target=target, weight=weight)
+    for chunk in read_chunks(data, chunksize=chunksize, columns=[source, target, weight]):
+        agg.update(chunk)
+    df = agg.result()
+    if logger is not None: logger.info('Aggregated %d edges into %d unique edges between %d labels.' %(agg.n_rows, df.shape[0], len(agg.labels)))
+    return df
@@ -10,11 +10,14 @@ import logging
 import os
 from typing import List, Union, Tuple
 from d3graph import d3graph, json_create, data_checks, make_graph
-from jinja2 import Environment, PackageLoader
 import webbrowser
 import time
 from sys import platform
 from pathlib import Path
+try:
+    from .. render import get_template
+except:
+    from render import get_template
 
 logger = logging.getLogger(__name__)
 
@@ -348,11 +351,7 @@ class Elasticgraph:
             'label_zoom_threshold': self.D3graph.config['label_zoom_threshold'],
         }
 
-        try:
-            jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-        except:
-            jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.elasticgraph', package_path='d3js'))
-        index_template = jinja_env.get_template('elasticgraph.html.j2')
+        index_template = get_template('elasticgraph', 'elasticgraph.html.j2')
         html = index_template.render(content)
 
         index_file = self.D3graph.config['filepath']
@@ -0,0 +1,414 @@
+"""Events.
+
+Reading of event logs that do not fit in memory for the movingbubbles block. The events are read in chunks from an
+iterator of DataFrames or from a CSV or Parquet file. The datetimes are parsed per chunk, the sample_ids and states are
+interned into integer codes, and every chunk is sorted on (sample_id, datetime) and written to a temporary file. The
+sorted runs are merged block by block and the time to the next event of the same sample_id is computed while merging.
+Only the state code and the time in state of every event are kept.
+
+Library     : d3blocks
+Author      : E.Taskesen
+Mail        : erdogant@gmail.com
+Github      : https://github.com/d3blocks/d3blocks
+License     : GPL3
+"""
+
+import os
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+
+try:
+    from .edges import read_chunks
+except:
+    from edges import read_chunks
+
+# Number of rows that are read per chunk and that are sorted in memory per run.
+CHUNKSIZE = 1_000_000
+# Events of a run: sample_id code, datetime in nanoseconds and state code.
+_RUN_DTYPE = np.dtype([('sample', '<i8'), ('time', '<i8'), ('state', '<i4')])
+# The minimum time in state that replaces a time of zero.
+MINIMUM_TIME = {'seconds': 1, 'minutes': 60, 'days': 86400}
+
+
+# %% Event log
+class EventLog:
+    """State sequences of the sample_ids that are read from an event log.
+
+    Attributes
+    ----------
+    uiid : np.ndarray
+        The sorted unique sample_ids.
+    indptr : np.ndarray
+        The events of uiid[i] are indptr[i]:indptr[i + 1].
+    state : np.ndarray
+        Code of the state of every event, in the order of datetime within a sample_id. states[code] is the label.
+    delta : np.ndarray
+        Time in state of every event in nanoseconds: the time to the next event of the same sample_id. The last
+        event of a sample_id has zero time.
+    states : np.ndarray
+        The state labels in order of appearance.
+    first_datetime : pd.Series
+        Datetime of the first event of every sample_id, indexed by uiid.
+    datetime_min, datetime_max : pd.Timestamp
+        First and last datetime of the event log.
+    minimum_time : int
+        Time in nanoseconds that replaces a time in state of zero.
+    nodes : pd.DataFrame
+        Columns sample_id, size and color with one row per sample_id (set by the movingbubbles block).
+
+    """
+
+    def __init__(self, uiid, indptr, state, delta, states, first_datetime, datetime_min, datetime_max, minimum_time=MINIMUM_TIME['minutes'] * 10**9):
+        self.uiid = uiid
+        self.indptr = indptr
+        self.state = state
+        self.delta = delta
+        self.states = states
+        self.first_datetime = first_datetime
+        self.datetime_min = datetime_min
+        self.datetime_max = datetime_max
+        self.minimum_time = minimum_time
+        self.nodes = None
+
+    def __len__(self):
+        return len(self.state)
+
+    def __repr__(self):
+        return 'EventLog with %d events of %d sample_ids and %d states' %(len(self), len(self.uiid), len(self.states))
+
+    def state_ids(self, labels):
+        """Return the id of the state of every event from the label properties {label: {'id': ...}}."""
+        ids = np.array([labels[label]['id'] if label in labels else -1 for label in self.states], dtype=np.int64)
+        if np.any(ids < 0): raise Exception('States are missing in the node properties: %s' %(self.states[ids < 0][:10]))
+        return ids[self.state]
+
+    def seconds(self):
+        """Return the time in state of every event in seconds."""
+        # Zero time causes a total halt of movements. Prevent by setting the minimum time.
+        return np.where(self.delta == 0, self.minimum_time, self.delta) / 1e9
+
+    def groups(self):
+        """Return the index in uiid of every event."""
+        return np.repeat(np.arange(len(self.uiid)), np.diff(self.indptr))
+
+    def resample(self, freq, logger=None):
+        """Return the event log with the events of every sample_id in time buckets of the frequency (see downsample).
+
+        Parameters
+        ----------
+        freq : str or pd.Timedelta
+            Fixed frequency, such as '5min', 'h' or 'D'.
+        logger : logging.Logger, optional
+            A logger object to output log messages (optional)
+
+        Returns
+        -------
+        EventLog
+
+        """
+        group = self.groups()
+        # The datetime of every event is the first datetime of its sample_id plus the time in state of the previous events.
+        elapsed = np.cumsum(self.delta) - self.delta
+        start = self.first_datetime.to_numpy(dtype='datetime64[ns]').view(np.int64) - elapsed[self.indptr[:-1]]
+        keep, bucket = downsample(group, start[group] + elapsed, self.state, freq)
+        group = group[keep]
+        last = np.r_[group[1:] != group[:-1], True]
+        delta = np.where(last, 0, np.diff(bucket, append=bucket[-1:]))
+        counts = np.bincount(group, minlength=len(self.uiid))
+        if logger is not None: logger.info('Resampled %d events into %d events with frequency [%s].' %(len(self), len(keep), freq))
+        eventlog = EventLog(uiid=self.uiid,
+                            indptr=np.r_[0, np.cumsum(counts)],
+                            state=self.state[keep],
+                            delta=delta,
+                            states=self.states,
+                            first_datetime=pd.Series(pd.to_datetime(bucket[np.r_[True, last[:-1]]]), index=self.uiid),
+                            datetime_min=pd.Timestamp(bucket.min()) if len(bucket) else None,
+                            datetime_max=pd.Timestamp(bucket.max()) if len(bucket) else None,
+                            minimum_time=self.minimum_time,
+                            )
+        eventlog.nodes = self.nodes
+        return eventlog
+
+
+# %% Downsampling
+def _nanos(freq):
+    """Return the length of a fixed frequency in nanoseconds."""
+    try:
+        # Deprecated aliases, such as 'M', are non-fixed frequencies and are rejected without the pandas warning.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            return int(pd.tseries.frequencies.to_offset(freq).nanos)
+    except (ValueError, TypeError):
+        raise Exception('resample should be a fixed frequency, such as "5min", "h" or "D", and not [%s].' %(freq))
+
+
+def downsample(group, times, state, freq):
+    """Bucket the events of every group into time buckets and merge consecutive buckets with the same state.
+
+    The state of a bucket is the state of its last event, so that short visits within a bucket are removed. The event
+    of a state change gets the start of its bucket as datetime.
+
+    Parameters
+    ----------
+    group : np.ndarray
+        Group of every event. The events are sorted on (group, times).
+    times : np.ndarray
+        Datetime of every event in nanoseconds.
+    state : np.ndarray
+        State code of every event.
+    freq : str or pd.Timedelta
+        Fixed frequency, such as '5min', 'h' or 'D'.
+
+    Returns
+    -------
+    keep : np.ndarray
+        Index of the events that are kept.
+    bucket : np.ndarray
+        Start of the bucket of the kept events in nanoseconds.
+
+    """
+    nanos = _nanos(freq)
+    bucket = np.asarray(times, dtype=np.int64) // nanos * nanos
+    # The state at the end of a bucket is the state of the last event in the bucket.
+    last = np.ones(len(bucket), dtype=bool)
+    last[:-1] = (group[1:] != group[:-1]) | (bucket[1:] != bucket[:-1])
+    keep = np.flatnonzero(last)
+    # Consecutive buckets with the same state are merged into the first bucket.
+    first = np.ones(len(keep), dtype=bool)
+    first[1:] = (group[keep][1:] != group[keep][:-1]) | (state[keep][1:] != state[keep][:-1])
+    keep = keep[first]
+    return keep, bucket[keep]
+
+
+# %% Sequencer
+class EventSequencer:
+    """Sort the events of chunks on (sample_id, datetime) with an external merge and compute the time in state.
+
+    Parameters
+    ----------
+    sample_id : str, (default: 'sample_id')
+        Column with the sample ids.
+    datetime : str, (default: 'datetime')
+        Column with the datetime.
+    state : str, (default: 'state')
+        Column with the states.
+    dt_format : str, (default: '%d-%m-%Y %H:%M:%S')
+        Format of the datetime strings. Columns with datetimes are used as is.
+    minimum_time : str, (default: 'minutes')
+        Time that replaces a time in state of zero: 'seconds', 'minutes' or 'days'.
+    chunksize : int, (default: 1_000_000)
+        Number of events that are sorted in memory per run.
+    tmpdir : str, (default: None)
+        Directory for the sorted runs. None uses the temporary directory of the system.
+
+    Examples
+    --------
+    >>> seq = EventSequencer(dt_format='%Y-%m-%d %H:%M:%S')
+    >>> for chunk in pd.read_csv('events.csv', chunksize=100000):
+    >>>     seq.update(chunk)
+    >>> eventlog = seq.result()
+
+    """
+
+    def __init__(self, sample_id='sample_id', datetime='datetime', state='state', dt_format='%d-%m-%Y %H:%M:%S', minimum_time='minutes', chunksize=CHUNKSIZE, tmpdir=None):
+        self.columns = [sample_id, datetime, state]
+        self.dt_format = dt_format
+        self.minimum_time = np.int64(MINIMUM_TIME.get(minimum_time, 1) * 10**9)
+        self.chunksize = chunksize
+        self.samples = pd.Index([], dtype=object)
+        self.states = pd.Index([], dtype=object)
+        self.n_rows = 0
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._tmpdir = tempfile.TemporaryDirectory(prefix='d3blocks-events-', dir=tmpdir)
+        self._runs, self._pending, self._n_pending = [], [], 0
+
+    @staticmethod
+    def _intern(index, values):
+        """Return the updated index and the code of every value. New values are appended to the index."""
+        codes = index.get_indexer(values)
+        new = codes < 0
+        if np.any(new):
+            index = index.append(pd.Index(pd.unique(values[new]), dtype=object))
+            codes[new] = index.get_indexer(values[new])
+        return index, codes
+
+    def update(self, df):
+        """Add a chunk of events.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Chunk with the sample_id, datetime and state column.
+
+        """
+        if not np.all(np.isin(self.columns, df.columns)):
+            raise Exception('The chunks of events should contain the columns %s.' %(self.columns))
+        sample_id, datetime, state = self.columns
+        times = df[datetime]
+        if times.dtype.kind != 'M': times = pd.to_datetime(times, format=self.dt_format)
+        times = times.to_numpy(dtype='datetime64[ns]')
+        if np.any(np.isnat(times)): raise Exception('Events without [%s] can not be ordered.' %(datetime))
+
+        run = np.empty(len(df), dtype=_RUN_DTYPE)
+        run['time'] = times.view(np.int64)
+        self.samples, run['sample'] = self._intern(self.samples, df[sample_id].to_numpy(dtype=object))
+        self.states, run['state'] = self._intern(self.states, df[state].to_numpy(dtype=object))
+        self.n_rows += len(df)
+        # The number of events per sample_id gives the position of every sample_id in the result.
+        counts = np.bincount(run['sample'], minlength=len(self.samples))
+        counts[:len(self._counts)] += self._counts
+        self._counts = counts
+        self._pending.append(run)
+        self._n_pending += len(run)
+        if self._n_pending >= self.chunksize: self._spill()
+
+    def _spill(self):
+        """Sort the pending events and write them as one run."""
+        if self._n_pending == 0: return
+        run = np.concatenate(self._pending)
+        # The sort is stable, so that events with the same datetime keep the order of the input.
+        run = run[np.lexsort((run['time'], run['sample']))]
+        filepath = os.path.join(self._tmpdir.name, 'run%d.npy' %(len(self._runs)))
+        np.save(filepath, run)
+        self._runs.append(filepath)
+        self._pending, self._n_pending = [], 0
+
+    def _merge(self):
+        """Yield the events of all runs in blocks that are sorted on (sample_id, datetime)."""
+        runs = [np.load(filepath, mmap_mode='r') for filepath in self._runs]
+        pos = [0] * len(runs)
+        blocksize = max(1, self.chunksize // max(1, len(runs)))
+        while True:
+            active = [i for i in range(len(runs)) if pos[i] < len(runs[i])]
+            if len(active) == 0: break
+            blocks = {i: runs[i][pos[i]:pos[i] + blocksize] for i in active}
+            # Events up to the smallest last key of the blocks of runs that continue are in their final order.
+            ends = [(int(blocks[i]['sample'][-1]), int(blocks[i]['time'][-1])) for i in active if pos[i] + blocksize < len(runs[i])]
+            parts = []
+            for i in active:
+                block = blocks[i]
+                if len(ends) > 0:
+                    sample, time = min(ends)
+                    n = int(np.sum((block['sample'] < sample) | ((block['sample'] == sample) & (block['time'] <= time))))
+                    block = block[:n]
+                parts.append(np.asarray(block))
+                pos[i] += len(block)
+            block = np.concatenate(parts)
+            if len(parts) > 1: block = block[np.lexsort((block['time'], block['sample']))]
+            yield block
+
+    def result(self):
+        """Return the event log.
+
+        The merged events are written directly at their position in the sorted sample_ids, so that the result is the
+        only array with one row per event.
+
+        Returns
+        -------
+        EventLog
+            State sequences with one row per event, grouped by the sorted sample_ids.
+
+        """
+        self._spill()
+        n = len(self.samples)
+        # The runs are sorted on the codes of the sample_ids in order of appearance. The result uses the sorted sample_ids.
+        labels = self.samples.to_numpy()
+        order = np.argsort(labels, kind='stable')
+        indptr = np.r_[0, np.cumsum(self._counts[order])]
+        # Position of the next event of every sample_id code.
+        position = np.empty(n, dtype=np.int64)
+        position[order] = indptr[:-1]
+        state = np.empty(self.n_rows, dtype=np.int32)
+        delta = np.empty(self.n_rows, dtype=np.int64)
+        first = np.full(n, np.iinfo(np.int64).max)
+        tmin, tmax = np.iinfo(np.int64).max, np.iinfo(np.int64).min
+
+        def _write(rows, time_in_state):
+            if len(rows) == 0: return
+            start = np.flatnonzero(np.r_[True, rows['sample'][1:] != rows['sample'][:-1]])
+            size = np.diff(np.r_[start, len(rows)])
+            index = position[rows['sample']] + np.arange(len(rows)) - np.repeat(start, size)
+            state[index] = rows['state']
+            delta[index] = time_in_state
+            position[rows['sample'][start]] += size
+
+        carry = np.empty(0, dtype=_RUN_DTYPE)
+        # Without events there is nothing to merge and the event log is empty.
+        merged = self._merge() if self.n_rows > 0 else []
+        for block in merged:
+            tmin, tmax = min(tmin, int(block['time'].min())), max(tmax, int(block['time'].max()))
+            start = np.r_[True, block['sample'][1:] != block['sample'][:-1]]
+            first[block['sample'][start]] = np.minimum(first[block['sample'][start]], block['time'][start])
+            # The time in state of the last event of a block depends on the first event of the next block.
+            block = np.concatenate([carry, block])
+            _write(block[:-1], np.where(block['sample'][1:] == block['sample'][:-1], np.diff(block['time']), 0))
+            carry = block[-1:]
+        # The last event of the last sample_id is always ending.
+        _write(carry, np.zeros(len(carry), dtype=np.int64))
+        self._tmpdir.cleanup()
+
+        uiid = labels[order]
+        return EventLog(uiid=uiid,
+                        indptr=indptr,
+                        state=state,
+                        delta=delta,
+                        states=self.states.to_numpy(),
+                        first_datetime=pd.Series(pd.to_datetime(first[order]), index=uiid),
+                        datetime_min=pd.Timestamp(tmin) if self.n_rows else None,
+                        datetime_max=pd.Timestamp(tmax) if self.n_rows else None,
+                        minimum_time=self.minimum_time,
+                        )
+
+
+# %% Reading
+def read_events(data, sample_id='sample_id', datetime='datetime', state='state', dt_format='%d-%m-%Y %H:%M:%S', standardize='samplewise', minimum_time='minutes', chunksize=CHUNKSIZE, tmpdir=None, logger=None):
+    """Read an event log from a file or from an iterator of chunks into the state sequences of the sample_ids.
+
+    The memory that is used while reading is bounded by the chunksize and the number of sample_ids. The returned
+    EventLog keeps one state code and one time in state per event.
+
+    Parameters
+    ----------
+    data : str, os.PathLike, pd.DataFrame or iterator of pd.DataFrame
+        CSV (.csv, .csv.gz, .txt) or Parquet (.parquet, .pq) file, a DataFrame or an iterator of DataFrames.
+    sample_id : str, (default: 'sample_id')
+        Column with the sample ids.
+    datetime : str, (default: 'datetime')
+        Column with the datetime.
+    state : str, (default: 'state')
+        Column with the states.
+    dt_format : str, (default: '%d-%m-%Y %H:%M:%S')
+        Format of the datetime strings.
+    standardize : str, (default: 'samplewise')
+        Only 'samplewise' is supported: the time in state is the time to the next event of the same sample_id.
+    minimum_time : str, (default: 'minutes')
+        Time that replaces a time in state of zero: 'seconds', 'minutes' or 'days'.
+    chunksize : int, (default: 1_000_000)
+        Number of rows per chunk that is read from a file and that is sorted in memory.
+    tmpdir : str, (default: None)
+        Directory for the sorted runs. None uses the temporary directory of the system.
+    logger : logging.Logger, optional
+        A logger object to output log messages (optional)
+
+    Returns
+    -------
+    EventLog
+
+    Examples
+    --------
+    >>> from d3blocks import events
+    >>> eventlog = events.read_events('events.parquet', dt_format='%Y-%m-%d %H:%M:%S')
+    >>> # The movingbubbles block also accepts the file or an iterator of chunks directly.
+    >>> d3.movingbubbles(pd.read_csv('events.csv', chunksize=100000), dt_format='%Y-%m-%d %H:%M:%S')
+
+    """
+    if standardize != 'samplewise':
+        raise Exception('Event logs from a file or from chunks can only be standardized [samplewise] and not [%s]. Hint: read the events into a DataFrame.' %(standardize))
+    seq = EventSequencer(sample_id=sample_id, datetime=datetime, state=state, dt_format=dt_format, minimum_time=minimum_time, chunksize=chunksize, tmpdir=tmpdir)
+    for chunk in read_chunks(data, chunksize=chunksize, columns=[sample_id, datetime, state]):
+        seq.update(chunk)
+    eventlog = seq.result()
+    if logger is not None: logger.info('Read %d events of %d sample_ids in %d sorted runs.' %(seq.n_rows, len(eventlog.uiid), len(seq._runs)))
+    return eventlog
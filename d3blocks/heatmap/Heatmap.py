@@ -7,14 +7,23 @@ Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 """
 from ismember import ismember
-import colourmap
 import numpy as np
 import os
 
 try:
-    from .. utils import set_path, set_labels, write_html_file, pre_processing, update_config, vec2adjmat, scale, normalize, include_save_to_svg_script
+    from .. utils import set_path, set_labels, write_html_file, pre_processing, update_config, vec2adjmat, scale, normalize, include_save_to_svg_script, working_copy
+    from .. render import get_source
+    from .. colors import fromlist, is_hex
+    from .. profiler import profile_stage
+    from .. import serialize
+    from .. tables import NodeTable
 except:
-    from utils import set_path, set_labels, write_html_file, pre_processing, update_config, vec2adjmat, scale, normalize, include_save_to_svg_script
+    from utils import set_path, set_labels, write_html_file, pre_processing, update_config, vec2adjmat, scale, normalize, include_save_to_svg_script, working_copy
+    from render import get_source
+    from colors import fromlist, is_hex
+    from profiler import profile_stage
+    import serialize
+    from tables import NodeTable
 
 
 # %% Set configuration properties
@@ -23,7 +32,7 @@ def set_config(config={}, **kwargs):
     logger = kwargs.get('logger', None)
     config['chart'] ='Heatmap'
     config['title'] = kwargs.get('title', 'Heatmap - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'heatmap.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'heatmap.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [720, 720])
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
@@ -52,7 +61,7 @@ def set_config(config={}, **kwargs):
 
 def show(df, **kwargs):
     """Build and show the graph."""
-    df = df.copy()
+    df = working_copy(df)
     node_properties = kwargs.get('node_properties')
     logger = kwargs.get('logger', None)
     config = update_config(kwargs, logger)
@@ -94,7 +103,7 @@ def set_edge_properties(df, **kwargs):
     # logger = kwargs.get('logger', None)
     # config = kwargs.get('config')
 
-    df = df.copy()
+    df = working_copy(df)
     df = pre_processing(df)
 
     return df
@@ -118,8 +127,8 @@ def set_node_properties(df, **kwargs):
 
     Returns
     -------
-    dict_labels : dictionary()
-        Dictionary containing the label properties.
+    node_properties : NodeTable
+        Label properties. The properties of a label can be changed with node_properties.get(label)['color'] = '#000000'.
 
     """
     logger = kwargs.get('logger', None)
@@ -132,13 +141,10 @@ def set_node_properties(df, **kwargs):
     # cmap = kwargs.get('cmap')
     # colors = colourmap.generate(len(uilabels), cmap=cmap, scheme='hex', verbose=0)
 
-    # Make dict
-    dict_labels = {}
-    for i, label in enumerate(uilabels):
-        # dict_labels[label] = {'id': i, 'label': label, 'color': colors[i]}
-        dict_labels[label] = {'id': i, 'label': label, 'color': '#000000'}
+    # Store the properties in columns with one row per label.
+    node_properties = NodeTable({'id': np.arange(len(uilabels)), 'label': uilabels, 'color': np.repeat('#000000', len(uilabels))}, labels=uilabels)
     # Return
-    return dict_labels
+    return node_properties
 
 
 def set_colors(df, **kwargs):
@@ -153,17 +159,19 @@ def set_colors(df, **kwargs):
     logger = kwargs.get('logger', None)
     config = kwargs.get('config')
     node_properties = kwargs.get('node_properties')
+    # The columns are changed in place: in the table or in the DataFrame view.
+    frame = node_properties.frame if isinstance(node_properties, NodeTable) else node_properties
 
     # d3network.vec2adjmat(source, target, weight=weight, symmetric=symmetric, aggfunc=aggfunc)
     if df.get('weight', None) is not None:
-        df = df.copy()
+        df = working_copy(df)
         df['weight'] = normalize(df['weight'].values, scaler=config['scaler'])
     adjmat = vec2adjmat(source=df['source'], target=df['target'], weight=df.get('weight', None).values, symmetric=True)
 
     # Default is all cluster labels are the same
     # Convert NumPy integers to regular Python integers for proper JSON serialization
-    node_properties['classlabel'] = [0] * node_properties.shape[0]
-    node_properties['color'] = '#000000'
+    frame['classlabel'] = [0] * frame.shape[0]
+    frame['color'] = '#000000'
 
     if isinstance(config['color'], str) and config['color']=='cluster':
         # Cluster the nodes
@@ -179,35 +187,36 @@ def set_colors(df, **kwargs):
         logger.info('[%d] clusters detected' %(len(np.unique(results['labx']))))
 
         # uilabx = np.unique(results['labx'])
-        Iloc, idx = ismember(node_properties['label'].values, adjmat.index.values)
+        Iloc, idx = ismember(frame['label'].values, adjmat.index.values)
         if np.any(~Iloc):
             logger.error('Feature name(s): %s can not be used. Hint: Remove special characters. <return>' %(df.index.values[~np.isin(np.arange(0, df.shape[0]), idx)]))
             return None
         logger.info('Colors are based on clustering.')
         # Convert NumPy integers to regular Python integers for proper JSON serialization
-        node_properties['classlabel'] = [int(x) for x in results['labx']]
+        frame['classlabel'] = [int(x) for x in results['labx']]
         # # Create node colors
-        colors = colourmap.fromlist(node_properties['classlabel'], cmap=config['cmap'], scheme='hex', verbose=0)[0]
+        colors = fromlist(frame['classlabel'], cmap=config['cmap'])
         # Convert NumPy strings to regular Python strings
-        node_properties['color'] = [str(c) for c in colors]
+        frame['color'] = [str(c) for c in colors]
     elif isinstance(config['color'], (list, np.ndarray)):
-        if np.all(list(map(colourmap.is_hex_color, config['color']))):
+        if np.all(is_hex(config['color'])):
             logger.info('Colors are based on the input hex colors.')
             # Convert NumPy strings to regular Python strings
-            node_properties['color'] = [str(c) for c in config['color']]
+            frame['color'] = [str(c) for c in config['color']]
             class_labels = ismember(config['color'], np.unique(config['color']))[1]
-            node_properties['classlabel'] = [int(x) for x in class_labels]
+            frame['classlabel'] = [int(x) for x in class_labels]
         else:
             logger.info('Colors are based on the labels.')
             class_labels = ismember(config['color'], np.unique(config['color']))[1]
-            node_properties['classlabel'] = [int(x) for x in class_labels]
-            colors = colourmap.fromlist(node_properties['classlabel'], cmap=config['cmap'], scheme='hex', verbose=0)[0]
+            frame['classlabel'] = [int(x) for x in class_labels]
+            colors = fromlist(frame['classlabel'], cmap=config['cmap'])
             # Convert NumPy strings to regular Python strings
-            node_properties['color'] = [str(c) for c in colors]
+            frame['color'] = [str(c) for c in colors]
 
     return node_properties
 
 
+@profile_stage('render')
 def write_html(json_data, config, logger=None):
     """Write html.
 
@@ -231,10 +240,8 @@ def write_html(json_data, config, logger=None):
     if config['filepath'] is not None:
         dirpath, filename = os.path.split(config['filepath'])
 
-    # Get path to files
-    d3_script = os.path.abspath(os.path.join(config['curpath'], 'heatmap/d3js/heatmap.html.j2'))
-    # Import in the file
-    with open(d3_script, 'r', encoding="utf8", errors='ignore') as file: html = file.read()
+    # Import the template. The file is only read from disk once per process.
+    html = get_source('heatmap', 'heatmap.html.j2')
 
     # Read the d3 html with script file
     html = html.replace('$DESCRIPTION$', str(config['description']))
@@ -258,6 +265,7 @@ def write_html(json_data, config, logger=None):
     return html
 
 
+@profile_stage('get_data_ready_for_d3')
 def get_data_ready_for_d3(df, node_properties):
     """Convert the source-target data into d3 compatible data.
 
@@ -281,7 +289,8 @@ def get_data_ready_for_d3(df, node_properties):
 
     """
     # Convert into adj into vector
-    dfvec = df.copy()
+    dfvec = working_copy(df)
+    if isinstance(node_properties, NodeTable): node_properties = node_properties.to_frame()
     uinode, idx = np.unique(node_properties['label'], return_index=True)
     
     # Create a mapping dictionary to avoid FutureWarning about downcasting
@@ -301,29 +310,17 @@ def get_data_ready_for_d3(df, node_properties):
     # Ensure proper data types
     dfvec = dfvec.infer_objects(copy=False)
 
-    NODE_STR = '\n{\n"nodes":\n[\n'
-    # for node, classlabel in zip(node_properties['label'], node_properties['classlabel']):
-    for i, node in enumerate(node_properties['label']):
-        # Convert NumPy integers to regular Python integers for proper JSON serialization
-        cluster_val = int(node_properties['classlabel'].iloc[i])
-        color_val = str(node_properties['color'].iloc[i])
-        NODE_STR = NODE_STR + '{"name":' + '"' + node + '"' + ',' + '"cluster":' + str(cluster_val) + ',' + '"color":' + '"' + color_val + '"' + "},"
-        # NODE_STR = NODE_STR + '{"name":' + '"' + node + '"' + ',' "},"
-        NODE_STR = NODE_STR + '\n'
-    NODE_STR = NODE_STR + '],\n'
-
-    EDGE_STR = '"links":\n[\n'
-    for i in range(0, dfvec.shape[0]):
-        # Convert NumPy integers to regular Python integers for proper JSON serialization
-        source_val = int(dfvec.iloc[i, 0])
-        target_val = int(dfvec.iloc[i, 1])
-        value_val = float(dfvec.iloc[i, 2]) if dfvec.iloc[i, 2] is not None else 0.0
-        EDGE_STR = EDGE_STR + '{"source":' + str(source_val) + ',' + '"target":' + str(target_val) + ',' + '"value":' + str(value_val) + '},'
-        EDGE_STR = EDGE_STR + '\n'
-    EDGE_STR = EDGE_STR + ']\n}'
+    nodes = serialize.records({'name': serialize.strings(node_properties['label'].values),
+                               'cluster': serialize.numbers(node_properties['classlabel'].values.astype(int)),
+                               'color': serialize.strings(node_properties['color'].values),
+                               })
+    links = serialize.records({'source': serialize.numbers(dfvec.iloc[:, 0].values.astype(int)),
+                               'target': serialize.numbers(dfvec.iloc[:, 1].values.astype(int)),
+                               'value': serialize.numbers(dfvec.iloc[:, 2].fillna(0).values.astype(float)),
+                               })
 
     # Final data string
-    json_data = NODE_STR + EDGE_STR
+    json_data = '{"nodes":' + serialize.array(nodes, sep=',\n') + ',\n"links":' + serialize.array(links, sep=',\n') + '}'
 
     # Read the data
     # {
@@ -8,15 +8,16 @@ License     : GPL3
 """
 
 import numpy as np
-from jinja2 import Environment, PackageLoader
 from pathlib import Path
 import os
 import time
 import re
 try:
-    from .. utils import set_path, write_html_file, include_save_to_svg_script
+    from .. utils import set_path, write_html_stream, include_save_to_svg_script
+    from .. render import get_template, write_assets
 except:
-    from utils import set_path, write_html_file, include_save_to_svg_script
+    from utils import set_path, write_html_stream, include_save_to_svg_script
+    from render import get_template, write_assets
 
 
 # %% Set configuration properties
@@ -143,18 +144,13 @@ def write_html(img_before, img_after, config, logger):
         'SAVE_TO_SVG_SCRIPT': save_script,
         'SAVE_BUTTON_START': show_save_button[0],
         'SAVE_BUTTON_STOP': show_save_button[1],
+        'ASSETS': write_assets('imageslider', config, logger=logger),
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.imageslider', package_path='d3js'))
-
-    index_template = jinja_env.get_template('imageslider.html.j2')
+    index_template = get_template('imageslider', 'imageslider.html.j2')
 
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
 
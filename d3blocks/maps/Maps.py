@@ -6,14 +6,18 @@ Mail        : erdogant@gmail.com
 Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 """
-from jinja2 import Environment, PackageLoader
 import numpy as np
-import colourmap as cm
 
 try:
-    from .. utils import convert_dataframe_dict, set_path, update_config, write_html_file, convert_to_json_format, include_save_to_svg_script
+    from .. utils import convert_dataframe_dict, set_path, update_config, write_html_stream, convert_to_json_format, include_save_to_svg_script, working_copy
+    from .. render import get_template, write_assets
+    from .. colors import fromlist, is_hex
+    from .. tables import NodeTable
 except:
-    from utils import convert_dataframe_dict, set_path, update_config, write_html_file, convert_to_json_format, include_save_to_svg_script
+    from utils import convert_dataframe_dict, set_path, update_config, write_html_stream, convert_to_json_format, include_save_to_svg_script, working_copy
+    from render import get_template, write_assets
+    from colors import fromlist, is_hex
+    from tables import NodeTable
 
 
 # %% Set configuration properties
@@ -23,7 +27,7 @@ def set_config(config={}, **kwargs):
     # Store configurations
     config['chart'] ='maps'
     config['title'] = kwargs.get('title', 'Maps - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'maps.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'maps.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [None, None])
     if config['figsize'] is None: config['figsize'] = [None, None]
     config['showfig'] = kwargs.get('showfig', True)
@@ -131,9 +135,9 @@ def set_node_properties(df, **kwargs):
     color = df.get('color', None)
     if color is None: color = kwargs.get('color', None)
     if color is None: color = np.repeat(['#0981D1'], len(lon))
-    if isinstance(color, str) and cm.is_hex_color(color, verbose=0): color = [color] * len(lon)
-    if isinstance(color, (np.ndarray, list)) and not np.all(list(map(lambda c: cm.is_hex_color(c, verbose=0), color))):
-        color = cm.fromlist(color.astype(str), cmap=cmap, scheme='hex')[0]
+    if isinstance(color, str) and is_hex(color): color = [color] * len(lon)
+    if isinstance(color, (np.ndarray, list)) and not np.all(is_hex(color)):
+        color = fromlist(np.asarray(color).astype(str), cmap=cmap)
 
     # Get label
     label = df.get('label', None)
@@ -141,19 +145,11 @@ def set_node_properties(df, **kwargs):
     if label is None: label = np.repeat([''], len(lon))
     if isinstance(label, (int, float, str)): label = [label] * len(lon)
 
-    dict_labels = {}
-    for i in np.arange(0, df.shape[0]):
-        # Store
-        dict_labels[i] = {
-                          'lon': lon[i],
-                          'lat': lat[i],
-                          'label': label[i],
-                          'size': size[i],
-                          'color': color[i],
-                          'opacity': opacity[i],
-                          }
+    # Store the properties in columns with one row per location.
+    columns = {'lon': lon, 'lat': lat, 'label': label, 'size': size, 'color': color, 'opacity': opacity}
+    node_properties = NodeTable({key: np.asarray(values)[:df.shape[0]] for key, values in columns.items()}, labels=np.arange(0, df.shape[0]))
     # Return
-    return dict_labels
+    return node_properties
 
 
 def show(countries, **kwargs):
@@ -186,7 +182,7 @@ def show(countries, **kwargs):
     json_data = convert_to_json_format(node_properties, logger=logger)
 
     # Edge properties: Transform dataframe into input form for d3
-    countries = convert_dataframe_dict(countries.copy(), frame=True)
+    countries = convert_dataframe_dict(working_copy(countries), frame=True)
     countries.reset_index(inplace=True, drop=True)
     # Create the data from the input of javascript
     json_countries = convert_to_json_format(countries, logger=logger)
@@ -225,17 +221,12 @@ def write_html(json_countries, json_data, config, logger=None):
         'SAVE_TO_SVG_SCRIPT': save_script,
         'SAVE_BUTTON_START': show_save_button[0],
         'SAVE_BUTTON_STOP': show_save_button[1],
+        'ASSETS': write_assets('maps', config, logger=logger),
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.maps', package_path='d3js'))
+    index_template = get_template('maps', 'maps.html.j2')
 
-    index_template = jinja_env.get_template('maps.html.j2')
-
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
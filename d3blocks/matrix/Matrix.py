@@ -6,15 +6,24 @@ Mail        : erdogant@gmail.com, oliver@sensibly.nl
 Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 """
-import colourmap
 import numpy as np
 import os
 # from jinja2 import Environment, PackageLoader
 from shutil import copyfile
 try:
     from .. utils import set_path, set_labels, write_html_file, include_save_to_svg_script
+    from .. render import get_source
+    from .. colors import generate
+    from .. profiler import profile_stage
+    from .. import serialize
+    from .. tables import NodeTable
 except:
     from utils import set_path, set_labels, write_html_file, include_save_to_svg_script
+    from render import get_source
+    from colors import generate
+    from profiler import profile_stage
+    import serialize
+    from tables import NodeTable
 
 
 # %% Set configuration properties
@@ -23,7 +32,7 @@ def set_config(config={}, **kwargs):
     logger = kwargs.get('logger', None)
     config['chart'] ='Matrix'
     config['title'] = kwargs.get('title', 'Matrix - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'matrix.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'matrix.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [720, 720])
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
@@ -68,8 +77,8 @@ def set_node_properties(df, **kwargs):
 
     Returns
     -------
-    dict_labels : dictionary()
-        Dictionary containing the label properties.
+    node_properties : NodeTable
+        Label properties. The properties of a label can be changed with node_properties.get(label)['color'] = '#000000'.
 
     """
     cmap = kwargs.get('cmap')
@@ -80,14 +89,12 @@ def set_node_properties(df, **kwargs):
     uilabels = set_labels(df, col_labels=col_labels, logger=logger)
 
     # Create unique label/node colors
-    colors = colourmap.generate(len(uilabels), cmap=cmap, scheme='hex', verbose=0)
+    colors = generate(len(uilabels), cmap=cmap)
 
-    # Make dict
-    dict_labels = {}
-    for i, label in enumerate(uilabels):
-        dict_labels[label] = {'id': i, 'label': label, 'color': colors[i]}
+    # Store the properties in columns with one row per label.
+    node_properties = NodeTable({'id': np.arange(len(uilabels)), 'label': uilabels, 'color': colors}, labels=uilabels)
     # Return
-    return dict_labels
+    return node_properties
 
 def set_properties(df, config, node_properties, logger=None):
     # Checks
@@ -107,6 +114,7 @@ def set_properties(df, config, node_properties, logger=None):
     return html
 
 
+@profile_stage('render')
 def write_html(json_data, config, logger=None):
     """Write html.
 
@@ -143,9 +151,8 @@ def write_html(json_data, config, logger=None):
     copyfile(d3_library, os.path.join(dirpath, os.path.basename(d3_library)))
     copyfile(d3_chromatic, os.path.join(dirpath, os.path.basename(d3_chromatic)))
 
-    # Import in the file
-    d3_script = os.path.abspath(os.path.join(config['curpath'], 'matrix/d3js/matrix.html.j2'))
-    with open(d3_script, 'r', encoding="utf8", errors='ignore') as file: html = file.read()
+    # Import the template. The file is only read from disk once per process.
+    html = get_source('matrix', 'matrix.html.j2')
 
     # Read the d3 html with script file
     html = html.replace('$DESCRIPTION$', str(config['description']))
@@ -198,6 +205,7 @@ def write_html(json_data, config, logger=None):
 
 
 
+@profile_stage('get_data_ready_for_d3')
 def get_data_ready_for_d3_matrix(df, node_properties):
     """
     Embed the Data in the HTML. Note that the embedding is an important stap te prevent security issues by the browsers.
@@ -221,12 +229,11 @@ def get_data_ready_for_d3_matrix(df, node_properties):
     """
     # Convert into adj into vector
     df = df.rename(columns={'source': 'variable', 'target': 'group', 'weight': 'value'})
-    json_data = ''
-
-    for i in range(0, df.shape[0]):
-        newline = '{group : "' + str(df['group'].iloc[i]) + '", variable : "' + str(df['variable'].iloc[i]) + '", value : "' + str(df['value'].iloc[i]) +'"},'
-        newline = newline + '\n'
-        json_data = json_data + newline
+    rows = serialize.records({'group': serialize.strings(df['group'].values),
+                              'variable': serialize.strings(df['variable'].values),
+                              'value': serialize.strings(df['value'].tolist()),
+                              })
+    json_data = ',\n'.join(rows)
 
     # Read the data
     # var data =
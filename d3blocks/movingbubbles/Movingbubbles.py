@@ -6,22 +6,35 @@ Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 
 """
-import colourmap
 import numpy as np
 import pandas as pd
 import datetime as dt
 import re
 from tqdm import tqdm
-from jinja2 import Environment, PackageLoader
 from pathlib import Path
 import os
 import json
 import random
 import time
+import base64
 try:
-    from .. utils import convert_dataframe_dict, set_path, pre_processing, update_config, write_html_file, include_save_to_svg_script
+    from .. utils import set_path, pre_processing, update_config, write_html_stream, include_save_to_svg_script, intern_labels, working_copy
+    from .. render import get_template, write_assets
+    from .. colors import fromlist, generate
+    from .. profiler import profile_stage
+    from .. import serialize
+    from .. edges import is_edge_source
+    from .. events import EventLog, read_events, downsample
+    from .. tables import NodeTable
 except:
-    from utils import convert_dataframe_dict, set_path, pre_processing, update_config, write_html_file, include_save_to_svg_script
+    from utils import set_path, pre_processing, update_config, write_html_stream, include_save_to_svg_script, intern_labels, working_copy
+    from render import get_template, write_assets
+    from colors import fromlist, generate
+    from profiler import profile_stage
+    import serialize
+    from edges import is_edge_source
+    from events import EventLog, read_events, downsample
+    from tables import NodeTable
 
 
 # %% Set configuration properties
@@ -30,7 +43,7 @@ def set_config(config={}, **kwargs):
     logger = kwargs.get('logger', None)
     config['chart'] ='movingbubbles'
     config['title'] = kwargs.get('title', 'Movingbubbles - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'movingbubbles.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'movingbubbles.html'), logger, unique=config.get('unique_filename', False))
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
     config['figsize'] = kwargs.get('figsize', [780, 800])
@@ -41,6 +54,8 @@ def set_config(config={}, **kwargs):
     config['damper'] = kwargs.get('damper', 1)
     config['fontsize'] = kwargs.get('fontsize', 14)
     config['timedelta'] = kwargs.get('timedelta', 'minutes')
+    config['max_ticks'] = kwargs.get('max_ticks', 10000)
+    config['resample'] = kwargs.get('resample', None)
     config['standardize'] = kwargs.get('standardize', None)
     config['speed'] = kwargs.get('speed', {"stop": 100000, "slow": 1000, "medium": 200, "fast": 50})
     config['note'] = kwargs.get('note', None)
@@ -52,6 +67,7 @@ def set_config(config={}, **kwargs):
     config['notebook'] = kwargs.get('notebook', False)
     config['color_method'] = kwargs.get('color_method', "STATE")
     config['save_button'] = kwargs.get('save_button', True)
+    config['packed'] = kwargs.get('packed', False)
 
     return config
 
@@ -92,8 +108,8 @@ def set_node_properties(labels, **kwargs):
 
     Returns
     -------
-    dict_labels : dictionary()
-        Dictionary containing the label properties.
+    node_properties : NodeTable
+        Label properties. The properties of a label can be changed with node_properties.get(label)['color'] = '#000000'.
 
     """
     center = kwargs.get('center', None)
@@ -110,15 +126,13 @@ def set_node_properties(labels, **kwargs):
         uilabels.append(center_label)
 
     # Create unique label/node colors
-    colors = colourmap.generate(len(uilabels), cmap=cmap, scheme='hex', verbose=0)
+    colors = generate(len(uilabels), cmap=cmap)
 
-    # Make dict
-    dict_labels = {}
-    for i, label in enumerate(uilabels):
-        dict_labels[label] = {'id': i, 'label': label, 'short': label, 'desc': label, 'color': colors[i]}
+    # Store the properties in columns with one row per label.
+    node_properties = NodeTable({'id': np.arange(len(uilabels)), 'label': uilabels, 'short': uilabels, 'desc': uilabels, 'color': colors}, labels=uilabels)
 
     # Return
-    return dict_labels
+    return node_properties
 
 
 # %% Set Edge properties
@@ -127,8 +141,8 @@ def set_edge_properties(df, **kwargs):
 
     Parameters
     ----------
-    df : Input data, pd.DataFrame()
-        Input data.
+    df : pd.DataFrame(), EventLog, str or iterator of pd.DataFrame
+        Input data. Event logs in a CSV or Parquet file or in an iterator of chunks are read with events.read_events().
     size: dict. {'sample_id': size}
         Specify the sample_id as key with a node size. The default node size is set to 4.
             * size = {0: 10, 5: 20}
@@ -144,11 +158,13 @@ def set_edge_properties(df, **kwargs):
         'samplewise': Standardize per sample_id. Thus the sample_ids are independent of each other.
     dt_format : str
         '%d-%m-%Y %H:%M:%S'.
+    resample : str, (default: None)
+        Bucket the events of every sample_id with a fixed frequency, such as '5min', before standardizing (see resample).
 
     Returns
     -------
-    df : pd.DataFrame()
-        Processed dataframe.
+    df : pd.DataFrame() or EventLog
+        Processed dataframe. The EventLog of streamed input with the node size and color in EventLog.nodes.
 
     """
     datetime = kwargs.get('datetime', 'datetime')
@@ -160,11 +176,24 @@ def set_edge_properties(df, **kwargs):
     color = kwargs.get('color', None)
     cmap = kwargs.get('cmap', 'Set1')
     dt_format = kwargs.get('dt_format', '%d-%m-%Y %H:%M:%S')
+    freq = kwargs.get('resample', None)
     logger = kwargs.get('logger', None)
-    df = df.copy()
 
+    # Event logs from a file or from chunks are sorted and standardized while reading.
+    if is_edge_source(df):
+        df = read_events(df, sample_id=sample_id, datetime=datetime, state=state, dt_format=dt_format, standardize=method, minimum_time=timedelta if timedelta else 'minutes', logger=logger)
+    if isinstance(df, EventLog):
+        if freq is not None: df = df.resample(freq, logger=logger)
+        # Size and color per sample_id.
+        nodes = pd.DataFrame({'sample_id': df.uiid})
+        nodes = _set_nodesize(nodes, 'sample_id', size, logger)
+        df.nodes = _set_nodecolor(nodes, 'sample_id', color, cmap, logger)
+        return df
+
+    df = working_copy(df)
     # Compute delta
     if isinstance(df, pd.DataFrame) and np.any(df.columns==state) and np.any(df.columns==datetime) and np.any(df.columns==sample_id):
+        if freq is not None: df = resample(df, freq, sample_id=sample_id, datetime=datetime, state=state, dt_format=dt_format, logger=logger)
         if logger is not None: logger.info('Standardizing input dataframe using method: [%s].' %(method))
         df = standardize(df, method=method, sample_id=sample_id, datetime=datetime, dt_format=dt_format, minimum_time=timedelta if timedelta else 'minutes', logger=logger)
     else:
@@ -185,7 +214,7 @@ def _set_nodecolor(df, sample_id, color, cmap, logger):
             df.loc[df[sample_id]==key, 'color'] = str(color.get(key))
     elif color is None:
         # Derive colors from cmap based on sample_id
-        colors = colourmap.fromlist(df['sample_id'], cmap=cmap, scheme='hex')[0]
+        colors = fromlist(df['sample_id'], cmap=cmap)
         df['color'] = [str(c) for c in colors]
     else:
         # Single hex color string applied to all nodes
@@ -234,94 +263,72 @@ def show(df, **kwargs):
     config = update_config(kwargs, logger)
 
     # Convert dict/frame.
-    labels = convert_dataframe_dict(labels, frame=False)
+    labels = NodeTable.as_table(labels)
     # df = convert_dataframe_dict(df, frame=True)
+    streamed = isinstance(df, EventLog)
 
-    if not np.any(df.columns=='delta'):
+    if (not streamed) and (not np.any(df.columns=='delta')):
         raise Exception('Column "delta" is missing in dataFrame of type datetime.')
     if config['center'] is None:
         # config['center'] = [*labels.keys()][0]
         config['center'] = ""
 
-    # Extract minutes and days
-    if config['timedelta']=='seconds':
-        df['time_in_state'] = df['delta'].dt.total_seconds().apply(lambda x: max(1, int(x))).astype(int)
-    elif config['timedelta']=='minutes':
-        df['time_in_state'] = df['delta'].dt.total_seconds().apply(lambda x: max(1, int(np.ceil(x / 60)))).astype(int)
-    elif config['timedelta']=='days':
-        df['time_in_state'] = df['delta'].dt.total_seconds().apply(lambda x: max(1, int(np.ceil(x / 86400)))).astype(int)
-
-    # Transform dataframe into input form for d3
-    X = []
-    sid = np.array(list(map(lambda x: labels.get(x)['id'], df[config['columns']['state']].values)))
-    uiid = np.unique(df['sample_id'])
-    for i in uiid:
-        # Combine the sample_id with its time in state
-        Iloc=df['sample_id']==i
-        # Convert NumPy integers to regular Python integers to avoid np.int64 in string representation
-        sid_values = [int(x) for x in sid[Iloc]]
-        time_values = [int(x) for x in df['time_in_state'].loc[Iloc].values]
-        tmplist=str(list(zip(sid_values, time_values)))
-        tmplist=tmplist.replace('(', '')
-        tmplist=tmplist.replace(')', '')
-        tmplist=tmplist.replace('[', '')
-        tmplist=tmplist.replace(']', '')
-        tmplist=tmplist.replace(' ', '')
-        # Make one big happy list
-        X.append(tmplist)
-
-    # Node size in the same order as the uiid
-    nodedict = dict(zip(df['sample_id'], df['size']))
-    config['node_size'] = [int(nodedict.get(x)) if isinstance(nodedict.get(x), (np.integer, int)) else nodedict.get(x) for x in uiid]
-
-    # Node color in the same order as the uiid
-    nodedict = dict(zip(df['sample_id'], df['color']))
+    if config['timedelta']=='auto':
+        seconds, group = (df.seconds(), df.groups()) if streamed else (df['delta'].dt.total_seconds().to_numpy(), pd.factorize(df['sample_id'])[0])
+        config['timedelta'] = auto_timedelta(seconds, group, max_ticks=config.get('max_ticks', 10000), logger=logger)
+
+    if streamed:
+        uiid, indptr = df.uiid, df.indptr
+        X = encode(indptr, df.state_ids(labels), time_in_state(df.seconds(), config['timedelta']), config)
+        nodes = df.nodes
+        first_dates = df.first_datetime
+        datestart, datestop = df.datetime_min, df.datetime_max
+        date_min, date_max = datestart, datestop
+    else:
+        # Extract minutes and days. The time in state is at least 1.
+        df['time_in_state'] = time_in_state(df['delta'].dt.total_seconds().to_numpy(), config['timedelta'])
+        # Transform dataframe into input form for d3
+        X, uiid = get_data_ready_for_d3(df, labels, config)
+        nodes = df[['sample_id', 'size', 'color']]
+        # Per-sample start date (first event date), used by the frontend to power the dynamic date filter.
+        first_dates = df.groupby(config['columns']['sample_id'])[config['columns']['datetime']].min()
+        datestart = df[config['columns']['datetime']].iloc[0]
+        datestop = df[config['columns']['datetime']].iloc[-1]
+        date_min = df[config['columns']['datetime']].min()
+        date_max = df[config['columns']['datetime']].max()
+
+    # Node size and color in the same order as the uiid. The last row of a sample_id is used.
+    nodes = nodes.drop_duplicates(subset='sample_id', keep='last').set_index('sample_id').reindex(uiid)
+    config['node_size'] = nodes['size'].tolist()
     # Convert NumPy strings to regular Python strings for proper JSON serialization
-    config['node_color'] = [str(nodedict.get(x)) if nodedict.get(x) is not None else nodedict.get(x) for x in uiid]
+    config['node_color'] = [str(x) if x is not None else x for x in nodes['color'].tolist()]
 
     # Set color codes for the d3js
-    df_labels = pd.DataFrame(labels).T
+    df_labels = labels.frame
     # Convert NumPy integers to regular Python integers and NumPy strings to regular Python strings for proper JSON serialization
-    color_by_activity = {}
-    for idx, row in df_labels[['id', 'color']].iterrows():
-        color_by_activity[str(int(row['id']))] = str(row['color'])
-    config['colorByActivity'] = color_by_activity
+    ids = [str(int(idx)) for idx in df_labels['id'].values]
+    config['colorByActivity'] = dict(zip(ids, [str(color) for color in df_labels['color'].values]))
     # config['node_size'] = dict(zip(df_labels['id'].astype(str), df_labels['size']))
     # config['node_size'] = dict(zip(df['sample_id'], [4]*df.shape[0]))
 
     # Create the description for the numerical codes
-    act_codes = []
-    for label in labels:
-        act_codes.append({
-            "index": str(int(labels.get(label)['id'])), 
-            "short": str(labels.get(label)['short']), 
-            "desc": str(labels.get(label)['desc'])
-        })
-    config['act_codes'] = act_codes
+    config['act_codes'] = [{"index": idx, "short": str(short), "desc": str(desc)} for idx, short, desc in zip(ids, df_labels['short'].values, df_labels['desc'].values)]
 
     # Used for percentages by minute
     # Convert NumPy integers to regular Python strings for proper JSON serialization
-    act_counts = {}
-    for idx in df_labels['id']:
-        act_counts[str(int(idx))] = 0
-    config['act_counts'] = act_counts
+    config['act_counts'] = dict.fromkeys(ids, 0)
 
     # Define the starting day, hour, minute
-    config['start_hour'] = int(df[config['columns']['datetime']].dt.hour[0])
-    config['start_minute'] = int(df[config['columns']['datetime']].dt.minute[0])
-    config['start_day'] = int(df[config['columns']['datetime']].dt.day[0])
-
-    datestart = df[config['columns']['datetime']].iloc[0]
-    datestop = df[config['columns']['datetime']].iloc[-1]
+    config['start_hour'] = int(datestart.hour)
+    config['start_minute'] = int(datestart.minute)
+    config['start_day'] = int(datestart.day)
 
     # Per-sample start date (first event date), in the same order as uiid.
-    # Used by the frontend to power the dynamic date filter.
-    first_dates = df.groupby(config['columns']['sample_id'])[config['columns']['datetime']].min()
-    config['node_start_date'] = [first_dates.get(x).strftime('%Y-%m-%d') for x in uiid]
+    config['node_start_date'] = first_dates.reindex(uiid).dt.strftime('%Y-%m-%d').tolist()
 
     # Overall date range covered by the data, used to bound the date filter control.
-    config['date_min'] = df[config['columns']['datetime']].min().strftime('%Y-%m-%d')
-    config['date_max'] = df[config['columns']['datetime']].max().strftime('%Y-%m-%d')
+    config['date_min'] = date_min.strftime('%Y-%m-%d')
+    config['date_max'] = date_max.strftime('%Y-%m-%d')
 
     if config['note'] is None:
         config['note'] = "This is a simulation of multiple states and samples. <a href='https://github.com/d3blocks/d3blocks'>d3blocks movingbubbles</a>."
@@ -336,6 +343,186 @@ def show(df, **kwargs):
     return write_html(X, config, logger)
 
 
+def _sequences(df, labels, config):
+    """Return the state ids and the times in state of all sample_ids as contiguous integer arrays.
+
+    Parameters
+    ----------
+    df : pd.DataFrame()
+        Input data with the columns 'sample_id', 'time_in_state' and the state column.
+    labels : dict
+        Dictionary containing the label properties.
+    config : dict
+        Dictionary containing configuration keys.
+
+    Returns
+    -------
+    uiid : np.array
+        The unique sample_ids.
+    indptr : np.array
+        The rows of uiid[i] are indptr[i]:indptr[i + 1] in state_id and time_in_state.
+    state_id : np.array
+        State id per row, grouped by sample_id and in the order of df within a sample_id.
+    time_in_state : np.array
+        Time in state per row, in the same order as state_id.
+
+    """
+    table, (state,) = intern_labels(labels, df[config['columns']['state']].values)
+    state_id = table['id'].values[state].astype(np.int64)
+    uiid, inverse = np.unique(df['sample_id'], return_inverse=True)
+    # Stable sort on the sample_id keeps the order of the events within a sample_id.
+    order = np.argsort(inverse, kind='stable')
+    indptr = np.r_[0, np.cumsum(np.bincount(inverse, minlength=len(uiid)))]
+    return uiid, indptr, state_id[order], df['time_in_state'].to_numpy(dtype=np.int64)[order]
+
+
+@profile_stage('get_data_ready_for_d3')
+def get_data_ready_for_d3(df, labels, config):
+    """Convert the events into the state sequence per sample_id.
+
+    Parameters
+    ----------
+    df : pd.DataFrame()
+        Input data with the columns 'sample_id', 'time_in_state' and the state column.
+    labels : dict
+        Dictionary containing the label properties.
+    config : dict
+        Dictionary containing configuration keys.
+
+    Returns
+    -------
+    X : list of str or str
+        For each sample_id the sequence 'state,time,state,time,...'.
+        With config['packed'] the JSON object of pack_sequences().
+    uiid : np.array
+        The unique sample_ids in the same order as X.
+
+    """
+    uiid, indptr, state_id, time_in_state = _sequences(df, labels, config)
+    return encode(indptr, state_id, time_in_state, config), uiid
+
+
+def time_in_state(seconds, timedelta='minutes'):
+    """Convert the time in state from seconds into the timedelta unit. The time in state is at least 1.
+
+    Parameters
+    ----------
+    seconds : np.array
+        Time in state in seconds.
+    timedelta : str, (default: 'minutes')
+        'seconds', 'minutes' or 'days'.
+
+    Returns
+    -------
+    np.array of int64
+
+    """
+    if timedelta=='seconds':
+        return np.maximum(1, np.trunc(seconds)).astype(np.int64)
+    elif timedelta=='minutes':
+        return np.maximum(1, np.ceil(seconds / 60)).astype(np.int64)
+    elif timedelta=='days':
+        return np.maximum(1, np.ceil(seconds / 86400)).astype(np.int64)
+    raise Exception('timedelta should be "seconds", "minutes" or "days" and not [%s].' %(timedelta))
+
+
+def auto_timedelta(seconds, group, max_ticks=10000, logger=None):
+    """Return the smallest timedelta unit for which the longest timeline has at most max_ticks animation ticks.
+
+    Parameters
+    ----------
+    seconds : np.array
+        Time in state in seconds.
+    group : np.array
+        Index of the sample_id of every time in state.
+    max_ticks : int, (default: 10000)
+        Maximum number of ticks of the animation.
+    logger : logging.Logger, optional
+        A logger object to output log messages (optional)
+
+    Returns
+    -------
+    str
+        'seconds', 'minutes' or 'days'.
+
+    """
+    for timedelta in ['seconds', 'minutes', 'days']:
+        ticks = np.bincount(group, weights=time_in_state(seconds, timedelta)).max() if len(group) else 0
+        if ticks <= max_ticks: break
+    if logger is not None: logger.info('Set timedelta to [%s]: the longest timeline has %d ticks (max_ticks=%d).' %(timedelta, ticks, max_ticks))
+    return timedelta
+
+
+def encode(indptr, state_id, time_in_state, config):
+    """Encode the state sequences for d3.
+
+    Returns
+    -------
+    X : list of str or str
+        For each sample the sequence 'state,time,state,time,...'.
+        With config['packed'] the JSON object of pack_sequences().
+
+    """
+    if config.get('packed', False):
+        return serialize.dumps(pack_sequences(indptr, state_id, time_in_state))
+    # Interleave the state ids and times, and join the rows of every sample.
+    tokens = [None] * (2 * len(state_id))
+    tokens[0::2] = map(str, state_id.tolist())
+    tokens[1::2] = map(str, time_in_state.tolist())
+    indptr = (2 * np.asarray(indptr)).tolist()
+    return [','.join(tokens[indptr[i]:indptr[i + 1]]) for i in range(len(indptr) - 1)]
+
+
+def _pack(values):
+    """Encode the values as base64 of the smallest unsigned little-endian integer type."""
+    values = np.asarray(values)
+    if len(values) and values.min() < 0: raise Exception('Only values >= 0 can be packed.')
+    vmax = int(values.max()) if len(values) else 0
+    for nbytes in [1, 2, 4]:
+        if vmax < 2**(8 * nbytes): break
+    else:
+        raise Exception('Values larger than %d can not be packed.' %(2**32 - 1))
+    return base64.b64encode(values.astype('<u%d' %(nbytes)).tobytes()).decode('ascii'), nbytes
+
+
+def pack_sequences(indptr, state_id, time_in_state):
+    """Pack the state sequences into base64 encoded integer arrays.
+
+    Consecutive rows of a sample_id with the same state are merged into one row with the summed time in state.
+    The state ids and times are stored with the smallest unsigned integer type (Uint8, Uint16 or Uint32) and are
+    decoded into typed arrays in the browser.
+
+    Parameters
+    ----------
+    indptr : np.array
+        The rows of sample i are indptr[i]:indptr[i + 1].
+    state_id : np.array
+        State id per row.
+    time_in_state : np.array
+        Time in state per row.
+
+    Returns
+    -------
+    dict
+        'counts', 'states' and 'durations' with the base64 data, and the bytes per value in 'counts_bytes',
+        'states_bytes' and 'durations_bytes'. counts[i] is the number of rows of sample i.
+
+    """
+    indptr = np.asarray(indptr)
+    # A row starts a new run when it is the first row of a sample_id or when the state changes.
+    start = np.ones(len(state_id), dtype=bool)
+    start[1:] = state_id[1:] != state_id[:-1]
+    start[indptr[:-1][np.diff(indptr) > 0]] = True
+    runs = np.flatnonzero(start)
+    durations = np.add.reduceat(time_in_state, runs) if len(runs) else time_in_state[:0]
+    counts = np.diff(np.searchsorted(runs, indptr))
+
+    packed = {}
+    for key, values in [('counts', counts), ('states', state_id[runs]), ('durations', durations)]:
+        packed[key], packed[key + '_bytes'] = _pack(values)
+    return packed
+
+
 def write_html(X, config, logger=None):
     """Write html.
 
@@ -368,6 +555,7 @@ def write_html(X, config, logger=None):
 
     content = {
         'json_data': X,
+        'PACKED': config.get('packed', False),
         'TITLE': config['title'],
         'WIDTH': config['figsize'][0],
         'HEIGHT': config['figsize'][1],
@@ -399,23 +587,57 @@ def write_html(X, config, logger=None):
         'SAVE_TO_SVG_SCRIPT': save_script,
         'SAVE_BUTTON_START': show_save_button[0],
         'SAVE_BUTTON_STOP': show_save_button[1],
-
+        'ASSETS': write_assets('movingbubbles', config, logger=logger),
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.movingbubbles', package_path='d3js'))
-
-    index_template = jinja_env.get_template('movingbubbles.html.j2')
+    index_template = get_template('movingbubbles', 'movingbubbles.html.j2')
 
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
 
 
+def resample(df, freq, sample_id='sample_id', datetime='datetime', state='state', dt_format='%d-%m-%Y %H:%M:%S', logger=None):
+    """Downsample the events of every sample_id into time buckets.
+
+    The state of a bucket is the state of the last event in the bucket, and consecutive buckets with the same state
+    are merged. The remaining events get the start of their bucket as datetime, so that the times in state are
+    multiples of the frequency.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Input data.
+    freq : str or pd.Timedelta
+        Fixed frequency, such as '5min', 'h' or 'D'.
+    sample_id : str.
+        Column name of the sample identifier.
+    datetime : str.
+        Column name of the date time.
+    state : str.
+        Column name of the state.
+    dt_format : str, optional
+        '%d-%m-%Y %H:%M:%S'.
+
+    Returns
+    -------
+    df : DataFrame
+        The events that are kept, sorted on sample_id and datetime.
+
+    """
+    df = working_copy(df)
+    if not isinstance(df[datetime].iloc[0], dt.date):
+        df[datetime] = pd.to_datetime(df[datetime], format=dt_format)
+    df = df.sort_values(by=[sample_id, datetime], kind='stable', ignore_index=True)
+    times = df[datetime].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    keep, bucket = downsample(pd.factorize(df[sample_id])[0], times, pd.factorize(df[state])[0], freq)
+    if logger is not None: logger.info('Resampled %d events into %d events with frequency [%s].' %(df.shape[0], len(keep), freq))
+    df = df.iloc[keep].reset_index(drop=True)
+    df[datetime] = pd.to_datetime(bucket)
+    return df
+
+
 def standardize(df, method=None, sample_id='sample_id', datetime='datetime', dt_format='%d-%m-%Y %H:%M:%S', minimum_time='minutes', logger=None):
     """Standardize time per sample_id.
 
@@ -442,9 +664,7 @@ def standardize(df, method=None, sample_id='sample_id', datetime='datetime', dt_
 
     """
     # Use copy of dataframe
-    df = df.copy()
-    # Get unique
-    uis = df[sample_id].unique()
+    df = working_copy(df)
 
     # Check datetime format
     if not isinstance(df[datetime].iloc[0], dt.date):
@@ -453,70 +673,30 @@ def standardize(df, method=None, sample_id='sample_id', datetime='datetime', dt_
 
     # Initialize empty delta
     df['delta'] = df[datetime] - df[datetime]
-    # Initialize empty datetime_norm
-    # df['datetime_norm'] = df[datetime] - df[datetime]
-    # Set a default start point.
-    # timenow = dt.datetime.strptime(dt.datetime.now().strftime(dt_format), dt_format)
-    # timenow = timenow.replace(year=1980, month=1, day=1, hour=0, minute=0, second=0)
 
     if method=='samplewise':
         if logger is not None: logger.info('Standardize method: [%s]' %(method))
         df = df.sort_values(by=[sample_id, datetime])
         df.reset_index(drop=True, inplace=True)
-        # Standardize per unique sample id.
-        for s in tqdm(uis):
-            # Get data for specific sample-id
-            Iloc = df[sample_id]==s
-            dfs = df.loc[Iloc, :]
-            # Timedelta between consecutive rows for this sample
-            timedelta = dfs[datetime].iloc[1:].values - dfs[datetime].iloc[:-1]
-            df.loc[Iloc, 'delta'] = timedelta
-            # Last row of this sample has no successor — mark as NaT so it is
-            # caught by the NaT->zero block below and never triggers a move.
-            last_idx = dfs.index[-1]
-            df.loc[last_idx, 'delta'] = pd.NaT
-    elif method is None:
-        # Global mode: deltas are real wall-clock gaps between events across all
-        # sample_ids, sorted by datetime.  The last row of each sample gets NaT.
-        if logger is not None: logger.info('Standardize method: [global/None]')
-        df = df.sort_values(by=[datetime])
-        df.reset_index(drop=True, inplace=True)
-        tmpdelta = df[datetime].iloc[1:].values - df[datetime].iloc[:-1]
-        df.loc[1:, 'delta'] = tmpdelta
-        # NaT the last row per sample so it never triggers a move
-        for s in uis:
-            last_idx = df.loc[df[sample_id]==s].sort_values(by=[datetime]).index[-1]
-            df.loc[last_idx, 'delta'] = pd.NaT
-            # Standardize time per unique sample. Each sample will start at timenow.
-            # df.loc[Iloc, 'datetime_norm'] = timenow + (dfs[datetime].loc[Iloc] - dfs[datetime].loc[Iloc].min())
-    elif method=='relative':
+        # Timedelta to the next event of the same sample. The last row of a sample has no successor: NaT is set to
+        # zero below and never triggers a move.
+        df['delta'] = df.groupby(sample_id, sort=False)[datetime].shift(-1) - df[datetime]
+    elif method is None or method=='relative':
+        # Deltas are real wall-clock gaps between consecutive events across all sample_ids, sorted by datetime.
+        if logger is not None: logger.info('Standardize method: [%s]' %('global/None' if method is None else method))
         df = df.sort_values(by=[datetime])
         df.reset_index(drop=True, inplace=True)
-
-        # Note: The first state per sample_id is depended on the prevous state.
-        # timedelta = df[datetime]-df[datetime]
-        tmpdelta = df[datetime].iloc[1:].values - df[datetime].iloc[:-1]
-        # timedelta.loc[1:] = tmpdelta.values
-        df['delta'] = tmpdelta
-        # tmpdelta = df[datetime].iloc[1:].values - df[datetime].iloc[:-1]
-        # timedelta.loc[1:] = tmpdelta.values
-        # df['delta'] = timedelta
-
-        # Note: Last state per sample_id should always be ending and thus 0
-        uisample_id = df['sample_id'].unique()
-        getidx = []
-        for sid in uisample_id:
-            getidx.append(df[[sample_id, datetime]].loc[df[sample_id]==sid].sort_values(by=[datetime]).index[-1])
-        df.loc[getidx, 'delta']=np.nan
-        # df['datetime_norm'] = timenow + (df[datetime] - df[datetime].min())
+        delta = df[datetime].shift(-1) - df[datetime]
+        # Global mode: the first row keeps a zero delta.
+        # Relative mode: the first state per sample_id is dependent on the previous state.
+        if method is None: delta.iloc[:1] = df['delta'].iloc[:1]
+        # The last state per sample_id should always be ending: NaT is set to zero below.
+        df['delta'] = delta.mask(~df.duplicated(subset=sample_id, keep='last'))
     elif method=='minimum':
         df['delta'] = df['datetime'] - df['datetime'].min()
 
-
     # if NaT is found, set it to 0
-    Iloc = df['delta'].isna()
-    if np.any(Iloc):
-        df.loc[Iloc, 'delta'] = df[datetime].iloc[0] - df[datetime].iloc[0]
+    df['delta'] = df['delta'].fillna(df[datetime].iloc[0] - df[datetime].iloc[0])
 
     # Set datetime
     # df['datetime_norm'] = pd.to_datetime(df['datetime_norm'], format=dt_format, errors='ignore')
@@ -7,14 +7,15 @@ Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 """
 
-from jinja2 import Environment, PackageLoader
 from pathlib import Path
 import os
 import time
 try:
-    from .. utils import set_path, write_html_file, include_save_to_svg_script
+    from .. utils import set_path, write_html_stream, include_save_to_svg_script
+    from .. render import get_template, write_assets
 except:
-    from utils import set_path, write_html_file, include_save_to_svg_script
+    from utils import set_path, write_html_stream, include_save_to_svg_script
+    from render import get_template, write_assets
 
 
 def show(text, config, logger):
@@ -70,17 +71,12 @@ def write_html(X, config, logger):
         'SAVE_TO_SVG_SCRIPT': save_script,
         'SAVE_BUTTON_START': show_save_button[0],
         'SAVE_BUTTON_STOP': show_save_button[1],
+        'ASSETS': write_assets('particles', config, logger=logger),
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.particles', package_path='d3js'))
+    index_template = get_template('particles', 'particles.html.j2')
 
-    index_template = jinja_env.get_template('particles.html.j2')
-
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
@@ -0,0 +1,187 @@
+"""Profiler.
+
+Opt-in timing and memory instrumentation of the chart pipeline. A Profile is activated for the duration of a chart
+call (see D3Blocks(profile=True)) and every pipeline stage that is entered while it is active is recorded. When no
+profile is active, the stages only cost a single attribute lookup.
+
+Library     : d3blocks
+Author      : E.Taskesen
+Mail        : erdogant@gmail.com
+Github      : https://github.com/d3blocks/d3blocks
+License     : GPL3
+"""
+
+import time
+import functools
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# Stages that are recorded by the pipeline.
+STAGES = ['set_node_properties', 'set_edge_properties', 'pre_processing', 'get_data_ready_for_d3', 'render', 'write']
+
+_state = threading.local()
+
+
+# %% Profile
+class Profile:
+    """Record wall time and peak allocated memory per stage.
+
+    Parameters
+    ----------
+    chart : str
+        Name of the chart that is profiled.
+    memory : bool, (default: True)
+        Trace the peak allocated memory with tracemalloc. Tracing slows down the chart considerably.
+
+    Examples
+    --------
+    >>> with Profile('chord') as prof:
+    >>>     with stage('render'):
+    >>>         html = template.render(content)
+    >>> prof.result()
+
+    """
+
+    def __init__(self, chart, memory=True):
+        self.chart = chart
+        self.memory = memory
+        self.stages = {}
+        self.payload_size = None
+        self._stack = []
+        self._names = set()
+        self._started_tracing = False
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = active()
+        _state.profile = self
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._enter('total')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._exit()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        _state.profile = self._previous
+        return False
+
+    def _enter(self, name):
+        self._update_peak()
+        base = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        frame = {'name': name, 'start': time.perf_counter(), 'child_time': 0.0, 'base': base, 'peak': base}
+        self._stack.append(frame)
+        self._names.add(name)
+
+    def _exit(self, count=True):
+        self._update_peak()
+        frame = self._stack.pop()
+        self._names.discard(frame['name'])
+        elapsed = time.perf_counter() - frame['start']
+        if len(self._stack) > 0: self._stack[-1]['child_time'] += elapsed
+
+        record = self.stages.setdefault(frame['name'], {'calls': 0, 'time': 0.0, 'self_time': 0.0, 'peak_memory': 0})
+        if count: record['calls'] += 1
+        record['time'] += elapsed
+        record['self_time'] += elapsed - frame['child_time']
+        record['peak_memory'] = max(record['peak_memory'], frame['peak'] - frame['base'])
+
+    def _update_peak(self):
+        # The peak of tracemalloc is global. Propagate it to all open stages before it is reset for the next stage.
+        if not self.memory: return
+        peak = tracemalloc.get_traced_memory()[1]
+        for frame in self._stack:
+            frame['peak'] = max(frame['peak'], peak)
+        tracemalloc.reset_peak()
+
+    def result(self):
+        """Return the profile as a dictionary.
+
+        Returns
+        -------
+        dict
+            'chart': Name of the chart.
+            'time': Total wall time in seconds.
+            'peak_memory': Peak allocated memory in bytes during the chart call (None when memory is not traced).
+            'payload_size': Size of the generated html in bytes.
+            'stages': For each stage the number of calls, the wall time including nested stages ('time'), the wall
+            time excluding nested stages ('self_time') and the peak allocated memory in bytes.
+
+        """
+        total = self.stages.get('total', {'time': 0.0, 'peak_memory': 0})
+        stages = {name: dict(self.stages[name]) for name in STAGES if name in self.stages}
+        stages.update({name: dict(record) for name, record in self.stages.items() if name not in stages and name != 'total'})
+        if not self.memory:
+            for record in stages.values(): record['peak_memory'] = None
+
+        return {'chart': self.chart,
+                'time': total['time'],
+                'peak_memory': total['peak_memory'] if self.memory else None,
+                'payload_size': self.payload_size,
+                'stages': stages,
+                }
+
+
+# %% Stages
+def active():
+    """Return the active Profile of this thread or None."""
+    return getattr(_state, 'profile', None)
+
+
+@contextmanager
+def stage(name, count=True):
+    """Record the enclosed code as a stage of the active profile.
+
+    Nested calls of a stage with the same name are counted once.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage.
+    count : bool, (default: True)
+        Increase the number of calls of the stage.
+
+    """
+    prof = active()
+    if (prof is None) or (name in prof._names):
+        yield
+        return
+    prof._enter(name)
+    try:
+        yield
+    finally:
+        prof._exit(count=count)
+
+
+def profile_stage(name):
+    """Decorate a function as pipeline stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_state, 'profile', None) is None:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_iter(name, iterable):
+    """Record the time that is spent to produce each item of the iterable as a stage."""
+    if active() is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    first = True
+    while True:
+        with stage(name, count=first):
+            first = False
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -30,18 +30,21 @@ import json
 import numpy as np
 import pandas as pd
 import networkx as nx
-from jinja2 import Environment, PackageLoader
 
 try:
     from .. utils import (
         convert_dataframe_dict, set_path, pre_processing,
-        update_config, write_html_file, include_save_to_svg_script,
+        update_config, write_html_stream, include_save_to_svg_script, working_copy,
     )
+    from .. render import get_template, write_assets
+    from .. profiler import profile_stage
 except Exception:
     from utils import (
         convert_dataframe_dict, set_path, pre_processing,
-        update_config, write_html_file, include_save_to_svg_script,
+        update_config, write_html_stream, include_save_to_svg_script, working_copy,
     )
+    from render import get_template, write_assets
+    from profiler import profile_stage
 
 # d3graph is already a d3blocks dependency. Reused for node/edge property
 # computation and for network_significance() - not for rendering.
@@ -62,7 +65,7 @@ def set_config(config={}, font={}, **kwargs):
     logger = kwargs.get('logger', None)
     config['chart'] = 'radialgraph'
     config['title'] = kwargs.get('title', 'RadialGraph - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'radialgraph.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'radialgraph.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [800, 800])
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
@@ -132,7 +135,7 @@ def set_config(config={}, font={}, **kwargs):
 def set_edge_properties(df, **kwargs):
     """Set the edge (link) properties via d3graph.set_edge_properties."""
     logger = kwargs.get('logger', None)
-    df = df.copy()
+    df = working_copy(df)
     df = pre_processing(df, labels=df.columns.values[:-1].astype(str))
     # pre_processing reassigns the index to string labels, which breaks
     # alignment inside d3graph's vec2adjmat pivot. Reset before handing off.
@@ -146,7 +149,7 @@ def set_edge_properties(df, **kwargs):
         weight=df[weight_col],
     )
     g = _D3Graph(verbose=0)
-    g.adjmat = _data_checks(adjmat.copy())
+    g.adjmat = _data_checks(working_copy(adjmat))
     g.set_edge_properties(
         min_weight=kwargs.get('min_weight', 1.0),
         scaler=kwargs.get('edge_scaler', 'zscore'),
@@ -235,7 +238,7 @@ def set_node_properties(df, **kwargs):
         weight=weight,
     )
     g = _D3Graph(verbose=0)
-    g.adjmat = _data_checks(adjmat.copy())
+    g.adjmat = _data_checks(working_copy(adjmat))
     g.set_node_properties(
         label=kwargs.get('label'),
         tooltip=kwargs.get('tooltip'),
@@ -306,6 +309,7 @@ def set_node_properties(df, **kwargs):
     return node_properties
 
 
+@profile_stage('get_data_ready_for_d3')
 def _build_graph_json(df, node_properties, logger=None):
     """Build the flat {nodes, links} JSON the client consumes."""
     source_col, target_col = df.columns[0], df.columns[1]
@@ -417,14 +421,14 @@ def _build_graph_json(df, node_properties, logger=None):
 
 def show(df, **kwargs):
     """Build and show the graph."""
-    df = df.copy()
+    df = working_copy(df)
     node_properties = kwargs.get('node_properties')
     logger = kwargs.get('logger', None)
     config = update_config(kwargs, logger)
     config = config.copy()
 
     node_properties = convert_dataframe_dict(node_properties, frame=False)
-    df = convert_dataframe_dict(df.copy(), frame=True)
+    df = convert_dataframe_dict(df, frame=True)
     df.reset_index(inplace=True, drop=True)
 
     X, resolved_center = _build_graph_json(df, node_properties, logger=logger)
@@ -473,14 +477,9 @@ def write_html(X, config, logger=None):
         'SAVE_BUTTON_STOP': show_save_button[1],
         # expose the expand-on-load flag to the client template
         'expandAllOnLoad': 'true' if config.get('expand_all_on_load', False) else 'false',
+        'ASSETS': write_assets('radialgraph', config, logger=logger),
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except Exception:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.radialgraph', package_path='d3js'))
-
-    index_template = jinja_env.get_template('radialgraph.html.j2')
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    index_template = get_template('radialgraph', 'radialgraph.html.j2')
+    html = write_html_stream(config, index_template, content, logger)
     return html
\ No newline at end of file
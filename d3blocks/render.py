@@ -0,0 +1,326 @@
+"""Render.
+
+Shared template engine for all blocks. One jinja2 Environment is created per block and re-used for every render,
+so templates (including the vendored d3 libraries that are pulled in with {% include %}) are parsed and compiled
+only once per process. Optionally, the compiled bytecode can be stored on disk so that new processes can skip the
+compile step as well.
+
+Library     : d3blocks
+Author      : E.Taskesen
+Mail        : erdogant@gmail.com
+Github      : https://github.com/d3blocks/d3blocks
+License     : GPL3
+"""
+
+import os
+import base64
+import hashlib
+import uuid
+import threading
+import logging
+from jinja2 import Environment, PackageLoader, FileSystemBytecodeCache, meta
+
+logger = logging.getLogger(__name__)
+
+# Block name -> template file in the d3js directory of that block.
+TEMPLATES = {
+    'chord': 'chord.html.j2',
+    'circlepacking': 'circlepacking.html.j2',
+    'elasticgraph': 'elasticgraph.html.j2',
+    'imageslider': 'imageslider.html.j2',
+    'maps': 'maps.html.j2',
+    'movingbubbles': 'movingbubbles.html.j2',
+    'particles': 'particles.html.j2',
+    'radialgraph': 'radialgraph.html.j2',
+    'sankey': 'sankey.html.j2',
+    'scatter': 'scatter.html.j2',
+    'timeseries': 'timeseries.html.j2',
+    'tree': 'tree.html.j2',
+    'treemap': 'treemap.html.j2',
+    'violin': 'violin.html.j2',
+}
+
+# Blocks that fill their html with str.replace() on the raw template instead of jinja2.
+SOURCES = {
+    'heatmap': 'heatmap.html.j2',
+    'matrix': 'matrix.html.j2',
+}
+
+# Vendored libraries and data files that are included in the template of the block. With assets='external', these
+# are written once to a shared assets directory and referenced with <script src> instead of being inlined.
+ASSETS = {
+    'circlepacking': ['d3.v6.min.js', 'lodash.min.js'],
+    'imageslider': ['jquery-2.1.1.js'],
+    'maps': ['d3.v6.min.js', 'world.geojson'],
+    'movingbubbles': ['d3-3-5-5.min.js'],
+    'particles': ['d3.v4.min.js', 'd3-scale-chromatic.v1.min.js'],
+    'radialgraph': ['d3.v7.min.js', 'logo.txt'],
+    'scatter': ['d3.v4.min.js', 'logo.txt'],
+    'timeseries': ['d3.v3.js'],
+    'treemap': ['d3.v4.min.js'],
+    'violin': ['d3.v4.min.js', 'd3-scale-chromatic.v1.min.js'],
+}
+
+# Name of the directory, next to the html file, where the external assets are stored.
+ASSETS_DIR = 'assets'
+
+_lock = threading.RLock()
+_environments = {}
+_sources = {}
+_assets = {}
+_bytecode_cache = None
+
+
+# %% Bytecode cache
+def set_bytecode_cache(directory=None, logger=logger):
+    """Store compiled templates on disk.
+
+    Parameters
+    ----------
+    directory : str, (default: None)
+        Directory to store the compiled template bytecode.
+            * None: Disable the on-disk cache. Templates are only cached in memory.
+            * 'c://temp/d3blocks_cache/': Directory is created when it does not exist.
+
+    Returns
+    -------
+    None.
+
+    """
+    global _bytecode_cache
+    with _lock:
+        if directory is None:
+            _bytecode_cache = None
+        else:
+            os.makedirs(directory, exist_ok=True)
+            if logger is not None: logger.info('Template bytecode cache is set to [%s]' %(directory))
+            _bytecode_cache = FileSystemBytecodeCache(directory)
+        # Environments need to be re-created to pick up the new cache.
+        _environments.clear()
+
+
+# %% Environment
+def get_environment(block):
+    """Return the shared jinja2 Environment of the block.
+
+    Parameters
+    ----------
+    block : str
+        Name of the block, such as 'chord' or 'sankey'.
+
+    Returns
+    -------
+    jinja2.Environment
+
+    """
+    block = block.lower()
+    env = _environments.get(block)
+    if env is None:
+        with _lock:
+            env = _environments.get(block)
+            if env is None:
+                env = Environment(loader=PackageLoader(package_name='d3blocks.' + block, package_path='d3js'),
+                                  bytecode_cache=_bytecode_cache,
+                                  auto_reload=False,
+                                  cache_size=-1)
+                _environments[block] = env
+    return env
+
+
+def get_template(block, template_name=None):
+    """Return the compiled template of the block.
+
+    Parameters
+    ----------
+    block : str
+        Name of the block, such as 'chord' or 'sankey'.
+    template_name : str, (default: None)
+        Name of the template file. The default template of the block is used when None.
+
+    Returns
+    -------
+    jinja2.Template
+
+    """
+    if template_name is None: template_name = TEMPLATES[block.lower()]
+    return get_environment(block).get_template(template_name)
+
+
+def get_source(block, template_name=None):
+    """Return the raw (non-jinja) template text of the block.
+
+    The file is only read from disk once per process.
+
+    """
+    block = block.lower()
+    if template_name is None: template_name = SOURCES[block]
+    key = (block, template_name)
+    source = _sources.get(key)
+    if source is None:
+        filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), block, 'd3js', template_name)
+        with open(filepath, 'r', encoding="utf8", errors='ignore') as file:
+            source = file.read()
+        _sources[key] = source
+    return source
+
+
+def render(block, content, template_name=None):
+    """Render the template of the block with the content.
+
+    Parameters
+    ----------
+    block : str
+        Name of the block, such as 'chord' or 'sankey'.
+    content : dict
+        Variables that are passed to the template.
+    template_name : str, (default: None)
+        Name of the template file. The default template of the block is used when None.
+
+    Returns
+    -------
+    html : str
+
+    """
+    return get_template(block, template_name).render(content)
+
+
+# %% External assets
+def get_asset(block, name):
+    """Return the content-hashed filename and the bytes of a vendored asset.
+
+    The name contains the first 12 characters of the sha256 hash of the content, e.g., 'd3.v4.min.0b2a4e7c9d1f.js'.
+    Identical libraries that are shipped with different blocks therefore resolve to the same file.
+
+    * Javascript files are stored as is.
+    * 'logo.txt' contains a base64 data URI and is stored as the decoded image.
+    * 'world.geojson' is wrapped in a script that sets the global D3BLOCKS_WORLD_GEOJSON.
+
+    Parameters
+    ----------
+    block : str
+        Name of the block, such as 'violin' or 'maps'.
+    name : str
+        Name of the file in the d3js directory of the block.
+
+    Returns
+    -------
+    tuple : (filename, bytes)
+
+    """
+    key = (block.lower(), name)
+    asset = _assets.get(key)
+    if asset is None:
+        env = get_environment(block)
+        # Render without context so that the file is identical to what {% include %} would inline.
+        text = env.get_template(name).render()
+        root, ext = os.path.splitext(name)
+        if name.endswith('.txt') and text.startswith('data:'):
+            header, data = text.split(',', 1)
+            ext = '.' + header[5:].split(';')[0].split('/')[-1]
+            data = base64.b64decode(data)
+        elif ext == '.geojson':
+            ext = '.js'
+            data = ('var D3BLOCKS_' + root.upper() + '_GEOJSON = ' + text + ';').encode('utf-8')
+        else:
+            data = text.encode('utf-8')
+        asset = (root + '.' + hashlib.sha256(data).hexdigest()[:12] + ext, data)
+        _assets[key] = asset
+    return asset
+
+
+def write_assets(block, config, logger=logger):
+    """Write the vendored assets of the block to the shared assets directory.
+
+    Files are only written when they do not exist yet. Because the filename contains the content hash, rendering
+    hundreds of charts into the same directory results in a single copy of each library.
+
+    Parameters
+    ----------
+    block : str
+        Name of the block, such as 'violin' or 'maps'.
+    config : dict
+        Configuration of the chart. The following keys are used:
+            'assets': 'inline' (default) or 'external'.
+            'filepath': The assets directory is created next to this file.
+            'notebook': Assets are always inlined in notebooks.
+
+    Returns
+    -------
+    dict
+        Asset name -> relative url that is used in the template. Empty when the assets are inlined.
+
+    """
+    assets = config.get('assets', 'inline')
+    if assets is None or assets == 'inline': return {}
+    if assets != 'external': raise Exception('assets should be "inline" or "external" and not [%s].' %(assets))
+    if config.get('notebook', False) or not config.get('filepath', None):
+        if logger is not None: logger.info('Assets can only be external when the chart is written to disk. Assets are inlined.')
+        return {}
+
+    dirpath = os.path.join(os.path.dirname(os.path.abspath(config['filepath'])), ASSETS_DIR)
+    os.makedirs(dirpath, exist_ok=True)
+
+    urls = {}
+    for name in ASSETS.get(block.lower(), []):
+        filename, data = get_asset(block, name)
+        filepath = os.path.join(dirpath, filename)
+        if not os.path.isfile(filepath):
+            if logger is not None: logger.info('Write asset [%s]' %(filepath))
+            # Write to a temporary file first so that concurrent writers never expose a partial file.
+            tmppath = '%s.%s.tmp' %(filepath, uuid.uuid4().hex[:12])
+            try:
+                with open(tmppath, 'xb') as file:
+                    file.write(data)
+                os.replace(tmppath, filepath)
+            except Exception:
+                if os.path.isfile(tmppath): os.remove(tmppath)
+                raise
+        urls[name] = ASSETS_DIR + '/' + filename
+    return urls
+
+
+# %% Warm-up
+def warmup(blocks=None, cache_dir=None, logger=logger):
+    """Precompile the templates of all blocks.
+
+    Call this once at process start (e.g., in a worker initializer) so that the first chart in the process does not
+    pay for parsing and compiling the templates and the included d3 libraries.
+
+    Parameters
+    ----------
+    blocks : list of str, (default: None)
+        Blocks to precompile. None precompiles all blocks.
+    cache_dir : str, (default: None)
+        Directory to store the compiled bytecode on disk. See set_bytecode_cache().
+
+    Returns
+    -------
+    list of str
+        Names of the blocks that are compiled.
+
+    Examples
+    --------
+    >>> from d3blocks import render
+    >>> render.warmup()
+
+    """
+    if cache_dir is not None: set_bytecode_cache(cache_dir, logger=logger)
+    if blocks is None: blocks = [*TEMPLATES.keys()] + [*SOURCES.keys()]
+
+    compiled = []
+    for block in blocks:
+        block = block.lower()
+        if block in SOURCES:
+            get_source(block)
+        else:
+            env = get_environment(block)
+            template_name = TEMPLATES[block]
+            env.get_template(template_name)
+            # Included files are compiled lazily during render. Compile them now.
+            source = env.loader.get_source(env, template_name)[0]
+            for include in meta.find_referenced_templates(env.parse(source)):
+                if include is not None: env.get_template(include)
+        compiled.append(block)
+
+    if logger is not None: logger.info('Templates are precompiled for [%d] blocks.' %(len(compiled)))
+    return compiled
@@ -7,13 +7,20 @@ Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 """
 import numpy as np
-from jinja2 import Environment, PackageLoader
 import colourmap as cm
 
 try:
-    from .. utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_file, is_circular, convert_to_json_format, include_save_to_svg_script
+    from .. utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_stream, is_circular, convert_to_json_format, include_save_to_svg_script, intern_labels, working_copy
+    from .. render import get_template
+    from .. profiler import profile_stage
+    from .. import serialize
+    from .. tables import NodeTable
 except:
-    from utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_file, is_circular, convert_to_json_format, include_save_to_svg_script
+    from utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_stream, is_circular, convert_to_json_format, include_save_to_svg_script, intern_labels, working_copy
+    from render import get_template
+    from profiler import profile_stage
+    import serialize
+    from tables import NodeTable
 
 
 # %% Set configuration properties
@@ -23,7 +30,7 @@ def set_config(config={}, link={}, node={}, margin={}, **kwargs):
     # Store configurations
     config['chart'] ='sankey'
     config['title'] = kwargs.get('title', 'Sankey - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'sankey.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'sankey.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [800, 600])
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
@@ -81,8 +88,8 @@ def set_edge_properties(df, **kwargs):
 
     """
     logger = kwargs.get('logger', None)
-    df = df.copy()
-    df = pre_processing(df.copy(), clean_source_target=True, logger=logger)
+    df = working_copy(df)
+    df = pre_processing(df, clean_source_target=True, logger=logger)
     return df
 
 
@@ -97,12 +104,12 @@ def set_node_properties(df, **kwargs):
 
     Returns
     -------
-    dict_labels : dictionary()
-        Dictionary containing the label properties.
+    node_properties : NodeTable
+        Label properties. The properties of a label can be changed with node_properties.get(label)['color'] = '#000000'.
 
     """
-    dfO = df.copy()
-    df = pre_processing(df.copy(), clean_source_target=True)
+    dfO = df
+    df = pre_processing(working_copy(df), clean_source_target=True)
     logger = kwargs.get('logger', None)
     cmap = kwargs.get('cmap', 'Set1')
 
@@ -131,17 +138,12 @@ def set_node_properties(df, **kwargs):
     #         fontsize[labels.get(key)] = fontsize.pop(key)
     fontsize = kwargs.get('fontsize', 10)
 
-    # Store in final dict
-    dict_labels = {}
-    for i, label in enumerate(uilabels):
-        getcolor = '#d3d3d3'
-        # Change color if user-defined.
-        if color is not None: getcolor = color.get(label, getcolor)
-        # getfontsize = fontsize.get(label, getfontsize)
-        # create dict labels
-        dict_labels[label] = {'id': i, 'label': label, 'color': getcolor, 'fontsize': fontsize}
+    # User-defined colors per label.
+    colors = [color.get(label, '#d3d3d3') if color is not None else '#d3d3d3' for label in uilabels]
+    # Store the properties in columns with one row per label.
+    node_properties = NodeTable({'id': np.arange(len(uilabels)), 'label': uilabels, 'color': colors, 'fontsize': np.repeat(fontsize, len(uilabels))}, labels=uilabels)
     # Return
-    return dict_labels
+    return node_properties
 
 
 def show(df, **kwargs):
@@ -163,20 +165,21 @@ def show(df, **kwargs):
         Dictionary containing updated configuration keys.
 
     """
-    df = df.copy()
+    df = working_copy(df)
     node_properties = kwargs.get('node_properties')
     logger = kwargs.get('logger', None)
     config = update_config(kwargs, logger)
     config = config.copy()
 
     # Convert dict/frame.
-    node_properties = convert_dataframe_dict(node_properties, frame=False)
-    df = convert_dataframe_dict(df.copy(), frame=True)
+    node_properties = NodeTable.as_table(node_properties)
+    df = convert_dataframe_dict(df, frame=True)
 
     # Transform dataframe into input form for d3
     df.reset_index(inplace=True, drop=True)
-    df['source_id'] = list(map(lambda x: node_properties.get(x)['id'], df['source']))
-    df['target_id'] = list(map(lambda x: node_properties.get(x)['id'], df['target']))
+    table, (source, target) = intern_labels(node_properties, df['source'], df['target'])
+    df['source_id'] = table['id'].values[source]
+    df['target_id'] = table['id'].values[target]
 
     # Set link_color selection correct on the form
     config['link_color_select'] = {'source': '', 'target': '', 'source-target': ''}
@@ -190,14 +193,15 @@ def show(df, **kwargs):
     config['fontsize'] = kwargs['config']['fontsize']
 
     # Create the data from the input of javascript
-    X = get_data_ready_for_d3(df, node_properties)
+    X = get_data_ready_for_d3(df, table)
     # Check whether dataframe is circular
-    if is_circular(df, logger):
-        logger.warning("The dataframe seems to be circular which can not be handled by this chart!")
+    cycles = is_circular(df, logger)
+    if cycles:
+        logger.warning("The dataframe seems to be circular which can not be handled by this chart! Number of cycles: %d. Nodes in the first cycle: %s" %(len(cycles), cycles[0][:25]))
 
     # node_properties = convert_dataframe_dict(node_properties.copy(), frame=True)
     # X_nodes = convert_to_json_format(node_properties, logger=logger)
-    uicolors = np.unique(list(map(lambda x: node_properties.get(x)['color'], node_properties.keys())))
+    uicolors = np.unique(node_properties.column('color'))
     custom_colors = np.any(~np.isin(uicolors, '#d3d3d3'))
     # Write to HTML
     return write_html(X, config, custom_colors, logger)
@@ -255,30 +259,24 @@ def write_html(X, config, custom_colors, logger=None):
         'SUPPORT': config['support'],
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.sankey', package_path='d3js'))
+    index_template = get_template('sankey', 'sankey.html.j2')
 
-    index_template = jinja_env.get_template('sankey.html.j2')
-
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
 
 
-def get_data_ready_for_d3(df, labels):
+@profile_stage('get_data_ready_for_d3')
+def get_data_ready_for_d3(df, table):
     """Convert the source-target data into d3 compatible data.
 
     Parameters
     ----------
     df : pd.DataFrame()
-        Input data.
-    labels : dict
-        Dictionary containing hex colorlabels for the classes.
-        The labels are derived using the function: labels = d3blocks.set_label_properties()
+        Input data with the columns source_id and target_id.
+    table : pd.DataFrame()
+        Label table with one row per label (see intern_labels).
 
     Returns
     -------
@@ -286,23 +284,21 @@ def get_data_ready_for_d3(df, labels):
         Converted data into a string that is d3 compatible.
 
     """
-    # Set the nodes in an increasing id-order
-    list_id = np.array(list(map(lambda x: labels.get(x)['id'], df['source'])) + list(map(lambda x: labels.get(x)['id'], df['target'])))
-    list_name = np.array(list(map(lambda x: labels.get(x)['label'], df['source'])) + list(map(lambda x: labels.get(x)['label'], df['target'])))
-    _, idx = np.unique(list_id, return_index=True)
+    # Set the nodes that are used in the links in an increasing id-order
+    table = table.set_index('id', drop=False).loc[np.unique(np.r_[df['source_id'].values, df['target_id'].values])]
 
     # Set the nodes
-    X = '{"nodes":['
-    for i in idx:
-        X = X + '{"name":"' + list_name[i] + '", "color":"' + labels.get(list_name[i])["color"] + '", "fontsize":"' + str(labels.get(list_name[i])["fontsize"]) + '"},'
-    X = X[:-1] + '],'
+    nodes = serialize.records({'name': serialize.strings(table['label'].values),
+                               'color': serialize.strings(table['color'].values),
+                               'fontsize': serialize.strings(table['fontsize'].values),
+                               })
 
     # Set the links
-    # source_target_id = list(zip(list(map(lambda x: labels.get(x)['id'], df['source'])),  list(map(lambda x: labels.get(x)['id'], df['target']))))
-    X = X + ' "links":['
-    for _, row in df.iterrows():
-        X = X + '{"source":' + str(row['source_id']) + ',"target":' + str(row['target_id']) + ',"value":' + str(row['weight']) + '},'
-    X = X[:-1] + ']}'
+    links = serialize.records({'source': serialize.numbers(df['source_id'].values),
+                               'target': serialize.numbers(df['target_id'].values),
+                               'value': serialize.numbers(df['weight'].values),
+                               })
+    X = '{"nodes":' + serialize.array(nodes) + ',"links":' + serialize.array(links) + '}'
 
     # Return
     return X
@@ -12,15 +12,20 @@ License     : GPL3
 import numpy as np
 import pandas as pd
 import json
-from jinja2 import Environment, PackageLoader
 from pathlib import Path
 import os
 import time
 
 try:
-    from .. utils import set_colors, convert_dataframe_dict, set_path, update_config, write_html_file, jitter_func, include_save_to_svg_script
+    from .. utils import set_colors, density_opacity, convert_dataframe_dict, set_path, update_config, write_html_stream, jitter_func, include_save_to_svg_script, working_copy
+    from .. render import get_template, write_assets
+    from .. profiler import profile_stage
+    from .. tables import EdgeTable
 except:
-    from utils import set_colors, convert_dataframe_dict, set_path, update_config, write_html_file, jitter_func, include_save_to_svg_script
+    from utils import set_colors, density_opacity, convert_dataframe_dict, set_path, update_config, write_html_stream, jitter_func, include_save_to_svg_script, working_copy
+    from render import get_template, write_assets
+    from profiler import profile_stage
+    from tables import EdgeTable
 
 
 # %% Set configuration properties
@@ -29,7 +34,7 @@ def set_config(config={}, **kwargs):
     logger = kwargs.get('logger', None)
     config['chart'] ='Scatter'
     config['title'] = kwargs.get('title', 'scatter - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'scatter.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'scatter.html'), logger, unique=config.get('unique_filename', False))
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
     config['figsize'] = kwargs.get('figsize', [900, 600])
@@ -177,6 +182,13 @@ def set_edge_properties(*args, **kwargs):
     c_gradient : String, (default: None)
         Make a lineair gradient based on the density for the particular class label.
         '#ffffff'
+    density_method : String, (default: 'auto')
+        Method to determine the density for c_gradient.
+        'exact': Gaussian kernel density estimate. Slow for large number of points.
+        'grid': Kernel density on a grid. Fast and close to the exact density.
+        'auto': 'exact' for classes up to 5000 points and 'grid' otherwise.
+    density_grid : int, (default: 128)
+        Number of grid points per dimension for the density_method 'grid'.
     tooltip: list of labels with same size as (x,y)
         labels of the samples.
     opacity: float or list/array [0-1]
@@ -197,8 +209,8 @@ def set_edge_properties(*args, **kwargs):
 
     Returns
     -------
-    d3.edge_properties: DataFrame of dictionary
-         Contains properties of the unique input edges/links.
+    d3.edge_properties: EdgeTable
+         Contains properties of the points. The properties of point i can be changed with d3.edge_properties[i]['size'] = 10.
 
     """
     # Collect arguments
@@ -221,6 +233,8 @@ def set_edge_properties(*args, **kwargs):
     color = kwargs.get('color', '#69b3a2')
     stroke = kwargs.get('stroke', '#000000')
     c_gradient = kwargs.get('c_gradient', None)
+    density_method = kwargs.get('density_method', 'auto')
+    density_grid = kwargs.get('density_grid', 128)
     tooltip = kwargs.get('tooltip', None)
     opacity = kwargs.get('opacity', 0.8)
     cmap = kwargs.get('cmap', 'tab20')
@@ -287,16 +301,13 @@ def set_edge_properties(*args, **kwargs):
     if tooltip is None: tooltip = np.repeat('', X.shape[0])
 
     # Set colors
-    color, labels = set_colors(X, color, cmap, c_gradient=c_gradient)
+    color, labels = set_colors(X, color, cmap, c_gradient=c_gradient, density_method=density_method, density_grid=density_grid, logger=logger)
 
     # In case only one opacity is defined. Set all points to this size.
     if isinstance(opacity, (int, float)): opacity = np.repeat(opacity, X.shape[0])
     if (c_gradient is not None):
         if logger is not None: logger.info('Set opacity based on the data density.')
-        import colourmap
-        c_rgb = colourmap.gradient_on_density_color(X, colourmap.hex2rgb(color), labels, opaque_type='per_class')
-        opacity = c_rgb[:, 3]
-        # c_hex = c_rgb[:, 0:3]
+        opacity = density_opacity(X, labels, method=density_method, grid_size=density_grid, logger=logger)
 
     # In case stroke is None: use same colors as for c.
     if stroke is None:
@@ -305,16 +316,11 @@ def set_edge_properties(*args, **kwargs):
         # In case only one stroke is defined. Set all points to this size.
         stroke = np.repeat(stroke, X.shape[0])
 
-    # Make dict with properties
-    dict_properties = {}
-    for i in range(0, X.shape[0]):
-        dict_properties[i] = {'label': labels[i], 'x': X[i][0], 'y': X[i][1], 'x1': X1[i][0], 'y1': X1[i][1], 'x2': X2[i][0], 'y2': X2[i][1], 'x3': X3[i][0], 'y3': X3[i][1], 'color': color[i], 'size': size[i], 'stroke': stroke[i], 'opacity': opacity[i], 'tooltip': tooltip[i]}
-
-    # Create the plot
-    # df = pd.DataFrame(dict_properties).T
+    # Store the properties in columns with one row per point.
+    edge_properties = EdgeTable({'label': labels, 'x': X[:, 0], 'y': X[:, 1], 'x1': X1[:, 0], 'y1': X1[:, 1], 'x2': X2[:, 0], 'y2': X2[:, 1], 'x3': X3[:, 0], 'y3': X3[:, 1], 'color': color, 'size': size, 'stroke': stroke, 'opacity': opacity, 'tooltip': tooltip})
 
     # return
-    return dict_properties
+    return edge_properties
 
 
 # %% Scale data
@@ -367,7 +373,7 @@ def show(df, **kwargs):
         Dictionary containing updated configuration keys.
 
     """
-    df = df.copy()
+    df = working_copy(df)
     logger = kwargs.get('logger', None)
     label_radio = kwargs.get('label_radio', None)
     config = update_config(kwargs, logger)
@@ -469,22 +475,18 @@ def write_html(X, config, logger=None):
         'SAVE_TO_SVG_SCRIPT': save_script,
         'SAVE_BUTTON_START': show_save_button[0],
         'SAVE_BUTTON_STOP': show_save_button[1],
+        'ASSETS': write_assets('scatter', config, logger=logger),
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.scatter', package_path='d3js'))
-
-    index_template = jinja_env.get_template('scatter.html.j2')
+    index_template = get_template('scatter', 'scatter.html.j2')
 
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
 
 
+@profile_stage('get_data_ready_for_d3')
 def get_data_ready_for_d3(df, node_properties=None):
     """Convert the edge_properties dataframe into d3 compatible JSON.
 
@@ -0,0 +1,212 @@
+"""Serialize.
+
+JSON serialization of the data that is embedded in the html of the blocks. Columns are encoded in bulk instead of row
+by row and the encoded values are joined once. Nested structures are encoded with orjson when it is installed and
+with an encoder that gives the same output otherwise. The output is deterministic: the same input results in the same
+bytes.
+
+Library     : d3blocks
+Author      : E.Taskesen
+Mail        : erdogant@gmail.com
+Github      : https://github.com/d3blocks/d3blocks
+License     : GPL3
+"""
+
+import re
+import json
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Characters that need to be escaped in a JSON string.
+_ESCAPE = re.compile(r'["\\\x00-\x1f]')
+
+
+# %% Nested structures
+def _default(obj):
+    """Convert numpy and pandas types that are not supported by the json module."""
+    if isinstance(obj, np.bool_): return bool(obj)
+    if isinstance(obj, np.integer): return int(obj)
+    if isinstance(obj, np.floating): return float(obj)
+    if isinstance(obj, np.ndarray): return obj.tolist()
+    if isinstance(obj, (pd.Timestamp, pd.Timedelta)): return str(obj)
+    raise TypeError('Object of type [%s] is not JSON serializable.' %(type(obj).__name__))
+
+
+def _float(value):
+    """Format a float as orjson does: the shortest digits that round-trip and null for NaN and infinity.
+
+    float32 values are formatted with the shortest digits of the float32. The notation is fixed when the decimal
+    exponent is in (-5, 16] for float64 and (-6, 13] for float32, and scientific without + or leading zeros otherwise.
+    """
+    if not np.isfinite(value): return 'null'
+    low, high = (-6, 13) if isinstance(value, np.float32) else (-5, 16)
+    sign, digits, k = Decimal(str(value)).normalize().as_tuple()
+    digits = ''.join(map(str, digits))
+    # Position of the decimal point with respect to the first digit.
+    kk = len(digits) + k
+    if 0 <= k and kk <= high:
+        out = digits + '0' * k + '.0'
+    elif 0 < kk <= high:
+        out = digits[:kk] + '.' + digits[kk:]
+    elif low < kk <= 0:
+        out = '0.' + '0' * -kk + digits
+    else:
+        out = digits[0] + ('.' + digits[1:] if len(digits) > 1 else '') + 'e' + str(kk - 1)
+    return '-' + out if sign else out
+
+
+def _key(key):
+    """Encode a dict key. Keys that are not strings are converted as orjson does with OPT_NON_STR_KEYS."""
+    return _encode(key if isinstance(key, str) else _encode(key))
+
+
+def _encode(obj):
+    """Encode the object with the same output as orjson. Used when orjson is not installed."""
+    if isinstance(obj, str): return json.dumps(obj, ensure_ascii=False)
+    if obj is None: return 'null'
+    if isinstance(obj, (bool, np.bool_)): return 'true' if obj else 'false'
+    if isinstance(obj, (int, np.integer)): return str(int(obj))
+    if isinstance(obj, (float, np.float32)): return _float(obj)
+    if isinstance(obj, dict): return '{' + ','.join(_key(key) + ':' + _encode(value) for key, value in obj.items()) + '}'
+    if isinstance(obj, (list, tuple)): return '[' + ','.join(map(_encode, obj)) + ']'
+    # orjson encodes the numpy arrays of these dtypes. Other arrays are converted by _default.
+    if isinstance(obj, np.ndarray) and (obj.dtype.kind in 'biu' or obj.dtype in [np.float32, np.float64]):
+        return '[' + ','.join(map(_encode, obj)) + ']'
+    return _encode(_default(obj))
+
+
+def dumps(obj):
+    """Serialize dicts, lists, scalars and numpy types into a compact JSON string.
+
+    Parameters
+    ----------
+    obj : Various
+        Object to serialize.
+
+    Returns
+    -------
+    str
+        Compact JSON without spaces and with the non-ascii characters kept as is. NaN and infinity are encoded as null.
+
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return _encode(obj)
+
+
+def nested(tree, key='children'):
+    """Serialize a tree of dicts into a compact JSON string without recursion.
+
+    The json module and orjson are limited in the depth of the structure. Deep trees, such as long chains, are
+    therefore encoded node by node with an explicit stack.
+
+    Parameters
+    ----------
+    tree : dict
+        Root node. The children of a node are stored as a list of dicts under key.
+    key : str, (default: 'children')
+        Key of the children.
+
+    Returns
+    -------
+    str
+        Compact JSON. The children are the last key of every node.
+
+    """
+    out, stack = [], [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            out.append(node)
+            continue
+        children = node.get(key)
+        if not children:
+            out.append(dumps(node))
+            continue
+        head = dumps({k: v for k, v in node.items() if k != key})
+        out.append(head[:-1] + (',' if len(head) > 2 else '') + dumps(key) + ':[')
+        stack.append(']}')
+        for i in range(len(children) - 1, -1, -1):
+            stack.append(children[i])
+            if i > 0: stack.append(',')
+    return ''.join(out)
+
+
+# %% Columns
+def strings(values):
+    """Encode the values as JSON strings.
+
+    Parameters
+    ----------
+    values : array-like
+        Values are converted with str().
+
+    Returns
+    -------
+    list of str
+
+    """
+    values = list(map(str, values))
+    # Most labels do not contain characters that need escaping. Check them in one pass over the joined string.
+    if _ESCAPE.search(''.join(values)) is None:
+        return ['"' + value + '"' for value in values]
+    return [json.dumps(value, ensure_ascii=False) for value in values]
+
+
+def numbers(values):
+    """Encode the values as JSON numbers.
+
+    The numbers are formatted with str() of the Python int or float. Missing and infinite values are encoded as null.
+
+    Parameters
+    ----------
+    values : array-like
+        Integers, floats or booleans.
+
+    Returns
+    -------
+    list of str
+
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'b':
+        return ['true' if value else 'false' for value in values.tolist()]
+    out = list(map(str, values.tolist()))
+    if values.dtype.kind in 'fc' or values.dtype == object:
+        for i in np.flatnonzero(~np.isfinite(values.astype(float))):
+            out[i] = 'null'
+    return out
+
+
+def records(columns):
+    """Encode columns as JSON objects, one object per row.
+
+    Parameters
+    ----------
+    columns : dict
+        Key -> list with the encoded values (see strings() and numbers()). The keys are in the order of the output.
+
+    Returns
+    -------
+    list of str
+
+    Examples
+    --------
+    >>> records({'name': strings(['a', 'b']), 'value': numbers([1, 2])})
+    ['{"name":"a","value":1}', '{"name":"b","value":2}']
+
+    """
+    keys = strings(columns.keys())
+    template = '{' + ','.join(key.replace('%', '%%') + ':%s' for key in keys) + '}'
+    return [template % row for row in zip(*columns.values())]
+
+
+def array(items, sep=','):
+    """Join encoded items into a JSON array."""
+    return '[' + sep.join(items) + ']'
@@ -0,0 +1,246 @@
+"""Property tables.
+
+Columnar storage of the node and edge properties. The properties are stored in one pandas DataFrame with one row per
+label and one column per property, instead of one dict per label. Properties are get and set for all rows at once by
+label or mask. The tables also behave as the {label: {property: value}} dicts that were used before, so that
+d3.node_properties.get('label')['color'] = '#000000' keeps working.
+
+All blocks that compute their own node or edge properties store them in tables. The radialgraph and elasticgraph
+blocks keep the {label: {property: value}} dicts of d3graph, which computes their node properties.
+
+Library     : d3blocks
+Author      : E.Taskesen
+Mail        : erdogant@gmail.com
+Github      : https://github.com/d3blocks/d3blocks
+License     : GPL3
+"""
+
+from collections.abc import MutableMapping
+import numpy as np
+import pandas as pd
+
+
+def _scalar(value):
+    """Convert numpy scalars to Python scalars."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _upcast(dtype, values):
+    """Return the dtype of a column that stores the values and the values. The dtype is None when the values fit."""
+    # Object columns store every value. Extension dtypes, such as strings, raise when the values do not fit.
+    if not isinstance(dtype, np.dtype) or dtype == object: return None, values
+    array = np.asarray(values)
+    if array.dtype == object:
+        series = pd.Series(array.ravel(), dtype=object)
+        # Missing values are stored as NaN, as pandas does.
+        if series.isna().all():
+            values = np.full(array.shape, np.nan) if array.ndim else np.nan
+            array = np.asarray(values)
+        else:
+            array = series.infer_objects().to_numpy()
+    if np.can_cast(array.dtype, dtype, casting='safe'): return None, values
+    # Numbers are stored in the common numeric dtype, such as floats in an integer column.
+    if dtype.kind in 'biufc' and array.dtype.kind in 'biufc': return np.result_type(dtype, array.dtype), values
+    return np.dtype(object), values
+
+
+# %% Row view
+class Row(MutableMapping):
+    """Dict view of one row of a property table. Changes are written into the table."""
+
+    def __init__(self, table, label):
+        self._table = table
+        self._label = label
+
+    def __getitem__(self, key):
+        if key not in self._table.frame.columns: raise KeyError(key)
+        return _scalar(self._table.frame.at[self._label, key])
+
+    def __setitem__(self, key, value):
+        self._table.set(key, [value], labels=[self._label])
+
+    def __delitem__(self, key):
+        raise TypeError('Properties can not be removed from a single row. Use table.frame.drop(columns=...) instead.')
+
+    def __iter__(self):
+        return iter(self._table.frame.columns)
+
+    def __len__(self):
+        return self._table.frame.shape[1]
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+# %% Property table
+class PropertyTable(MutableMapping):
+    """Columnar property store with one row per label.
+
+    Parameters
+    ----------
+    columns : dict or pd.DataFrame, (default: None)
+        Property name -> array-like with one value per label.
+    labels : array-like, (default: None)
+        Unique labels of the rows. None uses 0, 1, ..., n-1.
+
+    Examples
+    --------
+    >>> table = NodeTable({'color': ['#000000', '#ffffff'], 'opacity': [0.8, 0.8]}, labels=['A', 'B'])
+    >>> table.get('A')['color'] = '#ff0000'
+    >>> table.set('opacity', 0.5, mask=table.column('color') == '#ffffff')
+    >>> table.lookup(['B', 'A', 'B'], 'color')
+    array(['#ffffff', '#ff0000', '#ffffff'], dtype=object)
+    >>> table.to_dict()
+    {'A': {'color': '#ff0000', 'opacity': 0.8}, 'B': {'color': '#ffffff', 'opacity': 0.5}}
+
+    """
+
+    def __init__(self, columns=None, labels=None):
+        frame = pd.DataFrame(columns if columns is not None else {})
+        if labels is not None: frame.index = pd.Index(labels, dtype=object)
+        if not frame.index.is_unique: raise Exception('The labels of a %s should be unique.' %(type(self).__name__))
+        self.frame = frame
+
+    @classmethod
+    def from_dict(cls, properties):
+        """Create the table from {label: {property: value}}."""
+        return cls(pd.DataFrame.from_dict(properties, orient='index'))
+
+    @classmethod
+    def as_table(cls, properties, key='label'):
+        """Return the properties as table. A table is returned as is.
+
+        Parameters
+        ----------
+        properties : PropertyTable, dict or pd.DataFrame
+            Table, {label: {property: value}} or the DataFrame view with the labels in the key column.
+        key : str, (default: 'label')
+            Column of the DataFrame view with the labels.
+
+        Returns
+        -------
+        PropertyTable
+
+        """
+        if isinstance(properties, PropertyTable): return properties
+        if isinstance(properties, pd.DataFrame): return cls(properties, labels=[str(x) for x in properties[key].values])
+        return cls.from_dict(properties)
+
+    # Dict interface
+    def __getitem__(self, label):
+        if label not in self.frame.index: raise KeyError(label)
+        return Row(self, label)
+
+    def __setitem__(self, label, properties):
+        properties = dict(properties)
+        if label not in self.frame.index:
+            self.frame = pd.concat([self.frame, pd.DataFrame([properties], index=pd.Index([label], dtype=object))])
+            return
+        for key, value in properties.items():
+            self.set(key, [value], labels=[label])
+
+    def __delitem__(self, label):
+        self.frame = self.frame.drop(index=label)
+
+    def __iter__(self):
+        return iter(self.frame.index)
+
+    def __len__(self):
+        return self.frame.shape[0]
+
+    def __contains__(self, label):
+        return label in self.frame.index
+
+    def __repr__(self):
+        return '%s with %d rows and properties %s' %(type(self).__name__, len(self), list(self.frame.columns))
+
+    # Columnar interface
+    @property
+    def labels(self):
+        """Labels of the rows."""
+        return self.frame.index.to_numpy()
+
+    def column(self, name):
+        """Values of one property for all rows."""
+        return self.frame[name].to_numpy()
+
+    def codes(self, labels):
+        """Row number of every label. Labels that are not in the table get -1."""
+        return pd.Index(self.frame.index, dtype=object).get_indexer(np.asarray(labels, dtype=object))
+
+    def lookup(self, labels, name, default=None):
+        """Values of one property for every label.
+
+        Parameters
+        ----------
+        labels : array-like
+            Labels, may contain duplicates.
+        name : str
+            Property name.
+        default : Various, (default: None)
+            Value for the labels that are not in the table.
+
+        Returns
+        -------
+        np.ndarray
+
+        """
+        code = self.codes(labels)
+        out = np.full(len(code), default, dtype=object)
+        out[code >= 0] = self.frame[name].to_numpy()[code[code >= 0]]
+        return out
+
+    def set(self, name, values, labels=None, mask=None):
+        """Set one property for all, a selection of labels or the rows in a boolean mask.
+
+        Parameters
+        ----------
+        name : str
+            Property name. A new property is created when it does not exist.
+        values : Various
+            One value for all selected rows, or one value per selected row.
+        labels : array-like, (default: None)
+            Labels of the rows to set.
+        mask : array-like of bool, (default: None)
+            Rows to set.
+
+        """
+        if labels is not None:
+            rows = self.codes(labels)
+            if np.any(rows < 0): raise KeyError('Labels are not in the table: %s' %(np.asarray(labels, dtype=object)[rows < 0][:10]))
+        elif mask is not None:
+            rows = np.flatnonzero(np.asarray(mask, dtype=bool))
+        else:
+            rows = np.arange(len(self))
+
+        if name not in self.frame.columns:
+            self.frame[name] = None
+        column = self.frame.columns.get_loc(name)
+        # The column is upcast first when the new values do not fit in its dtype.
+        dtype, values = _upcast(self.frame[name].dtype, values)
+        if dtype is not None: self.frame[name] = self.frame[name].astype(dtype)
+        try:
+            self.frame.iloc[rows, column] = values
+        except (TypeError, ValueError):
+            self.frame[name] = self.frame[name].astype(object)
+            self.frame.iloc[rows, column] = values
+
+    # Views
+    def to_dict(self):
+        """Return the {label: {property: value}} view."""
+        return self.frame.to_dict(orient='index')
+
+    def to_frame(self):
+        """Return the DataFrame view with one row per label."""
+        return self.frame.reset_index(drop=True)
+
+    def copy(self):
+        return type(self)(self.frame.copy())
+
+
+class NodeTable(PropertyTable):
+    """Node properties with one row per node label."""
+
+
+class EdgeTable(PropertyTable):
+    """Edge properties with one row per edge or data point."""
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Smoke tests for the benchmark suite.
+"""
+
+import copy
+from d3blocks.benchmarks import benchmark, generators
+
+
+def test_generators():
+    """Generators return the requested number of rows."""
+    assert generators.edges(100).shape == (100, 3)
+    df = generators.edges(100, acyclic=True)
+    assert (df['source'].str[5:].astype(int) < df['target'].str[5:].astype(int)).all()
+    assert generators.points(100).shape[0] == 100
+    assert generators.events(100).shape[0] == 100
+    assert generators.wide(100).shape[0] == 100
+    assert generators.hierarchy(100).shape == (100, 4)
+    assert generators.tree_edges(100).shape == (100, 3)
+
+
+def test_run_and_compare(tmp_path):
+    """Benchmark two blocks and compare against a baseline."""
+    report = benchmark.run(blocks=['chord', 'treemap'], sizes=[100], logger=None)
+    assert len(report['results']) == 2
+    for result in report['results']:
+        assert 'error' not in result
+        assert result['payload_size'] > 0
+        assert 'get_data_ready_for_d3' in result['stages']
+
+    # Save and load the baseline
+    filepath = str(tmp_path / 'baseline.json')
+    benchmark.save(report, filepath)
+    baseline = benchmark.load(filepath)
+    assert not benchmark.compare(report, baseline)['regression'].any()
+
+    # A larger html is reported as regression.
+    slower = copy.deepcopy(report)
+    slower['results'][0]['payload_size'] *= 2
+    diff = benchmark.compare(slower, baseline)
+    assert diff['regression'].sum() == 1
+    assert benchmark.to_frame(report).shape[0] > 2
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed render cache.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from d3blocks import D3Blocks
+from d3blocks import cache
+import d3blocks.sankey.Sankey as Sankey
+
+
+def _edges(weight=1):
+    return pd.DataFrame({'source': ['a', 'b', 'c', 'a'], 'target': ['b', 'c', 'd', 'd'], 'weight': [weight, 2, 3, 4]})
+
+
+def test_cache_hit(tmp_path, monkeypatch):
+    """Unchanged inputs are copied from the cache without computing the properties or rendering."""
+    d3 = D3Blocks(verbose='error', cache_dir=str(tmp_path / 'cache'))
+    html1 = d3.sankey(_edges(), filepath=str(tmp_path / 'sankey1.html'), showfig=False, return_html=True)
+    assert len(d3.cache) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError('The chart should not be computed on a cache hit.')
+    monkeypatch.setattr(Sankey, 'set_edge_properties', fail)
+    monkeypatch.setattr(Sankey, 'show', fail)
+
+    # The filename is part of the key, the directory is not.
+    os.makedirs(tmp_path / 'other')
+    html2 = d3.sankey(_edges(), filepath=str(tmp_path / 'other' / 'sankey1.html'), showfig=False, return_html=True)
+    assert html1 == html2
+    assert (tmp_path / 'other' / 'sankey1.html').read_text(encoding='utf-8') == html1
+    assert len(d3.cache) == 1
+
+
+def test_cache_hit_restores_properties(tmp_path):
+    """A hit restores the properties and config of the chart, so that they can be edited and shown again."""
+    d3 = D3Blocks(verbose='error', cache_dir=str(tmp_path / 'cache'))
+    html = d3.chord(_edges(), filepath=str(tmp_path / 'chord.html'), showfig=False, return_html=True)
+    d3.sankey(pd.DataFrame({'source': ['x', 'y'], 'target': ['y', 'z'], 'weight': [1, 2]}), filepath=str(tmp_path / 'sankey.html'), showfig=False)
+    assert d3.chord(_edges(), filepath=str(tmp_path / 'chord.html'), showfig=False, return_html=True) == html
+    assert len(d3.cache) == 2
+
+    assert d3.config['chart'] == 'Chord'
+    assert d3.node_properties['label'].tolist() == ['a', 'b', 'c', 'd']
+    assert d3.edge_properties.shape[0] == 4
+    assert d3.show(filepath=None, showfig=False) == html
+    d3.node_properties.loc[d3.node_properties['label'] == 'a', 'color'] = '#123456'
+    assert '#123456' in d3.show(filepath=None, showfig=False)
+
+
+def test_cache_key():
+    """The key changes with the data and arguments but not with the output location."""
+    key = cache.make_key('sankey', _edges(), {'title': 'a'})
+    assert key == cache.make_key('sankey', _edges(), {'title': 'a'})
+    assert key != cache.make_key('sankey', _edges(weight=5), {'title': 'a'})
+    assert key != cache.make_key('sankey', _edges(), {'title': 'b'})
+    assert key != cache.make_key('chord', _edges(), {'title': 'a'})
+    assert cache.make_key(np.arange(3)) != cache.make_key(np.arange(3).astype(float))
+    # Objects that can not be hashed disable the cache.
+    assert cache.make_key(object()) is None
+
+
+def test_cache_key_source_version(monkeypatch):
+    """Charts of another d3blocks version are not served from the cache."""
+    key = cache.make_key('sankey', _edges())
+    cache.source_version.cache_clear()
+    monkeypatch.setattr(cache, '__version__', '0.0.0')
+    try:
+        assert key != cache.make_key('sankey', _edges())
+    finally:
+        cache.source_version.cache_clear()
+
+
+def test_cache_lru_and_clear(tmp_path):
+    """The least recently used charts are evicted and charts can be cleared."""
+    d3 = D3Blocks(verbose='error', cache_dir=str(tmp_path / 'cache'), cache_size=2)
+    d3.sankey(_edges(1), filepath=None, showfig=False, return_html=True)
+    d3.sankey(_edges(2), filepath=None, showfig=False, return_html=True)
+    first = d3.cache.info()['key'].iloc[1]
+    # Use the first chart again so that the second one is evicted.
+    d3.sankey(_edges(1), filepath=None, showfig=False, return_html=True)
+    d3.chord(_edges(3), filepath=None, showfig=False, return_html=True)
+
+    info = d3.cache.info()
+    assert info.shape[0] == 2
+    assert first in info['key'].values
+    assert sorted(info['chart']) == ['chord', 'sankey']
+    assert d3.cache.clear(chart='chord') == 1
+    assert d3.cache.clear() == 1
+    assert len(d3.cache) == 0
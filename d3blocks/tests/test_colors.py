@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Tests for the color lookup tables and the hex validation.
+"""
+
+import numpy as np
+import colourmap
+from d3blocks import colors
+
+
+def test_fromlist_and_generate():
+    """The colors are the same as colourmap and the lookup table is not changed by the caller."""
+    rng = np.random.default_rng(0)
+    for y in [rng.choice(list('abcdefg'), 500), rng.integers(0, 30, 200)]:
+        for cmap in ['Set1', 'tab20', 'viridis']:
+            assert np.array_equal(colors.fromlist(y, cmap=cmap), colourmap.fromlist(y, cmap=cmap, scheme='hex', verbose=0)[0])
+    out = colors.generate(3, cmap='Set1')
+    assert out.tolist() == colourmap.generate(3, cmap='Set1', scheme='hex', verbose=0).tolist()
+    out[0] = '#000000'
+    assert colors.generate(3, cmap='Set1')[0] != '#000000'
+
+
+def test_is_hex():
+    """Hex colors are validated on the characters of the array."""
+    values = ['#ff0000', '#FF00aG', '#12345', '#1234567', ' #12345', 5, None, '#abcdef']
+    assert colors.is_hex(values).tolist() == [True, False, False, False, False, False, False, True]
+    assert colors.is_hex(np.array(['#ff0000', '#abc', '#ABCDEF'])).tolist() == [True, False, True]
+    assert colors.is_hex('#ff0000') and not colors.is_hex('red')
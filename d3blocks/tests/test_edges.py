@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for the aggregation of edges from chunks and files.
+"""
+
+import numpy as np
+import pandas as pd
+from d3blocks import D3Blocks
+from d3blocks import edges
+from d3blocks import utils
+
+
+def _edges(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'source': rng.choice(['a', 'b', 'c', 'd'], n), 'target': rng.choice(['b', 'c', 'e'], n), 'weight': rng.integers(1, 5, n).astype(float)})
+
+
+def test_aggregate_chunks_and_file(tmp_path):
+    """Chunks and files give the same edges as summing the complete DataFrame."""
+    df = _edges()
+    df.loc[0, 'weight'] = np.nan
+    df.loc[1, 'source'] = None
+    expected = utils.create_unique_dataframe(df)
+
+    out = edges.aggregate(df.iloc[i:i + 700] for i in range(0, len(df), 700))
+    assert out['source'].tolist() == expected['source'].tolist()
+    assert out['target'].tolist() == expected['target'].tolist()
+    assert np.allclose(out['weight'], expected['weight'])
+
+    df.to_csv(tmp_path / 'edges.csv', index=False)
+    assert edges.aggregate(str(tmp_path / 'edges.csv'), chunksize=1000).equals(out)
+    # Without weights every edge counts once and DataFrames are returned as is.
+    out = edges.aggregate(iter([df[['source', 'target']].iloc[:10]]))
+    assert out['weight'].sum() == 9
+    assert edges.aggregate(df) is df
+
+
+def test_blocks_accept_chunks(tmp_path):
+    """The edge-list blocks render the aggregated edges of an iterator of chunks."""
+    df = _edges(n=300)
+    d3 = D3Blocks(verbose='error')
+    html = d3.chord(iter([df.iloc[:100], df.iloc[100:]]), filepath=None, showfig=False, return_html=True)
+    assert html == d3.chord(utils.create_unique_dataframe(df), filepath=None, showfig=False, return_html=True)
+    df.to_csv(tmp_path / 'edges.csv', index=False)
+    assert isinstance(d3.sankey(str(tmp_path / 'edges.csv'), filepath=None, showfig=False, return_html=True), str)
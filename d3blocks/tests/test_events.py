@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the reading of event logs from chunks and files.
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+from d3blocks import D3Blocks
+from d3blocks import events
+
+
+def _events(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'datetime': pd.Timestamp('2000-01-01') + pd.to_timedelta(rng.integers(0, 10**6, n), unit='s'),
+                       'sample_id': rng.integers(0, 50, n),
+                       'state': rng.choice(['Home', 'Work', 'Travel', 'Sport'], n),
+                       })
+    # Events of a sample_id at the same datetime have no defined order.
+    return df.drop_duplicates(subset=['sample_id', 'datetime'], ignore_index=True)
+
+
+def test_read_events_sorted_runs():
+    """The merged runs give the time to the next event of the same sample_id as the standardized DataFrame."""
+    import d3blocks.movingbubbles.Movingbubbles as Movingbubbles
+    df = _events()
+    eventlog = events.read_events((df.iloc[i:i + 250] for i in range(0, len(df), 250)), chunksize=400, minimum_time='seconds')
+    expected = Movingbubbles.standardize(df, method='samplewise', minimum_time='seconds').sort_values(by=['sample_id', 'datetime'])
+
+    assert eventlog.uiid.tolist() == sorted(df['sample_id'].unique())
+    assert np.diff(eventlog.indptr).tolist() == df['sample_id'].value_counts().sort_index().tolist()
+    assert eventlog.seconds().tolist() == expected['delta'].dt.total_seconds().tolist()
+    assert eventlog.states[eventlog.state].tolist() == expected['state'].tolist()
+    assert eventlog.states.tolist() == df['state'].unique().tolist()
+    assert eventlog.first_datetime.tolist() == df.groupby('sample_id')['datetime'].min().tolist()
+    assert (eventlog.datetime_min, eventlog.datetime_max) == (df['datetime'].min(), df['datetime'].max())
+
+    with pytest.raises(Exception, match='samplewise'):
+        events.read_events(iter([df]), standardize='relative')
+
+
+def test_movingbubbles_from_file(tmp_path):
+    """The movingbubbles block renders the same chart from a CSV file as from the DataFrame."""
+    df = _events(n=500)
+    df.to_csv(tmp_path / 'events.csv', index=False)
+    d3 = D3Blocks(verbose='error')
+    html = d3.movingbubbles(df, filepath=None, showfig=False, return_html=True)
+    assert d3.movingbubbles(str(tmp_path / 'events.csv'), dt_format='%Y-%m-%d %H:%M:%S', filepath=None, showfig=False, return_html=True) == html
+    assert isinstance(d3.edge_properties, events.EventLog)
+
+
+def test_resample_eventlog():
+    """Resampling the event log gives the same events as resampling the DataFrame."""
+    import d3blocks.movingbubbles.Movingbubbles as Movingbubbles
+    df = _events()
+    eventlog = events.read_events(iter([df]), minimum_time='seconds').resample('h')
+    expected = Movingbubbles.resample(df, 'h')
+    expected = Movingbubbles.standardize(expected, method='samplewise', minimum_time='seconds').sort_values(by=['sample_id', 'datetime'])
+    assert eventlog.states[eventlog.state].tolist() == expected['state'].tolist()
+    assert eventlog.seconds().tolist() == expected['delta'].dt.total_seconds().tolist()
+    assert eventlog.first_datetime.tolist() == expected.groupby('sample_id')['datetime'].min().tolist()
+
+
+def test_read_events_single_and_empty(tmp_path):
+    """An event log with one event or without events can be read, also when a merged block holds one event."""
+    import d3blocks.movingbubbles.Movingbubbles as Movingbubbles
+    df = pd.DataFrame({'datetime': pd.Timestamp('2000-01-01') + pd.to_timedelta([5, 1, 2, 3, 4, 6], unit='s'),
+                       'sample_id': [1, 2, 2, 1, 3, 3],
+                       'state': ['Home', 'Work', 'Travel', 'Home', 'Work', 'Travel'],
+                       })
+    eventlog = events.read_events(iter([df.iloc[:1]]))
+    assert (len(eventlog), eventlog.indptr.tolist(), eventlog.delta.tolist()) == (1, [0, 1], [0])
+    assert eventlog.first_datetime.tolist() == [df['datetime'].iloc[0]]
+
+    eventlog = events.read_events(iter([]))
+    assert (len(eventlog), len(eventlog.uiid), eventlog.indptr.tolist()) == (0, 0, [0])
+    assert eventlog.datetime_min is None
+
+    # The first merged block holds one event.
+    eventlog = events.read_events((df.iloc[i:i + 3] for i in range(0, len(df), 3)), chunksize=3, minimum_time='seconds')
+    expected = Movingbubbles.standardize(df, method='samplewise', minimum_time='seconds').sort_values(by=['sample_id', 'datetime'])
+    assert eventlog.seconds().tolist() == expected['delta'].dt.total_seconds().tolist()
+    assert eventlog.states[eventlog.state].tolist() == expected['state'].tolist()
+
+    df.iloc[:1].to_csv(tmp_path / 'events.csv', index=False)
+    d3 = D3Blocks(verbose='error')
+    html = d3.movingbubbles(df.iloc[:1], filepath=None, showfig=False, return_html=True)
+    assert d3.movingbubbles(str(tmp_path / 'events.csv'), dt_format='%Y-%m-%d %H:%M:%S', filepath=None, showfig=False, return_html=True) == html
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the lazy import of the chart modules and heavy dependencies.
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+# Modules that should only be imported when a chart or helper needs them.
+HEAVY_MODULES = ['d3blocks.d3blocks', 'd3blocks.utils', 'pandas', 'jinja2', 'd3graph', 'networkx', 'datazets', 'requests', 'colourmap', 'ismember', 'matplotlib']
+
+
+def _run(code):
+    # Run in a fresh interpreter because the modules of this test session are already imported.
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get('PYTHONPATH', '')]))
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_import_is_lazy():
+    """import d3blocks is fast and does not load the charts or heavy dependencies."""
+    result = _run('import sys, time, json\n'
+                  't = time.perf_counter()\n'
+                  'import d3blocks\n'
+                  'print(json.dumps({"time": time.perf_counter() - t, "modules": [*sys.modules.keys()]}))')
+
+    assert result['time'] < 1.0
+    loaded = [name for name in HEAVY_MODULES if name in result['modules']]
+    assert loaded == []
+    assert [name for name in result['modules'] if name.startswith('d3blocks.')] == []
+
+
+def test_chart_loads_only_its_module():
+    """Rendering a Sankey imports the Sankey module but none of the other charts."""
+    result = _run('import sys, json\n'
+                  'import d3blocks\n'
+                  'import pandas as pd\n'
+                  'df = pd.DataFrame({"source": ["a", "b"], "target": ["b", "c"], "weight": [1, 2]})\n'
+                  'd3blocks.D3Blocks(verbose="error").sankey(df, filepath=None, showfig=False)\n'
+                  'print(json.dumps({"modules": [*sys.modules.keys()], "Chord": d3blocks.d3blocks.Chord.__name__}))')
+
+    charts = sorted(name for name in result['modules'] if name.count('.') == 2 and name.startswith('d3blocks.'))
+    assert charts == ['d3blocks.sankey.Sankey']
+    for name in ['d3graph', 'networkx', 'datazets', 'requests']:
+        assert name not in result['modules']
+    # Chart modules remain accessible as attributes.
+    assert result['Chord'] == 'd3blocks.chord.Chord'
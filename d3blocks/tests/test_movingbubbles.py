@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for the data preparation of the movingbubbles block.
+"""
+
+import json
+import warnings
+import base64
+import pytest
+import numpy as np
+import pandas as pd
+import d3blocks.movingbubbles.Movingbubbles as Movingbubbles
+
+LABELS = {name: {'id': i, 'label': name, 'short': name, 'desc': name, 'color': '#000000'} for i, name in enumerate(['Home', 'Work', 'Travel'])}
+CONFIG = {'columns': {'state': 'state', 'datetime': 'datetime', 'sample_id': 'sample_id'}}
+
+
+def test_sequences_per_sample():
+    """The sequence of every sample_id is 'state,time,...' in the order of the rows, for the sorted sample_ids."""
+    df = pd.DataFrame({'sample_id': [7, 2, 7, 2, 5], 'state': ['Work', 'Home', 'Travel', 'Work', 'Home'], 'time_in_state': [3, 1, 12, 4, 1]})
+    X, uiid = Movingbubbles.get_data_ready_for_d3(df, LABELS, CONFIG)
+    assert uiid.tolist() == [2, 5, 7]
+    assert X == ['0,1,1,4', '0,1', '1,3,2,12']
+
+    uiid, indptr, state_id, time_in_state = Movingbubbles._sequences(df, LABELS, CONFIG)
+    assert indptr.tolist() == [0, 2, 3, 5]
+    assert state_id.dtype == np.int64 and time_in_state.tolist() == [1, 4, 1, 3, 12]
+
+
+def test_standardize_deltas():
+    """The delta is the gap to the next event and the last event of every sample gets the minimum time."""
+    base = pd.Timestamp('2024-01-01')
+    df = pd.DataFrame({'datetime': base + pd.to_timedelta([0, 10, 30, 60], unit='s'), 'sample_id': ['A', 'B', 'A', 'B'], 'state': ['Home'] * 4})
+    expected = {'samplewise': [30, 50, 1, 1], None: [1, 20, 1, 1], 'relative': [10, 20, 1, 1]}
+    for method, seconds in expected.items():
+        out = Movingbubbles.standardize(df, method=method, minimum_time='seconds')
+        assert out['delta'].dt.total_seconds().tolist() == seconds
+        assert out['sample_id'].tolist() == ['A', 'B', 'A', 'B']
+    # The input is not changed.
+    assert 'delta' not in df.columns
+
+
+def _unpack(b64, nbytes):
+    return np.frombuffer(base64.b64decode(b64), dtype='<u%d' %(nbytes))
+
+
+def test_packed_sequences():
+    """Consecutive equal states are merged and the packed arrays decode to the same sequences as the text."""
+    df = pd.DataFrame({'sample_id': [7, 2, 7, 2, 5, 7], 'state': ['Work', 'Home', 'Work', 'Work', 'Home', 'Travel'], 'time_in_state': [3, 1, 300, 4, 1, 12]})
+    packed, uiid = Movingbubbles.get_data_ready_for_d3(df, LABELS, dict(CONFIG, packed=True))
+    data = json.loads(packed)
+    assert uiid.tolist() == [2, 5, 7]
+    assert (data['counts_bytes'], data['states_bytes'], data['durations_bytes']) == (1, 1, 2)
+    assert _unpack(data['counts'], 1).tolist() == [2, 1, 2]
+    assert _unpack(data['states'], 1).tolist() == [0, 1, 0, 1, 2]
+    assert _unpack(data['durations'], 2).tolist() == [1, 4, 1, 303, 12]
+
+    with pytest.raises(Exception, match='can not be packed'):
+        Movingbubbles.pack_sequences(np.array([0, 1]), np.array([0]), np.array([2**32]))
+
+
+def test_resample_and_auto_timedelta():
+    """Short visits within a bucket are removed, repeated states are merged and the unit fits in the tick budget."""
+    df = pd.DataFrame({'sample_id': [1, 1, 1, 1, 1, 2], 'state': ['A', 'B', 'A', 'A', 'C', 'B'],
+                       'datetime': pd.to_datetime(['2000-01-01 00:00', '2000-01-01 00:01', '2000-01-01 00:02', '2000-01-01 00:07', '2000-01-01 00:16', '2000-01-01 00:03'])})
+    out = Movingbubbles.resample(df, '5min')
+    assert out['state'].tolist() == ['A', 'C', 'B']
+    assert out['datetime'].dt.strftime('%H:%M').tolist() == ['00:00', '00:15', '00:00']
+    with pytest.raises(Exception, match='fixed frequency'):
+        Movingbubbles.resample(df, 'MS')
+    # Deprecated aliases are rejected without the pandas deprecation warning.
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        with pytest.raises(Exception, match='fixed frequency'):
+            Movingbubbles.resample(df, 'M')
+
+    seconds, group = np.array([30, 7200, 86400 * 3, 60]), np.array([0, 0, 0, 1])
+    assert Movingbubbles.auto_timedelta(seconds, group, max_ticks=10**6) == 'seconds'
+    assert Movingbubbles.auto_timedelta(seconds, group, max_ticks=5000) == 'minutes'
+    assert Movingbubbles.auto_timedelta(seconds, group, max_ticks=100) == 'days'
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-stage profiling of chart calls.
+"""
+
+import os
+import pandas as pd
+from d3blocks import D3Blocks
+from d3blocks import profiler
+
+
+def test_profile_chord(tmp_path):
+    """All pipeline stages are recorded with time, memory and payload size."""
+    df = pd.DataFrame({'source': ['a', 'b', 'c', 'a'], 'target': ['b', 'c', 'a', 'c'], 'weight': [1, 2, 3, 4]})
+    filepath = str(tmp_path / 'chord.html')
+    d3 = D3Blocks(verbose='error', profile=True)
+    d3.chord(df, filepath=filepath, showfig=False)
+
+    profile = d3.last_profile
+    assert profile['chart'] == 'chord'
+    assert profile['payload_size'] == os.path.getsize(filepath)
+    assert profile['peak_memory'] > 0
+    for name in profiler.STAGES:
+        assert profile['stages'][name]['calls'] >= 1
+        assert profile['stages'][name]['time'] >= profile['stages'][name]['self_time'] >= 0
+    assert profile['time'] >= profile['stages']['set_edge_properties']['time']
+    # Profiling is deactivated after the chart call.
+    assert profiler.active() is None
+
+
+def test_profile_heatmap_and_matrix(tmp_path):
+    """The blocks that build their html with str.replace record the render stage as well."""
+    df = pd.DataFrame({'source': ['a', 'b', 'c', 'a'], 'target': ['b', 'c', 'a', 'c'], 'weight': [1, 2, 3, 4]})
+    d3 = D3Blocks(verbose='error', profile=True)
+    d3.heatmap(df, color=None, filepath=str(tmp_path / 'heatmap.html'), showfig=False)
+    assert d3.last_profile['stages']['render']['calls'] == 1
+    assert 'write' in d3.last_profile['stages']
+    d3.matrix(pd.DataFrame([[1, 2], [3, 4]], index=['a', 'b'], columns=['c', 'd']), filepath=str(tmp_path / 'matrix.html'), showfig=False)
+    assert d3.last_profile['stages']['render']['calls'] == 1
+
+
+def test_profile_disabled():
+    """No profile is recorded by default."""
+    df = pd.DataFrame({'source': ['a', 'b'], 'target': ['b', 'c'], 'weight': [1, 2]})
+    d3 = D3Blocks(verbose='error')
+    d3.sankey(df, filepath=None, showfig=False)
+    assert d3.last_profile is None
+
+
+def test_profile_without_memory():
+    """Stages can be recorded without tracing the memory."""
+    with profiler.Profile('test', memory=False) as prof:
+        with profiler.stage('render'):
+            with profiler.stage('render'):
+                pass
+        list(profiler.timed_iter('write', iter(['a', 'b', 'c'])))
+
+    result = prof.result()
+    assert result['peak_memory'] is None
+    assert result['stages']['render']['calls'] == 1
+    assert result['stages']['write']['calls'] == 1
+    assert result['stages']['render']['peak_memory'] is None
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared template engine in d3blocks.render.
+"""
+
+import os
+import pandas as pd
+import pytest
+from d3blocks import D3Blocks
+from d3blocks import render
+
+
+def test_template_is_compiled_once():
+    """The same compiled template object is returned for every call."""
+    template1 = render.get_template('chord')
+    template2 = render.get_template('chord', 'chord.html.j2')
+    assert template1 is template2
+    assert render.get_environment('Chord') is render.get_environment('chord')
+
+
+def test_source_is_read_once():
+    """Raw templates of heatmap and matrix are cached in memory."""
+    source = render.get_source('heatmap')
+    assert '$DATA_COMES_HERE$' in source
+    assert render.get_source('heatmap') is source
+    assert '$DATA_COMES_HERE$' in render.get_source('matrix')
+
+
+def test_warmup_all_blocks():
+    """All blocks can be precompiled."""
+    compiled = render.warmup(logger=None)
+    assert sorted(compiled) == sorted([*render.TEMPLATES.keys()] + [*render.SOURCES.keys()])
+
+
+def test_bytecode_cache(tmp_path):
+    """Compiled bytecode is written to disk and renders stay identical."""
+    df = pd.DataFrame({'source': ['a', 'b', 'c'], 'target': ['b', 'c', 'a'], 'weight': [1, 2, 3]})
+    d3 = D3Blocks(verbose='error')
+    html1 = d3.chord(df, filepath=str(tmp_path / 'chord1.html'), showfig=False, return_html=True)
+
+    try:
+        render.warmup(blocks=['chord'], cache_dir=str(tmp_path / 'cache'), logger=None)
+        assert len(os.listdir(tmp_path / 'cache')) > 0
+        d3 = D3Blocks(verbose='error')
+        html2 = d3.chord(df, filepath=str(tmp_path / 'chord2.html'), showfig=False, return_html=True)
+    finally:
+        render.set_bytecode_cache(None, logger=None)
+
+    assert html1 == html2
+
+
+def test_unknown_block():
+    """Unknown blocks raise an error."""
+    with pytest.raises(KeyError):
+        render.get_template('unknown_block')
+
+
+def test_assets_external(tmp_path):
+    """Vendored libraries are written once to the assets directory and referenced with <script src>."""
+    y = [0.1, 0.5, 0.2, 0.8, 0.4, 0.3]
+    labels = ['a', 'a', 'a', 'b', 'b', 'b']
+    d3 = D3Blocks(verbose='error', assets='external')
+    html1 = d3.violin(x=labels, y=y, filepath=str(tmp_path / 'violin.html'), showfig=False, return_html=True)
+    html2 = d3.particles('d3blocks', filepath=str(tmp_path / 'particles.html'), showfig=False, return_html=True)
+
+    files = sorted(os.listdir(tmp_path / 'assets'))
+    assert len(files) == 2
+    for file in files:
+        assert '<script src="assets/%s"></script>' %(file) in html1
+        assert '<script src="assets/%s"></script>' %(file) in html2
+
+    # Default is inline and does not reference the assets directory.
+    d3 = D3Blocks(verbose='error')
+    html3 = d3.violin(x=labels, y=y, filepath=str(tmp_path / 'violin_inline.html'), showfig=False, return_html=True)
+    assert 'assets/' not in html3
+    assert len(html3) > len(html1) + 200000
+
+
+def test_assets_external_requires_filepath():
+    """Assets are inlined when no file is written."""
+    assert render.write_assets('violin', {'assets': 'external', 'filepath': None}, logger=None) == {}
+    with pytest.raises(Exception):
+        render.write_assets('violin', {'assets': 'cdn', 'filepath': 'violin.html'}, logger=None)
+
+
+def test_write_html_stream(tmp_path):
+    """The streamed file is identical to the returned html and is replaced without leftovers."""
+    df = pd.DataFrame({'source': ['a', 'b', 'c'], 'target': ['b', 'c', 'a'], 'weight': [1, 2, 3]})
+    filepath = tmp_path / 'sankey.html'
+    d3 = D3Blocks(verbose='error')
+    html = d3.sankey(df, filepath=str(filepath), showfig=False, return_html=True)
+    assert filepath.read_text(encoding='utf-8') == html
+
+    # Overwrite the existing file without keeping the html in memory.
+    assert d3.sankey(df, filepath=str(filepath), showfig=False, return_html=False) is None
+    assert filepath.read_text(encoding='utf-8') == html
+    assert os.listdir(tmp_path) == ['sankey.html']
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for the JSON serialization of the block data.
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from d3blocks import serialize
+from d3blocks.utils import intern_labels
+
+
+def test_records():
+    """Columns are encoded as valid JSON objects with escaped strings and numpy numbers."""
+    rows = serialize.records({'name': serialize.strings(['a', 'quote " and \\ backslash', 'Nodé\n']),
+                              'value': serialize.numbers(np.array([1.5, np.nan, np.inf])),
+                              'id': serialize.numbers(np.array([1, 2, 3], dtype=np.int64)),
+                              'flag': serialize.numbers(np.array([True, False, True])),
+                              })
+    data = json.loads(serialize.array(rows))
+    assert data[0] == {'name': 'a', 'value': 1.5, 'id': 1, 'flag': True}
+    assert data[1] == {'name': 'quote " and \\ backslash', 'value': None, 'id': 2, 'flag': False}
+    assert data[2]['name'] == 'Nodé\n'
+    assert data[2]['value'] is None
+    assert rows[0] == '{"name":"a","value":1.5,"id":1,"flag":true}'
+
+
+def test_dumps_numpy_and_backends(monkeypatch):
+    """numpy types are serialized natively and both backends give the same compact output."""
+    obj = {'name': 'Nodé', 'size': np.int64(3), 'weight': np.float64(0.25), 'values': np.arange(3), 'children': [{'x': True, 'y': None}]}
+    out = serialize.dumps(obj)
+    assert out == serialize.dumps(obj)
+    assert json.loads(out) == {'name': 'Nodé', 'size': 3, 'weight': 0.25, 'values': [0, 1, 2], 'children': [{'x': True, 'y': None}]}
+
+    monkeypatch.setattr(serialize, 'orjson', None)
+    assert serialize.dumps(obj) == out
+
+
+def test_dumps_floats_and_backends(monkeypatch):
+    """NaN and infinity are null, float32 values are not widened and the exponents are formatted as orjson does."""
+    obj = {'nan': float('nan'), 'inf': [np.inf, -np.inf], 'float32': np.array([0.1, np.nan, 1e15], dtype=np.float32), 'scalar32': np.float32(0.1),
+           'small': [1e-7, 1e-5, 2.5e-5, -0.0], 'large': [1e20, 1e15, 1.5e300], 1: 'key'}
+    expected = '{"nan":null,"inf":[null,null],"float32":[0.1,null,1e15],"scalar32":0.1,"small":[1e-7,0.00001,0.000025,-0.0],"large":[1e20,1000000000000000.0,1.5e300],"1":"key"}'
+    out = serialize.dumps(obj)
+    assert out == expected
+    json.loads(out)
+
+    monkeypatch.setattr(serialize, 'orjson', None)
+    assert serialize.dumps(obj) == expected
+
+
+def test_chord_data_is_json():
+    """The data of the chord and sankey blocks is valid JSON."""
+    import d3blocks.chord.Chord as Chord
+    import d3blocks.sankey.Sankey as Sankey
+    df = pd.DataFrame({'source': ['a', 'b'], 'target': ['b', 'c'], 'weight': [1.0, 2.0], 'source_id': [0, 1], 'target_id': [1, 2], 'opacity': [0.8, 0.8], 'color': ['#000000', '#ffffff']})
+    labels = {name: {'id': i, 'label': name, 'color': '#000000', 'opacity': 0.8, 'fontsize': 10} for i, name in enumerate(['a', 'b', 'c'])}
+    labels, _ = intern_labels(labels)
+
+    data = json.loads(Chord.get_data_ready_for_d3(df, labels))
+    assert [node['name'] for node in data['nodes']] == ['a', 'b', 'c']
+    assert data['links'][1] == {'source': 1, 'target': 2, 'value': 2.0, 'opacity': 0.8, 'color': '#ffffff'}
+    data = json.loads(Sankey.get_data_ready_for_d3(df, labels))
+    assert data['nodes'][0] == {'name': 'a', 'color': '#000000', 'fontsize': '10'}
+    assert data['links'][0] == {'source': 0, 'target': 1, 'value': 1.0}
+
+
+def test_nested():
+    """Trees deeper than the limit of orjson are encoded and give the same JSON as dumps()."""
+    tree = {'name': 'a', 'children': [{'name': 'b', 'size': 1}, {'name': 'c', 'children': [{'name': 'd'}]}, {'children': [{'name': 'e'}]}]}
+    assert serialize.nested(tree) == serialize.dumps(tree)
+
+    root = node = {'name': 0}
+    for i in range(1, 300):
+        node['children'] = [{'name': i}]
+        node = node['children'][0]
+    data = json.loads(serialize.nested(root))
+    assert data['children'][0]['children'][0]['name'] == 2
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar node and edge property tables.
+"""
+
+import warnings
+import numpy as np
+import pandas as pd
+from d3blocks import D3Blocks
+from d3blocks.tables import NodeTable, EdgeTable
+
+
+def test_dict_view_writes_through():
+    """Rows behave as the dicts that were used before and changes are stored in the columns."""
+    table = NodeTable({'id': [0, 1], 'color': ['#000000', '#ffffff'], 'opacity': [0.8, 0.8]}, labels=['A', 'B'])
+    table.get('A')['color'] = '#ff0000'
+    table['B']['opacity'] = 0.5
+    assert table.to_dict() == {'A': {'id': 0, 'color': '#ff0000', 'opacity': 0.8}, 'B': {'id': 1, 'color': '#ffffff', 'opacity': 0.5}}
+    assert list(table.keys()) == ['A', 'B']
+    assert table.get('C') is None
+    # Values that do not fit in the dtype of the column.
+    table.get('A')['id'] = 'first'
+    assert table.column('id').tolist() == ['first', 1]
+    table['C'] = {'id': 2, 'color': '#00ff00', 'opacity': 1.0}
+    assert table.to_frame()['color'].tolist() == ['#ff0000', '#ffffff', '#00ff00']
+
+
+def test_vectorised_get_and_set():
+    """Properties are get and set for many rows at once by label or mask."""
+    table = EdgeTable({'x': np.arange(5.), 'size': np.repeat(3, 5)})
+    table.set('size', 10, mask=table.column('x') > 2)
+    table.set('color', ['#000000', '#ffffff'], labels=[0, 4])
+    assert table.column('size').tolist() == [3, 3, 3, 10, 10]
+    assert table.lookup([4, 0, 7], 'color', default='#aaaaaa').tolist() == ['#ffffff', '#000000', '#aaaaaa']
+
+
+def test_set_upcasts_without_warnings():
+    """Values that do not fit in the dtype of a column upcast the column first instead of warning."""
+    table = EdgeTable({'size': np.repeat(3, 3), 'x': np.arange(3.)})
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        table.set('size', 2.5, labels=[1])
+        table.set('x', None, labels=[0])
+        table.set('x', ['a'], labels=[2])
+    assert table.column('size').tolist() == [3, 2.5, 3]
+    assert table.frame['size'].dtype == float
+    assert np.isnan(table.column('x')[0]) and table.column('x')[1:].tolist() == [1.0, 'a']
+
+
+def test_blocks_use_tables():
+    """Scatter and Chord store their properties in tables and the changes are rendered."""
+    d3 = D3Blocks(verbose='error')
+    d3.scatter(np.arange(4.), np.arange(4.), c_gradient=None, filepath=None, showfig=False)
+    assert isinstance(d3.edge_properties, EdgeTable)
+    d3.edge_properties[0]['color'] = '#123456'
+    assert '#123456' in d3.show(filepath=None, showfig=False)
+
+    d3 = D3Blocks(verbose='error', frame=False)
+    df = pd.DataFrame({'source': ['a', 'b', 'c'], 'target': ['b', 'c', 'a'], 'weight': [1, 2, 3]})
+    d3.chord(df, filepath=None, showfig=False)
+    assert isinstance(d3.node_properties, NodeTable)
+    d3.node_properties.get('a')['color'] = '#654321'
+    assert '#654321' in d3.show(filepath=None, showfig=False)
+    # The DataFrame view is used with frame=True.
+    d3 = D3Blocks(verbose='error', frame=True)
+    d3.chord(df, filepath=None, showfig=False)
+    assert d3.node_properties.columns.tolist() == ['id', 'label', 'color', 'opacity']
+
+
+def test_node_tables_in_all_blocks():
+    """The blocks render the same chart from the table (frame=False) as from the DataFrame view (frame=True)."""
+    from d3blocks.benchmarks import generators
+    charts = {'sankey': generators.edges(50, acyclic=True), 'tree': generators.tree_edges(50), 'treemap': generators.hierarchy(50),
+              'circlepacking': generators.tree_edges(50), 'timeseries': generators.wide(50), 'movingbubbles': generators.events(200)}
+    for chart, df in charts.items():
+        html = {}
+        for frame in [True, False]:
+            d3 = D3Blocks(verbose='error', frame=frame)
+            html[frame] = getattr(d3, chart)(df, filepath=None, showfig=False, return_html=True)
+        assert isinstance(d3.node_properties, NodeTable), chart
+        assert html[True] == html[False], chart
+
+    d3 = D3Blocks(verbose='error', frame=False)
+    d3.sankey(charts['sankey'], filepath=None, showfig=False)
+    d3.node_properties.set('color', '#654321', labels=d3.node_properties.labels[:1])
+    assert '#654321' in d3.show(filepath=None, showfig=False)
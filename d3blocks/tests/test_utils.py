@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Tests for the helper functions in d3blocks.utils.
+"""
+
+import json
+import unicodedata
+import pytest
+import numpy as np
+import pandas as pd
+from d3blocks import utils
+
+
+def _clean_reference(x):
+    # Element-wise cleaning of a source-target label.
+    x = str(x).replace("'", "")
+    return unicodedata.normalize('NFD', x).encode('ascii', 'ignore').decode("utf-8").replace(' ', '_').strip()
+
+
+def test_pre_processing_labels():
+    """Distinct labels are cleaned once and give the same strings as element-wise cleaning."""
+    names = ["Node 'n1", ' Nodé 2 ', 'café', 'plain']
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'source': [names[i] for i in rng.integers(0, 4, 100)], 'target': [names[i] for i in rng.integers(0, 4, 100)]})
+
+    out = utils.pre_processing(df.copy(), clean_source_target=True)
+    assert out['source'].tolist() == [_clean_reference(x) for x in df['source']]
+    assert out['target'].tolist() == [_clean_reference(x) for x in df['target']]
+    assert (out['weight'] == 1).all()
+    # The numeric index is converted into strings.
+    assert out.index.tolist() == [str(i) for i in range(100)]
+
+
+def test_map_unique():
+    """Mixed types are mapped per element because equal values can have a different str()."""
+    assert utils.map_unique(str, [1, 1.0, True, 'a', 'a']) == ['1', '1.0', 'True', 'a', 'a']
+    assert utils.map_unique(str, np.array([3, 1, 3])) == ['3', '1', '3']
+    assert utils.map_unique(str.upper, pd.Series(['a', 'b', 'a'])) == ['A', 'B', 'A']
+    assert utils.map_unique(str, []) == []
+    assert utils.clean_text(['é é', 'é é']) == ['e_e', 'e_e']
+
+
+def test_intern_labels():
+    """Labels are coded by their position in the node properties and missing labels are reported."""
+    nodes = {'a': {'id': 0, 'color': '#000000'}, 'b': {'id': 1, 'color': '#ffffff'}}
+    table, (source, target) = utils.intern_labels(nodes, ['b', 'a', 'b'], np.array(['a', 'a', 'b']))
+    assert source.tolist() == [1, 0, 1]
+    assert target.tolist() == [0, 0, 1]
+    assert table['color'].values[source].tolist() == ['#ffffff', '#000000', '#ffffff']
+
+    _, (code,) = utils.intern_labels(nodes, ['a', 'c'], missing='ignore')
+    assert code.tolist() == [0, -1]
+    with pytest.raises(Exception, match='missing'):
+        utils.intern_labels(nodes, ['a', 'c'])
+
+
+def test_is_circular():
+    """Cycles are returned as node labels and deep graphs do not hit the recursion limit."""
+    df = pd.DataFrame({'source': ['a', 'b', 'c', 'c', 'x', 'y'], 'target': ['b', 'c', 'a', 'd', 'y', 'x']})
+    assert utils.is_circular(df) == [['a', 'b', 'c'], ['x', 'y']]
+    assert utils.is_circular(df.iloc[[0, 1, 3]]) == []
+    # Self-links are reported by the logger and not as a cycle.
+    assert utils.is_circular(pd.DataFrame({'source': ['a'], 'target': ['A']})) == []
+
+    n = 20000
+    df = pd.DataFrame({'source': [str(i) for i in range(n)], 'target': [str(i + 1) for i in range(n)]})
+    assert utils.is_circular(df) == []
+    df.loc[n - 1, 'target'] = '5'
+    cycles = utils.is_circular(df)
+    assert len(cycles) == 1
+    assert cycles[0] == [str(i) for i in range(5, n)]
+
+
+def test_vec2flare_depth_and_aggregate():
+    """Paths of any depth are nested once per distinct node and duplicates can be summed."""
+    df = pd.DataFrame({'l0': ['a', 'a', 'b', 'a'], 'l1': ['x', 'y', 'x', 'x'], 'l2': ['p', 'q', 'r', 'p'], 'l3': ['1', '2', '3', '1'], 'weight': [1, 2, 3, 4]})
+    flare = utils.vec2flare(df)
+    assert [child['name'] for child in flare['children']] == ['a', 'b']
+    assert [child['name'] for child in flare['children'][0]['children']] == ['x', 'y']
+    assert flare['children'][0]['children'][0]['children'][0] == {'name': 'p', 'children': [{'name': '1', 'size': 1.0}, {'name': '1', 'size': 4.0}]}
+
+    flare = utils.vec2flare(df, aggregate=True)
+    assert flare['children'][0]['children'][0]['children'][0] == {'name': 'p', 'children': [{'name': '1', 'size': 5.0}]}
+    assert flare['children'][1] == {'name': 'b', 'children': [{'name': 'x', 'children': [{'name': 'r', 'children': [{'name': '3', 'size': 3.0}]}]}]}
+
+
+def test_vec2flare_v2():
+    """The tree starts at the first source, skips nodes that are already added and supports deep chains."""
+    df = pd.DataFrame({'source': ['Klaas', 'Klaas', 'Bill', 'Bill', 'Ana', 'Ana'], 'target': ['Bill', 'Ana', 'Erika', 'Klaas', 'Bill', 'Larry']})
+    node_properties = {'Bill': {'label': 'Bill', 'color': '#000000', 'size': 5, 'tooltip': 'manager', 'edge_size': 2, 'edge_color': '#ffffff', 'opacity': 0.5}}
+    tree = json.loads(utils.vec2flare_v2(df, node_properties))
+    assert tree['name'] == 'Klaas'
+    assert [child['name'] for child in tree['children']] == ['Bill', 'Ana']
+    assert tree['children'][0] == {'name': 'Bill', 'node_color': '#000000', 'node_size': 5, 'tooltip': 'Bill<br>manager', 'edge_size': 2, 'edge_color': '#ffffff', 'node_opacity': 0.5,
+                                   'children': [{'name': 'Erika', 'node_color': '#D33F6A', 'node_size': 10, 'tooltip': 'Erika', 'edge_size': 1, 'edge_color': '#000000', 'node_opacity': 0.95}]}
+    assert [child['name'] for child in tree['children'][1]['children']] == ['Larry']
+
+    n = 300
+    df = pd.DataFrame({'source': [str(i) for i in range(n)], 'target': [str(i + 1) for i in range(n)]})
+    node, depth = json.loads(utils.vec2flare_v2(df, {})), 0
+    while 'children' in node:
+        node, depth = node['children'][0], depth + 1
+    assert (depth, node['name']) == (n, str(n))
+
+
+def test_density_grid_close_to_exact():
+    """The grid density is close to the exact kernel density and classes that can not be estimated are reported as NaN."""
+    rng = np.random.default_rng(0)
+    X = np.r_[rng.normal(size=(1000, 2)) @ [[1, 0.6], [0, 0.5]], rng.normal(size=(500, 2)) + [3, 1]]
+    labels = np.repeat(['a', 'b'], [1200, 300])
+    exact = utils.density(X, labels, method='exact')
+    grid = utils.density(X, labels, method='grid', grid_size=128)
+    assert np.median(np.abs(grid - exact) / exact) < 0.01
+    assert np.max(np.abs(grid - exact) / exact) < 0.05
+    # The auto method is exact for small classes.
+    assert np.array_equal(utils.density(X, labels), exact)
+
+    z = utils.density(np.r_[X[:10], [[0, 0]]], labels=['a'] * 10 + ['b'], method='grid')
+    assert np.all(np.isfinite(z[:10])) and np.isnan(z[10])
+    opacity = utils.density_opacity(np.r_[X[:10], [[0, 0]]], ['a'] * 10 + ['b'])
+    assert opacity.min() == 0 and opacity.max() == 1 and opacity[10] == 1
+
+
+def test_working_copy_and_max_memory():
+    """The working copy does not change the input and charts that exceed max_memory raise an error before rendering."""
+    df = pd.DataFrame({'source': ['a', 'b', 'c'], 'target': ['b', 'c', 'd'], 'weight': [1.0, 2.0, 3.0]})
+    out = utils.working_copy(df)
+    out['weight'] = out['weight'] * 2
+    assert df['weight'].tolist() == [1.0, 2.0, 3.0]
+    assert utils.parse_memory('2GB') == 2 * 1024**3 and utils.parse_memory('500 kb') == 500 * 1024 and utils.parse_memory(100) == 100
+    with pytest.raises(Exception, match='not valid'):
+        utils.parse_memory('2 apples')
+
+    from d3blocks import D3Blocks
+    d3 = D3Blocks(verbose='error', max_memory='1KB')
+    with pytest.raises(Exception, match='max_memory'):
+        d3.sankey(df, filepath=None, showfig=False)
+    # The budget is kept for the next charts.
+    assert d3.config['max_memory'] == 1024
+    d3 = D3Blocks(verbose='error', max_memory='100MB')
+    assert isinstance(d3.sankey(df, filepath=None, showfig=False, return_html=True), str)
+
+
+def test_copy_on_write_show():
+    """The show stage does not copy the edge_properties again and does not modify them."""
+    df = pd.DataFrame({'source': ['a', 'b', 'c'], 'target': ['b', 'c', 'a'], 'weight': [1.0, 2.0, 3.0]})
+    with utils.copy_on_write():
+        out = utils.working_copy(df)
+        assert np.shares_memory(out['weight'].to_numpy(), df['weight'].to_numpy())
+        out['weight'] = out['weight'] * 2
+    assert df['weight'].tolist() == [1.0, 2.0, 3.0]
+
+    from d3blocks import D3Blocks
+    d3 = D3Blocks(verbose='error')
+    d3.chord(df, filepath=None, showfig=False)
+    edges = d3.edge_properties.copy()
+    d3.show(filepath=None, showfig=False)
+    assert d3.edge_properties.equals(edges)
+    assert df.columns.tolist() == ['source', 'target', 'weight']
+
+
+def test_normalize_and_scaler():
+    """normalize scales in one pass and the Scaler gives the same result when it is fitted over chunks."""
+    X = np.array([1.0, 2.0, np.nan, 4.0, np.inf, 8.0])
+    assert utils.normalize(X, scaler='minmax', minscale=1, maxscale=3).tolist() == [1.25, 1.5, 1.0, 2.0, 1.0, 3.0]
+    assert np.isclose(utils.normalize(X).min(), 0.5)
+    # The zscore needs more than 3 distinct values.
+    assert utils.normalize([1, 1, 2, 2]).tolist() == [1, 1, 2, 2]
+    assert X[2] != X[2]
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=10000) * 5 + 3
+    for method in ['zscore', 'minmax']:
+        scaler = utils.Scaler(method, minscale=1, maxscale=10)
+        for i in range(0, len(X), 999):
+            scaler.partial_fit(X[i:i + 999])
+        assert np.isclose(scaler.mean_, X.mean()) and np.isclose(scaler.var_, X.var())
+        assert np.allclose(scaler.transform(X), utils.normalize(X, minscale=1, maxscale=10, scaler=method))
+
+
+def test_set_path(tmp_path):
+    """Nested directories are created once, unique filenames differ and removed directories are created again on write."""
+    filepath = utils.set_path(str(tmp_path / 'a' / 'b' / 'chart.html'))
+    assert (tmp_path / 'a' / 'b').is_dir() and filepath.name == 'chart.html'
+    names = {utils.set_path(str(tmp_path / 'a' / 'b' / 'chart.html'), unique=True).name for _ in range(5)}
+    assert len(names) == 5 and all(name.startswith('chart-') and name.endswith('.html') for name in names)
+
+    (tmp_path / 'a' / 'b').rmdir()
+    utils._write_atomic({'filepath': str(filepath), 'overwrite': True}, iter(['<html>', '</html>']), None)
+    assert filepath.read_text() == '<html></html>'
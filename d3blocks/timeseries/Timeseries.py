@@ -6,15 +6,21 @@ Mail        : erdogant@gmail.com
 Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 """
-import colourmap
 from ismember import ismember
 import numpy as np
 import pandas as pd
-from jinja2 import Environment, PackageLoader
 try:
-    from .. utils import convert_dataframe_dict, set_path, update_config, set_labels, write_html_file, include_save_to_svg_script
+    from .. utils import set_path, update_config, set_labels, write_html_stream, include_save_to_svg_script, working_copy
+    from .. render import get_template, write_assets
+    from .. colors import generate
+    from .. profiler import stage
+    from .. tables import NodeTable
 except:
-    from utils import convert_dataframe_dict, set_path, update_config, set_labels, write_html_file, include_save_to_svg_script
+    from utils import set_path, update_config, set_labels, write_html_stream, include_save_to_svg_script, working_copy
+    from render import get_template, write_assets
+    from colors import generate
+    from profiler import stage
+    from tables import NodeTable
 
 
 # %% Set configuration properties
@@ -23,7 +29,7 @@ def set_config(config={}, **kwargs):
     logger = kwargs.get('logger', None)
     config['chart'] ='timeseries'
     config['title'] = kwargs.get('title', 'Timeseries - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'timeseries.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'timeseries.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [1200, 500])
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
@@ -96,8 +102,8 @@ def set_node_properties(df, **kwargs):
 
     Returns
     -------
-    dict_labels : dictionary()
-        Dictionary containing the label properties.
+    node_properties : NodeTable
+        Label properties. The properties of a label can be changed with node_properties.get(label)['color'] = '#000000'.
 
     """
     cmap = kwargs.get('cmap', 'Set1')
@@ -113,13 +119,11 @@ def set_node_properties(df, **kwargs):
     uilabels = _clean_on_whitelist(uilabels, whitelist, datetime, logger)
 
     # Create unique label/node colors
-    colors = colourmap.generate(len(uilabels), cmap=cmap, scheme='hex', verbose=0)
-    # Make dict
-    dict_labels = {}
-    for i, label in enumerate(uilabels):
-        dict_labels[label] = {'id': i, 'label': label, 'color': colors[i]}
+    colors = generate(len(uilabels), cmap=cmap)
+    # Store the properties in columns with one row per label.
+    node_properties = NodeTable({'id': np.arange(len(uilabels)), 'label': uilabels, 'color': colors}, labels=uilabels)
     # Return
-    return dict_labels
+    return node_properties
 
 
 # %% Set Edge properties
@@ -143,12 +147,11 @@ def set_edge_properties(df, **kwargs):
         Processed dataframe.
 
     """
-    df=df.copy()
+    df = working_copy(df)
     datetime = kwargs.get('datetime', 'datetime')
     dt_format = kwargs.get('dt_format', '%d-%m-%Y %H:%M:%S')
     node_properties = kwargs.get('node_properties', None)
     logger = kwargs.get('logger', None)
-    node_properties = convert_dataframe_dict(node_properties, frame=False)
 
     # Get datetime
     if datetime is None:
@@ -161,7 +164,7 @@ def set_edge_properties(df, **kwargs):
         df.drop(labels=datetime, axis=1, inplace=True)
 
     if node_properties is not None:
-        labels = [*node_properties.keys()]
+        labels = NodeTable.as_table(node_properties).labels
         idx, _ = ismember(df.columns, labels)
         if ~np.any(idx): df = df.loc[:, idx]
 
@@ -192,14 +195,14 @@ def show(df, **kwargs):
         Dictionary containing updated configuration keys.
 
     """
-    df = df.copy()
+    df = working_copy(df)
     labels = kwargs.get('node_properties')
     logger = kwargs.get('logger', None)
     config = update_config(kwargs, logger)
     config = config.copy()
 
     # Convert dict/frame.
-    labels = convert_dataframe_dict(labels, frame=False)
+    labels = NodeTable.as_table(labels)
 
     # Format for datetime in javascript
     config['dt_format_js'] = '%Y%m%d'
@@ -207,7 +210,7 @@ def show(df, **kwargs):
     if config['sort_on_date']:
         df.sort_index(inplace=True)
 
-    df_labels = pd.DataFrame(labels).T
+    df_labels = labels.frame
     Iloc, idx = ismember(df.columns, df_labels.index.values)
     config['color'] = '"' + str('","'.join(df_labels['color'].iloc[idx].values.astype(str))) + '"'
 
@@ -217,8 +220,9 @@ def show(df, **kwargs):
     df.rename(columns={"index": "date"}, errors="raise", inplace=True)
 
     # make dataset for javascript
-    vals = df.to_string(header=True, index=False, index_names=False).split('\n')
-    X = [';'.join(ele.split()) for ele in vals]
+    with stage('get_data_ready_for_d3'):
+        vals = df.to_string(header=True, index=False, index_names=False).split('\n')
+        X = [';'.join(ele.split()) for ele in vals]
 
     # Write to HTML
     return write_html(X, config, logger)
@@ -253,14 +257,10 @@ def write_html(X, config, logger=None):
         'SAVE_TO_SVG_SCRIPT': save_script,
         'SAVE_BUTTON_START': show_save_button[0],
         'SAVE_BUTTON_STOP': show_save_button[1],
+        'ASSETS': write_assets('timeseries', config, logger=logger),
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.timeseries', package_path='d3js'))
-
-    index_template = jinja_env.get_template('timeseries.html.j2')
+    index_template = get_template('timeseries', 'timeseries.html.j2')
     # index_file = Path(config['filepath'])
     # # index_file.write_text(index_template.render(content))
     # if config['overwrite'] and os.path.isfile(index_file):
@@ -270,8 +270,7 @@ def write_html(X, config, logger=None):
     # with open(index_file, "w", encoding="utf-8") as f:
     #     f.write(index_template.render(content))
 
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
@@ -6,12 +6,16 @@ Mail        : erdogant@gmail.com
 Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 """
-from jinja2 import Environment, PackageLoader
+import numpy as np
 
 try:
-    from .. utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_file, vec2flare_v2, is_circular, include_save_to_svg_script
+    from .. utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_stream, vec2flare_v2, is_circular, include_save_to_svg_script, working_copy
+    from .. render import get_template
+    from .. tables import NodeTable
 except:
-    from utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_file, vec2flare_v2, is_circular, include_save_to_svg_script
+    from utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_stream, vec2flare_v2, is_circular, include_save_to_svg_script, working_copy
+    from render import get_template
+    from tables import NodeTable
 
 
 # %% Set configuration properties
@@ -21,7 +25,7 @@ def set_config(config={}, margin={}, font={}, border={}, **kwargs):
     # Store configurations
     config['chart'] ='tree'
     config['title'] = kwargs.get('title', 'Tree - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'tree.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'tree.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [1000, 600])
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
@@ -58,7 +62,7 @@ def set_edge_properties(df, **kwargs):
     """
     # node_properties = kwargs.get('node_properties')
     logger = kwargs.get('logger', None)
-    df = df.copy()
+    df = working_copy(df)
     df = pre_processing(df, labels=df.columns.values[:-1].astype(str))
     # Create unique dataframe, udpate weights
     # df = create_unique_dataframe(df, logger=logger)
@@ -77,8 +81,8 @@ def set_node_properties(df, **kwargs):
 
     Returns
     -------
-    dict_labels : dictionary()
-        Dictionary containing the label properties.
+    node_properties : NodeTable
+        Label properties. The properties of a label can be changed with node_properties.get(label)['color'] = '#000000'.
 
     """
     # Get unique label
@@ -86,19 +90,20 @@ def set_node_properties(df, **kwargs):
     logger = kwargs.get('logger', None)
     uilabels = set_labels(df, col_labels=col_labels, logger=logger)
 
-    dict_labels = {}
-    for i, label in enumerate(uilabels):
-        dict_labels[label] = {'id': i,
-                              'label': label,
-                              'color': '#D33F6A',
-                              'size': 10,
-                              'tooltip': label,
-                              'edge_size': 1,
-                              'edge_color': '#000000',
-                              'opacity': 0.95}
+    n = len(uilabels)
+    # Store the properties in columns with one row per label.
+    node_properties = NodeTable({'id': np.arange(n),
+                                 'label': uilabels,
+                                 'color': np.repeat('#D33F6A', n),
+                                 'size': np.repeat(10, n),
+                                 'tooltip': uilabels,
+                                 'edge_size': np.repeat(1, n),
+                                 'edge_color': np.repeat('#000000', n),
+                                 'opacity': np.repeat(0.95, n)},
+                                labels=uilabels)
 
     # Return
-    return dict_labels
+    return node_properties
 
 
 def show(df, **kwargs):
@@ -120,28 +125,26 @@ def show(df, **kwargs):
         Dictionary containing updated configuration keys.
 
     """
-    df = df.copy()
+    df = working_copy(df)
     node_properties = kwargs.get('node_properties')
     logger = kwargs.get('logger', None)
     config = update_config(kwargs, logger)
     config = config.copy()
 
     # Convert dict/frame.
-    node_properties = convert_dataframe_dict(node_properties, frame=False)
-    df = convert_dataframe_dict(df.copy(), frame=True)
+    node_properties = NodeTable.as_table(node_properties)
+    df = convert_dataframe_dict(df, frame=True)
 
     # Transform dataframe into input form for d3
     df.reset_index(inplace=True, drop=True)
 
     # Check whether dataframe is circular
-    if is_circular(df, logger):
-        logger.warning("The dataframe seems to be circular which can not be handled by this chart!")
+    cycles = is_circular(df, logger)
+    if cycles:
+        logger.warning("The dataframe seems to be circular which can not be handled by this chart! Number of cycles: %d. Nodes in the first cycle: %s" %(len(cycles), cycles[0][:25]))
 
     # Create the data from the input of javascript
     X = vec2flare_v2(df, node_properties, logger=logger)
-    # Make it a string because the javascript is sensetive to quote differences.
-    X = str(X)
-    X = X.replace("'", '"')
 
     # Write to HTML
     return write_html(X, config, logger)
@@ -185,15 +188,9 @@ def write_html(X, config, logger=None):
         'SAVE_BUTTON_STOP': show_save_button[1],
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.tree', package_path='d3js'))
+    index_template = get_template('tree', 'tree.html.j2')
 
-    index_template = jinja_env.get_template('tree.html.j2')
-
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
@@ -6,12 +6,16 @@ Mail        : erdogant@gmail.com
 Github      : https://github.com/d3blocks/d3blocks
 License     : GPL3
 """
-from jinja2 import Environment, PackageLoader
+import numpy as np
 
 try:
-    from .. utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_file, vec2flare, include_save_to_svg_script
+    from .. utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_stream, vec2flare, include_save_to_svg_script, working_copy
+    from .. render import get_template, write_assets
+    from .. tables import NodeTable
 except:
-    from utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_file, vec2flare, include_save_to_svg_script
+    from utils import convert_dataframe_dict, set_path, pre_processing, update_config, set_labels, write_html_stream, vec2flare, include_save_to_svg_script, working_copy
+    from render import get_template, write_assets
+    from tables import NodeTable
 
 
 # %% Set configuration properties
@@ -21,7 +25,7 @@ def set_config(config={}, margin={}, font={}, border={}, **kwargs):
     # Store configurations
     config['chart'] = 'treemap'
     config['title'] = kwargs.get('title', 'Treemap - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'treemap.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'treemap.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [1000, 600])
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
@@ -32,6 +36,7 @@ def set_config(config={}, margin={}, font={}, border={}, **kwargs):
     config['border'] = {**{'type': 'solid', 'color': '#FFFFFF', 'width': 1}, **border}
     config['notebook'] = kwargs.get('notebook', False)
     config['save_button'] = kwargs.get('save_button', True)
+    config['aggregate'] = kwargs.get('aggregate', False)
     # return
     return config
 
@@ -58,7 +63,7 @@ def set_edge_properties(df, **kwargs):
     """
     # node_properties = kwargs.get('node_properties')
     logger = kwargs.get('logger', None)
-    df = df.copy()
+    df = working_copy(df)
     # Convert NumPy strings to regular Python strings for proper JSON serialization
     labels = [str(x) for x in df.columns.values[:-1]]
     df = pre_processing(df, labels=labels, logger=logger)
@@ -79,8 +84,8 @@ def set_node_properties(df, **kwargs):
 
     Returns
     -------
-    dict_labels : dictionary()
-        Dictionary containing the label properties.
+    node_properties : NodeTable
+        Label properties. The properties of a label can be changed with node_properties.get(label)['tooltip'] = 'text'.
 
     """
     # Get unique label
@@ -88,14 +93,12 @@ def set_node_properties(df, **kwargs):
     logger = kwargs.get('logger', None)
     uilabels = set_labels(df, col_labels=col_labels, logger=logger)
 
-    dict_labels = {}
-    for i, label in enumerate(uilabels):
-        # Convert NumPy types to regular Python types for proper JSON serialization
-        label_str = str(label)
-        # dict_labels[label_str] = {'id': i, 'label': label_str, 'tooltip': ''}
-        dict_labels[label_str] = {'label': label_str, 'tooltip': ''}
+    # Convert NumPy types to regular Python types for proper JSON serialization
+    uilabels = [str(label) for label in uilabels]
+    # Store the properties in columns with one row per label.
+    node_properties = NodeTable({'label': uilabels, 'tooltip': np.full(len(uilabels), '', dtype=object)}, labels=uilabels)
     # Return
-    return dict_labels
+    return node_properties
 
 
 def show(df, **kwargs):
@@ -117,24 +120,24 @@ def show(df, **kwargs):
         Dictionary containing updated configuration keys.
 
     """
-    df = df.copy()
+    df = working_copy(df)
     node_properties = kwargs.get('node_properties')
     logger = kwargs.get('logger', None)
     config = update_config(kwargs, logger)
     config = config.copy()
 
     # Convert dict/frame.
-    node_properties = convert_dataframe_dict(node_properties, frame=False)
-    df = convert_dataframe_dict(df.copy(), frame=True)
+    node_properties = NodeTable.as_table(node_properties)
+    df = convert_dataframe_dict(df, frame=True)
 
     # Transform dataframe into input form for d3
     df.reset_index(inplace=True, drop=True)
 
     # Create the data from the input of javascript
-    X = vec2flare(df, logger=logger)
+    X = vec2flare(df, aggregate=config['aggregate'], logger=logger)
 
     # Write to HTML
-    return write_html(X, node_properties, config, logger)
+    return write_html(X, node_properties.to_dict(), config, logger)
 
 
 def write_html(X, node_properties, config, logger=None):
@@ -178,17 +181,12 @@ def write_html(X, node_properties, config, logger=None):
         'SAVE_TO_SVG_SCRIPT': save_script,
         'SAVE_BUTTON_START': show_save_button[0],
         'SAVE_BUTTON_STOP': show_save_button[1],
+        'ASSETS': write_assets('treemap', config, logger=logger),
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.treemap', package_path='d3js'))
+    index_template = get_template('treemap', 'treemap.html.j2')
 
-    index_template = jinja_env.get_template('treemap.html.j2')
-
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
@@ -10,20 +10,31 @@ License     : GPL3
 from ismember import ismember
 import numpy as np
 import pandas as pd
-import colourmap
 import unicodedata
+import contextlib
 import os
 import tempfile
 from pathlib import Path
-import time
 import json
-import d3graph as d3network
-from collections import defaultdict
+import uuid
 import logging
+try:
+    from d3blocks.profiler import profile_stage, timed_iter, stage
+    from d3blocks.serialize import nested
+    from d3blocks.tables import PropertyTable
+    from d3blocks.colors import fromlist, is_hex
+except:
+    from profiler import profile_stage, timed_iter, stage
+    from serialize import nested
+    from tables import PropertyTable
+    from colors import fromlist, is_hex
 
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 logger = logging.getLogger(__name__)
 
+# Number of points per class up to which the exact kernel density is used for the scatter gradient.
+DENSITY_EXACT_MAX = 5000
+
 #%%
 def include_save_to_svg_script(save_button=False, title='d3graph_chart'):
     javascript_code = ""
@@ -49,42 +60,133 @@ def include_save_to_svg_script(save_button=False, title='d3graph_chart'):
     return javascript_code, show_save_button
 
 
+@profile_stage('get_data_ready_for_d3')
 def convert_to_json_format(df, logger=None):
     if logger is not None: logger.debug("Setting up json data file..")
-    json = []
-    for index, row in df.iterrows():
-        # Convert NumPy types to regular Python types for proper JSON serialization
-        link = {k: str(v) for k, v in row.to_dict().items()}
-        json.append(link)
-    return json
+    # Convert the values to str per column and combine them into one dict per row.
+    columns = {column: list(map(str, df[column].tolist())) for column in df.columns}
+    return [dict(zip(columns.keys(), row)) for row in zip(*columns.values())]
+
+
+def _adjacency(source, target):
+    """Integer-code the nodes and store the edges in compressed sparse row (CSR) arrays.
+
+    Returns
+    -------
+    labels : np.ndarray
+        Node labels in order of first appearance. The node code is the position in this array.
+    codes : np.ndarray
+        Code of the source of every edge (-1 for missing values).
+    indptr, adj : np.ndarray
+        The targets of node v are adj[indptr[v]:indptr[v + 1]], in the order of the rows.
+
+    """
+    source, target = np.asarray(source, dtype=object), np.asarray(target, dtype=object)
+    codes, labels = pd.factorize(np.r_[source, target])
+    source, target = codes[:len(source)], codes[len(source):]
+    keep = (source >= 0) & (target >= 0)
+    indptr = np.zeros(len(labels) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(source[keep], minlength=len(labels)), out=indptr[1:])
+    adj = target[keep][np.argsort(source[keep], kind='stable')]
+    return labels, source, indptr, adj
 
 
 def is_circular(df, logger=None):
-    iloc = df['source'].str.lower()==df['target'].str.lower()
-    if np.any(iloc):
-        if logger is not None: logger.warning('Data contains self-link that is not allowed\n%s' %(df.loc[iloc, :]))
-        return False
+    """Detect cycles in the directed graph of source-target edges.
+
+    The nodes are coded as integers and stored in compressed sparse row (CSR) arrays. Nodes that are not part of a cycle
+    are removed with Kahn's topological sort. The strongly connected components of the remaining nodes are found with an
+    iterative Tarjan and one cycle is traced per component. Both steps are iterative and therefore not limited by the
+    recursion depth of Python.
 
-    graph = defaultdict(list)
-    for _, row in df.iterrows():
-        graph[row['source']].append(row['target'])
+    Parameters
+    ----------
+    df : pd.DataFrame()
+        Edges with the columns source and target.
+    logger : logger, (default: None)
+        Logger to report self-links.
 
-    visited = set()
-    path = set()
+    Returns
+    -------
+    list of lists
+        One cycle per strongly connected component, given as the node labels in the order of the loop. The list is
+        empty when the graph is acyclic (or contains a self-link), and can therefore be used as a boolean.
 
-    def visit(vertex):
-        visited.add(vertex)
-        path.add(vertex)
-        for neighbour in graph[vertex]:
-            if neighbour not in visited:
-                if visit(neighbour):
-                    return True
-            elif neighbour in path:
-                return True
-        path.remove(vertex)
-        return False
+    Examples
+    --------
+    >>> df = pd.DataFrame({'source': ['a', 'b', 'c', 'c'], 'target': ['b', 'c', 'a', 'd']})
+    >>> is_circular(df)
+    [['a', 'b', 'c']]
 
-    return any(visit(v) for v in list(graph))  # Create a list of the dictionary keys
+    """
+    iloc = df['source'].str.lower()==df['target'].str.lower()
+    if np.any(iloc):
+        if logger is not None: logger.warning('Data contains self-link that is not allowed\n%s' %(df.loc[iloc, :]))
+        return []
+
+    labels, _, indptr, adj = _adjacency(df['source'], df['target'])
+    n = len(labels)
+    indptr, adj = indptr.tolist(), adj.tolist()
+
+    # Kahn: remove the nodes without incoming edges until only the cycles (and the nodes downstream of them) remain.
+    indegree = np.bincount(adj, minlength=n).tolist()
+    queue = [v for v in range(n) if indegree[v]==0]
+    while queue:
+        v = queue.pop()
+        for w in adj[indptr[v]:indptr[v + 1]]:
+            indegree[w] -= 1
+            if indegree[w]==0: queue.append(w)
+    alive = [d > 0 for d in indegree]
+    if not any(alive): return []
+
+    # Iterative Tarjan on the remaining nodes.
+    index, low, onstack = [-1] * n, [0] * n, [False] * n
+    stack, components, counter = [], [], 0
+    for root in range(n):
+        if not alive[root] or index[root] >= 0: continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        onstack[root] = True
+        work = [[root, indptr[root]]]
+        while work:
+            v, i = work[-1]
+            if i < indptr[v + 1]:
+                work[-1][1] += 1
+                w = adj[i]
+                if not alive[w]: continue
+                if index[w] < 0:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    onstack[w] = True
+                    work.append([w, indptr[w]])
+                elif onstack[w]:
+                    low[v] = min(low[v], index[w])
+                continue
+            work.pop()
+            if work: low[work[-1][0]] = min(low[work[-1][0]], low[v])
+            if low[v]==index[v]:
+                component = []
+                while True:
+                    w = stack.pop()
+                    onstack[w] = False
+                    component.append(w)
+                    if w==v: break
+                if len(component) > 1: components.append(component)
+
+    # Trace one cycle per component by following the edges that stay in the component until a node repeats.
+    cycles = []
+    for component in sorted(components, key=min):
+        members = set(component)
+        v = min(component)
+        position, path = {}, []
+        while v not in position:
+            position[v] = len(path)
+            path.append(v)
+            v = next(w for w in adj[indptr[v]:indptr[v + 1]] if w in members)
+        cycles.append(labels[path[position[v]:]].tolist())
+    return cycles
 
 
 def adjmat2vec(df, min_weight=1):
@@ -117,6 +219,7 @@ def adjmat2vec(df, min_weight=1):
     >>> vector = d3.adjmat2vec(adjmat)
 
     """
+    import d3graph as d3network
     return d3network.adjmat2vec(df, min_weight=min_weight)
 
 
@@ -154,48 +257,149 @@ def vec2adjmat(source, target, weight=None, symmetric=True, aggfunc='sum'):
     >>> adjmat = d3.vec2adjmat(df['source'], df['target'], df['weight'])
 
     """
+    import d3graph as d3network
     return d3network.vec2adjmat(source, target, weight=weight, symmetric=symmetric, aggfunc=aggfunc)
 
 
 # %% Normalize.
 def normalize(X, minscale = 0.5, maxscale = 4, scaler: str = 'zscore'):
-    # Instead of Min-Max scaling, that shrinks any distribution in the [0, 1] interval, scaling the variables to
-    # Z-scores is better. Min-Max Scaling is too sensitive to outlier observations and generates unseen problems,
-
-    # Set sizes to 0 if not available
-    X = np.asarray(X).copy()
-    X[np.isinf(X)]=0
-    X[np.isnan(X)]=0
-    if minscale is None: minscale=0.5
-
-    # out-of-scale datapoints.
-    if scaler == 'zscore' and len(np.unique(X)) > 3:
-        X = (X.flatten() - np.mean(X)) / np.std(X)
-        X = X + (minscale - np.min(X))
-    elif scaler == 'minmax':
-        # Local implementation of MinMax scaling without sklearn dependency
-        if len(X.shape)<=1: X = X.reshape(-1, 1)
-        X_min, X_max = np.min(X), np.max(X)
-        if X_max - X_min != 0:  # Avoid division by zero
-            X = (X - X_min) / (X_max - X_min) * (maxscale - minscale) + minscale
-        else:
-            X = np.full_like(X, minscale)  # If all values are the same, set to minscale
-        X = X.flatten()
-        
-        # Original sklearn implementation (commented out to remove dependency)
-        # try:
-        #     from sklearn.preprocessing import MinMaxScaler
-        # except:
-        #     raise Exception('sklearn needs to be pip installed first. Try: pip install scikit-learn')
-        # # scaling
-        # if len(X.shape)<=1: X = X.reshape(-1, 1)
-        # X = MinMaxScaler(feature_range=(minscale, maxscale)).fit_transform(X).flatten()
-    else:
+    """Scale the values for the sizes of nodes and edges.
+
+    Instead of Min-Max scaling, that shrinks any distribution in the [0, 1] interval, scaling the variables to
+    Z-scores is better. Min-Max Scaling is too sensitive to outlier observations and generates unseen problems,
+    out-of-scale datapoints. Missing and infinite values are set to 0 and the output is rounded to 4 digits.
+    Use Scaler to fit the scaling over chunks of data.
+
+    Parameters
+    ----------
+    X : array-like
+        Values.
+    minscale : float, (default: 0.5)
+        Minimum of the scaled values.
+    maxscale : float, (default: 4)
+        Maximum of the scaled values ('minmax' only).
+    scaler : str, (default: 'zscore')
+        'zscore', 'minmax' or None. The zscore is only applied when there are more than 3 distinct values.
+
+    Returns
+    -------
+    np.ndarray
+        1D array with the scaled values.
+
+    """
+    return Scaler(scaler=scaler, minscale=minscale, maxscale=maxscale).fit(X).transform(X)
+
+
+class Scaler:
+    """Scaler of normalize() that is fitted incrementally over chunks of data.
+
+    The mean and variance are merged per chunk (Welford/Chan) and the minimum and maximum are running values, so that
+    large columns or data that arrives in batches can be scaled without keeping all of the data in memory.
+
+    Parameters
+    ----------
+    scaler : str, (default: 'zscore')
+        'zscore', 'minmax' or None.
+    minscale : float, (default: 0.5)
+        Minimum of the scaled values.
+    maxscale : float, (default: 4)
+        Maximum of the scaled values ('minmax' only).
+
+    Examples
+    --------
+    >>> scaler = Scaler('minmax', minscale=1, maxscale=10)
+    >>> for chunk in chunks:
+    >>>     scaler.partial_fit(chunk)
+    >>> sizes = [scaler.transform(chunk) for chunk in chunks]
+
+    """
+
+    def __init__(self, scaler='zscore', minscale=0.5, maxscale=4):
+        self.scaler = scaler
+        self.minscale = 0.5 if minscale is None else minscale
+        self.maxscale = maxscale
+        self._reset()
+
+    def _reset(self):
+        self.n_ = 0
+        self.mean_, self.var_ = 0.0, 0.0
+        self.min_, self.max_ = np.inf, -np.inf
+        self._distinct = set()
+
+    @staticmethod
+    def _clean(X, copy, dtype=None):
+        """Return X as 1D array with the missing and infinite values set to 0."""
+        X = np.array(X, dtype=dtype, copy=True) if copy else np.asarray(X, dtype=dtype)
         X = X.ravel()
-    # Max digits is 4
-    X = np.array(list(map(lambda x: round(x, 4), X)))
+        if X.dtype.kind in 'fc':
+            invalid = ~np.isfinite(X)
+            if np.any(invalid):
+                if not copy: X = X.copy()
+                X[invalid] = 0
+        return X
 
-    return X
+    def partial_fit(self, X):
+        """Update the statistics with a chunk of values."""
+        X = self._clean(X, copy=False)
+        n = len(X)
+        if n == 0: return self
+        mean, var = np.mean(X), np.var(X)
+        if self.n_ == 0:
+            self.mean_, self.var_ = mean, var
+        else:
+            total = self.n_ + n
+            delta = mean - self.mean_
+            m2 = self.var_ * self.n_ + var * n + delta**2 * self.n_ * n / total
+            self.mean_ = self.mean_ + delta * n / total
+            self.var_ = m2 / total
+        self.n_ += n
+        self.min_, self.max_ = min(self.min_, np.min(X)), max(self.max_, np.max(X))
+        # The zscore is applied when there are more than 3 distinct values: keep at most 4 of them.
+        if len(self._distinct) <= 3:
+            self._distinct.update(pd.unique(X)[:4].tolist())
+        return self
+
+    def fit(self, X):
+        """Fit the statistics on all values."""
+        self._reset()
+        return self.partial_fit(X)
+
+    def transform(self, X, copy=True):
+        """Scale the values with the fitted statistics.
+
+        Parameters
+        ----------
+        X : array-like
+            Values.
+        copy : bool, (default: True)
+            False scales float arrays in place.
+
+        Returns
+        -------
+        np.ndarray
+            1D array with the scaled values, rounded to 4 digits.
+
+        """
+        zscore = self.scaler == 'zscore' and len(self._distinct) > 3
+        X = self._clean(X, copy=copy, dtype=float if zscore or self.scaler == 'minmax' else None)
+        if zscore:
+            std = np.sqrt(self.var_)
+            X -= self.mean_
+            X /= std
+            X += self.minscale - (self.min_ - self.mean_) / std
+        elif self.scaler == 'minmax':
+            if self.max_ - self.min_ != 0:
+                X -= self.min_
+                X /= self.max_ - self.min_
+                X *= self.maxscale - self.minscale
+                X += self.minscale
+            else:
+                # If all values are the same, set to minscale
+                X[:] = self.minscale
+        # Max digits is 4
+        if X.dtype.kind == 'f':
+            return np.round(X, 4, out=X)
+        return np.round(X, 4)
 
 
 # %% Normalize between [0-1]
@@ -232,91 +436,82 @@ def jitter_func(x, jitter=0.01):
     return x
 
 
+@profile_stage('get_data_ready_for_d3')
 def vec2flare_v2(df, node_properties=None, chart=None, logger=None):
-    # Create the dataframe
-    # data = {
-    #     'source': ['Klaas', 'Klaas', 'Bill', 'Bill', 'Bill', 'Ana', 'Ana'],
-    #     'target': ['Bill', 'Ana', 'Claudette', 'Danny', 'Erika', 'Bill', 'Larry'],
-    #     'weight': [1, 1, 1, 1, 1, 1, 1]
-    # }
-    # df = pd.DataFrame(data)
-
-    # Function to recursively build the nested structure
-    def build_node(df, name, node_properties=None, visited=None):
-        if visited is None:
-            visited = set()
-        if name in visited:
-            return None  # or handle cycle appropriately
-        visited.add(name)
-
-        if node_properties.get(name, None) is None:
-            color="#D33F6A"
-            size=10
-            tooltip=name
-            node_opacity = 0.95
-            edge_size = 1
-            edge_color = '#000000'
-        else:
-            color=node_properties.get(name)['color']
-            size=node_properties.get(name)['size']
-            edge_size=node_properties.get(name)['edge_size']
-            edge_color=node_properties.get(name)['edge_color']
-            node_opacity=node_properties.get(name)['opacity']
-
-            # Correct for tooltip
-            if node_properties.get(name)['tooltip']==node_properties.get(name)['label']:
-                # Prevent showing the name twice
-                tooltip= node_properties.get(name)['tooltip']
-            elif node_properties.get(name)['tooltip']=='':
-                # In case empty, leave it empty
-                tooltip = node_properties.get(name)['tooltip']
-            else:
-                # Otherwise, append the name to the tooltip
-                tooltip=name + '<br>' + node_properties.get(name)['tooltip']
-
-        node = {}
-        node['name'] = name
-        node['node_color'] = color
-        node['node_size'] = size
-        node['tooltip'] = tooltip
-        node['edge_size'] = edge_size
-        node['edge_color'] = edge_color
-        node['node_opacity'] = node_opacity
-
-        # children = []
-        # sub_df = df[df['source'] == name]
-        # for _, row in sub_df.iterrows():
-        #     child = build_node(df, row['target'], node_properties)
-        #     children.append(child)
-
-        children = []
-        sub_df = df[df['source'] == name]
-        for _, row in sub_df.iterrows():
-            if row['target'] not in visited:
-                child = build_node(df, row['target'], node_properties, visited)
-                children.append(child)
+    """Convert source-target edges into a nested tree in JSON.
 
-        if children:
-            node['children'] = children
+    The tree starts at the first source in the data. The children of a node are its targets in the order of the rows.
+    Every node is added once: targets that are already in the tree (cycles or multiple parents) are skipped. The child
+    index is created once and the tree is built with an explicit stack, so that large and deep trees are supported.
 
-        return node
+    Parameters
+    ----------
+    df : pd.DataFrame()
+        Edges with the columns source and target.
+    node_properties : dict
+        Node properties keyed by label with color, size, tooltip, edge_size, edge_color and opacity. Nodes that are
+        not in the node properties get the default properties.
+    logger : logging.Logger, optional
+        A logger object to output log messages (optional)
 
-    # Get the unique source names
-    uinames = df['source'].unique()
+    Returns
+    -------
+    str
+        Tree in JSON.
 
-    # Build the tree structure
-    tree = []
-    for uiname in uinames:
-        node = build_node(df, uiname, node_properties)
-        tree.append(node)
+    """
+    labels, source, indptr, adj = _adjacency(df['source'], df['target'])
+    indptr, adj = indptr.tolist(), adj.tolist()
+    names = labels.tolist()
+
+    # Node properties per node code. Nodes without properties get the defaults.
+    n = len(labels)
+    color, size, node_opacity = [np.full(n, value, dtype=object) for value in ['#D33F6A', 10, 0.95]]
+    edge_size, edge_color = [np.full(n, value, dtype=object) for value in [1, '#000000']]
+    tooltip = np.array(names + [None], dtype=object)[:-1]
+    table, (code,) = intern_labels(node_properties if node_properties is not None else {}, labels, missing='ignore', dtype=object)
+    found = np.flatnonzero(code >= 0)
+    if len(found) > 0:
+        table = table.iloc[code[found]]
+        color[found], size[found], node_opacity[found] = table['color'].values, table['size'].values, table['opacity'].values
+        edge_size[found], edge_color[found] = table['edge_size'].values, table['edge_color'].values
+        # Prevent showing the name twice and leave empty tooltips empty. Otherwise, append the name to the tooltip.
+        tips = table['tooltip'].values
+        keep = (tips == table['label'].values) | (tips == '')
+        tooltip[found[keep]] = tips[keep]
+        tooltip[found[~keep]] = [name + '<br>' + tip for name, tip in zip(labels[found[~keep]], tips[~keep])]
+    properties = list(zip(color.tolist(), size.tolist(), tooltip.tolist(), edge_size.tolist(), edge_color.tolist(), node_opacity.tolist()))
+
+    def make_node(v):
+        node = {'name': names[v]}
+        node['node_color'], node['node_size'], node['tooltip'], node['edge_size'], node['edge_color'], node['node_opacity'] = properties[v]
+        return node
 
+    # Depth-first construction with an explicit stack of (node, position of the next child).
+    root = source[0]
+    tree = make_node(root)
+    visited = {root}
+    stack = [(tree, root, indptr[root])]
+    while stack:
+        node, v, i = stack.pop()
+        while i < indptr[v + 1] and adj[i] in visited:
+            i += 1
+        if i == indptr[v + 1]: continue
+        w = adj[i]
+        visited.add(w)
+        child = make_node(w)
+        node.setdefault('children', []).append(child)
+        stack.append((node, v, i + 1))
+        stack.append((child, w, indptr[w]))
+
+    if logger is not None: logger.debug('Tree with %d nodes.' %(len(visited)))
     # Convert the tree structure to JSON
-    json_data = json.dumps(tree[0], indent=4)
-    return json_data
+    return nested(tree)
 
 
 # %% Convert to Flare format
-def vec2flare(df, logger=None):
+@profile_stage('get_data_ready_for_d3')
+def vec2flare(df, aggregate=False, logger=None):
     """Convert to Flare format.
 
     Converting any one-to-one relationship dataframe to a flare format.
@@ -324,11 +519,16 @@ def vec2flare(df, logger=None):
     The column weight contains a number (float or integer).
     Returns A json flare file suitable for plotting starburst chart in D3
 
+    The tree is built level by level. The path prefixes are integer-coded per level, so that every node is created once
+    and the costs are linear in the number of rows for any number of hierarchy columns.
 
     Parameters
     ----------
     df : DataFrame
         DataFrame containing 2 or more columns.
+    aggregate : bool, (default: False)
+        * True: Rows with the same path are combined into one leaf and their weights are summed.
+        * False: Every row is a leaf.
     logger : logging.Logger, optional
         A logger object to output log messages (optional)
 
@@ -337,6 +537,12 @@ def vec2flare(df, logger=None):
     flare : dictionary
         dictionary in flare format.
 
+    Examples
+    --------
+    >>> df = pd.DataFrame({'level0': ['a', 'a'], 'level1': ['x', 'y'], 'weight': [1, 2]})
+    >>> vec2flare(df)
+    {'name': 'flare', 'children': [{'name': 'a', 'children': [{'name': 'x', 'size': 1.0}, {'name': 'y', 'size': 2.0}]}]}
+
     References
     ----------
     * https://stackoverflow.com/questions/59946453/creating-a-flare-json-to-be-used-in-d3-from-pandas-dataframe/65333978#65333978
@@ -349,61 +555,34 @@ def vec2flare(df, logger=None):
     """
     # check if 'weight' is the last column
     if df.columns[-1].lower() != 'weight':
-        # remove 'weight' column
-        value_col = df.pop('weight')
-        # add 'weight' column as the last column
-        df.insert(len(df.columns), 'weight', value_col)
+        df = df[[col for col in df.columns if col != 'weight'] + ['weight']]
+    levels = list(df.columns[:-1])
 
-    flare = {'name': "flare", 'children': []}
-    # iterate through dataframe values
-    for row in df.values:
-        # Convert NumPy types to regular Python types for proper JSON serialization
-        level0 = str(row[0])
-        level1 = str(row[1])
-
-        if df.shape[1]==3:
-            weight = float(row[-1]) if row[-1] is not None else 0.0
-            d = {'name': level0, 'children': [{'name': level1, 'size': weight}]}
-        elif df.shape[1]==4:
-            level2 = str(row[2])
-            weight = float(row[-1]) if row[-1] is not None else 0.0
-            d = {'name': level0, 'children': [{'name': level1, 'children': [{'name': level2, 'size': weight}]}]}
-        # elif df.shape[1]==5:
-        #     level2, level3 = row[2], row[3]
-        #     weight = row[-1]
-        #     d = {'name': level0, 'children': [{'name': level1, 'children': [{'name': level2, 'children': [{'name': level3, 'size': weight}]}]}]}
-        # elif df.shape[1]==6:
-        #     level2, level3, level4 = row[2], row[3], row[4]
-        #     weight = row[-1]
-        #     d = {'name': level0, 'children': [{'name': level1, 'children': [{'name': level2, 'children': [{'name': level3, 'children': [{'name': level4, 'size': weight}]}]}]}]}
-
-        # initialize key lists
-        key0, key1 = [], []
-
-        # iterate through first level node names
-        for i in flare['children']:
-            key0.append(i['name'])
-
-            # iterate through next level node names
-            key1 = []
-            for _, v in i.items():
-                if isinstance(v, list):
-                    for x in v:
-                        key1.append(x['name'])
-
-        # add the full path of data if the root is not in key0
-        if level0 not in key0:
-            flare['children'].append(d)
-        elif level1 not in key1:
-            # if the root exists, then append to its children
-            # if level1 not in key1:
-            flare['children'][key0.index(level0)]['children'].append(d)
-        else:
-            # if the root exists, then append to its children
-            d = {'name': level2, 'size': weight}
-            flare['children'][key0.index(level0)]['children'][key1.index(level1)]['children'].append(d)
+    if aggregate:
+        df = df.groupby(levels, sort=False, dropna=False)[df.columns[-1]].sum(min_count=1).reset_index()
+
+    # Convert NumPy types to regular Python types for proper JSON serialization
+    names = [map_unique(str, df[col].to_numpy()) for col in levels]
+    weights = [0.0 if weight is None else float(weight) for weight in df.iloc[:, -1].tolist()]
 
-    if logger is not None: logger.debug(json.dumps(flare, indent=2))
+    flare = {'name': "flare", 'children': []}
+    # Create the nodes level by level. A node is a distinct path prefix, coded in order of first appearance.
+    nodes, parent = [flare], np.zeros(df.shape[0], dtype=np.int64)
+    for name in names[:-1]:
+        codes, uniques = pd.factorize(np.asarray(name, dtype=object))
+        group = pd.factorize(parent * len(uniques) + codes)[0]
+        first = np.unique(group, return_index=True)[1]
+        children = []
+        for p, u in zip(parent[first].tolist(), codes[first].tolist()):
+            child = {'name': uniques[u], 'children': []}
+            nodes[p]['children'].append(child)
+            children.append(child)
+        nodes, parent = children, group
+    # Every row is a leaf.
+    for p, name, weight in zip(parent.tolist(), names[-1], weights):
+        nodes[p]['children'].append({'name': name, 'size': weight})
+
+    if logger is not None and logger.isEnabledFor(logging.DEBUG): logger.debug(json.dumps(flare, indent=2))
     return flare
 
 
@@ -506,6 +685,53 @@ def set_labels(df, col_labels=None, logger=None):
     return uilabels
 
 
+# %% Intern labels
+def intern_labels(node_properties, *columns, missing='raise', dtype=None):
+    """Dictionary-encode label columns against the node properties.
+
+    The label table is built once from the node properties and every column is converted into integer codes that
+    point to a row of the table. Node properties of all rows, such as the id or color, are then looked up with
+    numpy indexing, e.g., table['id'].values[codes].
+
+    Parameters
+    ----------
+    node_properties : dict or NodeTable
+        Node properties keyed by label, e.g., {'A': {'id': 0, 'label': 'A', 'color': '#000000'}}.
+    columns : array-like
+        One or more arrays with labels, such as the source and target column.
+    missing : str, (default: 'raise')
+        * 'raise': Raise an exception when a label is not in the node properties.
+        * 'ignore': Labels that are not in the node properties get the code -1.
+    dtype : str, (default: None)
+        dtype of the table. Use object to keep the values of the node properties as is.
+
+    Returns
+    -------
+    table : pd.DataFrame
+        One row per label (index) with the node properties as columns.
+    codes : list of np.ndarray
+        For each column the row number of every label in the table.
+
+    Examples
+    --------
+    >>> table, (source, target) = intern_labels(node_properties, df['source'], df['target'])
+    >>> df['source_id'] = table['id'].values[source]
+
+    """
+    if isinstance(node_properties, PropertyTable):
+        table = node_properties.frame if dtype is None else node_properties.frame.astype(dtype)
+    else:
+        table = pd.DataFrame.from_dict(node_properties, orient='index', dtype=dtype)
+    index = pd.Index(table.index, dtype=object)
+    codes = []
+    for column in columns:
+        code = index.get_indexer(np.asarray(column, dtype=object))
+        if (missing == 'raise') and np.any(code < 0):
+            raise Exception('Labels are missing in the node properties: %s' %(pd.unique(np.asarray(column, dtype=object)[code < 0])[:10]))
+        codes.append(code)
+    return table, codes
+
+
 # %% Update config
 def update_config(kwargs, logger=None):
     """Update configuration file."""
@@ -522,7 +748,58 @@ def update_config(kwargs, logger=None):
     return config
 
 
-def set_path(filepath='d3blocks.html', logger=None):
+# %% Working copy
+def _copy_on_write():
+    """Return True when pandas copies the data of a DataFrame only when it is modified."""
+    if int(pd.__version__.split('.')[0]) >= 3: return True
+    return pd.options.mode.copy_on_write is True
+
+
+def working_copy(df):
+    """Return the copy of the input that a block modifies.
+
+    The input of the user is never modified. With copy-on-write (default since pandas 3.0) the copy is shallow and
+    only the columns that are changed are copied. Otherwise the data is copied once.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Input data.
+
+    Returns
+    -------
+    pd.DataFrame
+
+    """
+    if not isinstance(df, (pd.DataFrame, pd.Series)): return df.copy()
+    return df.copy(deep=not _copy_on_write())
+
+
+def copy_on_write():
+    """Return the context in which the working copies are shallow.
+
+    Copy-on-write is enabled in the context on pandas 2.x. Objects that are created in the context should not be
+    returned, because copy-on-write no longer protects the input when they are modified after the context.
+
+    Returns
+    -------
+    context manager
+
+    """
+    if _copy_on_write(): return contextlib.nullcontext()
+    try:
+        pd.get_option('mode.copy_on_write')
+    except KeyError:
+        # pandas < 1.5 has no copy-on-write.
+        return contextlib.nullcontext()
+    return pd.option_context('mode.copy_on_write', True)
+
+
+# Directories that exist or are created in this process. The directory of a batch of charts is only created once.
+_OUTPUT_DIRS = set()
+
+
+def set_path(filepath='d3blocks.html', logger=None, unique=False):
     """Set the file path.
 
     Parameters
@@ -532,6 +809,9 @@ def set_path(filepath='d3blocks.html', logger=None):
         * 'd3graph.html'
         * 'c://temp/'
         * 'c://temp/d3graph.html'
+    unique : bool, (default: False)
+        Add a random suffix to the filename, such as 'd3graph-3f2a9c1b0d4e.html', so that charts that are rendered at
+        the same time in different processes do not overwrite each other.
 
     Returns
     -------
@@ -551,11 +831,18 @@ def set_path(filepath='d3blocks.html', logger=None):
     if (dirname is None) or (dirname==''):
         dirname = os.path.join(tempfile.gettempdir(), 'd3blocks')
 
-    if not os.path.isdir(dirname):
-        if logger is not None: logger.info('Create directory: [%s]', dirname)
-        os.mkdir(dirname)
+    dirname = os.path.abspath(dirname)
+    if dirname not in _OUTPUT_DIRS:
+        if (logger is not None) and (not os.path.isdir(dirname)): logger.info('Create directory: [%s]', dirname)
+        # Nested directories are created and other processes may create the same directory at the same time.
+        os.makedirs(dirname, exist_ok=True)
+        _OUTPUT_DIRS.add(dirname)
+
+    if unique:
+        name, ext = os.path.splitext(filename)
+        filename = '%s-%s%s' %(name, uuid.uuid4().hex[:12], ext)
 
-    filepath = os.path.abspath(os.path.join(dirname, filename))
+    filepath = os.path.join(dirname, filename)
     if logger is not None: logger.info("filepath is set to [%s]" %(filepath))
     # Return
     return Path(filepath)
@@ -580,11 +867,16 @@ def convert_dataframe_dict(X, frame, chart=None, logger=None):
     if (chart is not None) and np.any(np.isin(chart.lower(), ['movingbubbles', 'timeseries'])):
         return X
     elif (chart is not None) and np.any(np.isin(chart.lower(), ['scatter'])):
-        return pd.DataFrame(X).T
+        return X.to_frame() if isinstance(X, PropertyTable) else pd.DataFrame(X).T
     elif (chart is not None) and np.any(np.isin(chart.lower(), ['maps'])):
-        return pd.DataFrame(X)
-
-    if isinstance(X, dict) and frame:
+        return X.to_frame().T if isinstance(X, PropertyTable) else pd.DataFrame(X)
+
+    if isinstance(X, PropertyTable):
+        # The table is the dictionary view. The DataFrame view is created on demand.
+        if frame:
+            if logger is not None: logger.info('Convert to DataFrame.')
+            X = X.to_frame()
+    elif isinstance(X, dict) and frame:
         if logger is not None: logger.info('Convert to DataFrame.')
         X = pd.DataFrame.from_dict(X, orient='index').reset_index(drop=True)
     elif isinstance(X, pd.DataFrame) and not frame:
@@ -634,7 +926,7 @@ def create_unique_dataframe(X, method='sum', logger=None):
 
 
 # %% Setup colors
-def set_colors(X, c, cmap, c_gradient=None):
+def set_colors(X, c, cmap, c_gradient=None, density_method='auto', density_grid=128, logger=None):
     """Set colors for in various blocks.
 
     Given the size of input data X, and the class labels, return the hex colors.
@@ -642,12 +934,11 @@ def set_colors(X, c, cmap, c_gradient=None):
         * scatter
         * chord
     """
-    hexok = False
     # In case only one (c)olor is defined. Set all to this value.
     if isinstance(c, str): c = np.repeat(c, X.shape[0])
 
     # Check whether the input is hex colors.
-    hexok = np.all(list(map(lambda x: ((len(str(x))>0)) and (str(x[0])=='#') and (len(x)==7), c)))
+    hexok = np.all(is_hex(c))
 
     if hexok:
         # Input is hex-colors thus we do not need to touch the colors.
@@ -657,56 +948,174 @@ def set_colors(X, c, cmap, c_gradient=None):
     else:
         # The input are string-labels and not colors. Lets convert to hex-colors.
         labels = c
-        c_hex, _ = colourmap.fromlist(c, cmap=cmap, scheme='hex', method='matplotlib', gradient=c_gradient, verbose=0)
+        if c_gradient is None:
+            c_hex = fromlist(c, cmap=cmap)
+        else:
+            import colourmap
+            c_hex, _ = colourmap.fromlist(c, cmap=cmap, scheme='hex', method='matplotlib', gradient=c_gradient, verbose=0)
 
     if (c_gradient is not None):
-        c_hex = density_color(X, c_hex, c)
+        c_hex = density_color(X, c_hex, c, method=density_method, grid_size=density_grid, logger=logger)
 
     # Return
     return c_hex, labels
 
 
 # %% Create gradient based based on the labels.
-def density_color(X, colors, labels):
+def density_color(X, colors, labels, method='auto', grid_size=128, logger=None):
     """Determine the density.
 
     Given (x,y) coordinates, determine the density. This optional is possible in the following blocks:
         * scatter.
 
+    Within every class label, the colors are reordered so that the first color is given to the densest point.
+
     """
-    from scipy.stats import gaussian_kde
-    uilabels = np.unique(labels)
+    labels = np.asarray(labels)
+    colors = np.asarray(colors)
     density_colors = np.repeat('#ffffff', X.shape[0])
 
-    if (len(uilabels)!=len(labels)):
-        for label in uilabels:
-            idx = np.where(labels==label)[0]
-            if X.shape[1]==2:
-                xy = np.vstack([X[idx, 0], X[idx, 1]])
-            else:
-                xy = np.vstack([X[idx, 0], X[idx, 1], X[idx, 2]])
-
-            try:
-                # Compute density
-                z = gaussian_kde(xy)(xy)
-                # Sort on density
-                didx = idx[np.argsort(z)[::-1]]
-            except:
-                didx=idx
-
+    if (len(np.unique(labels))!=len(labels)):
+        z = density(X, labels, method=method, grid_size=grid_size, logger=logger)
+        for idx in _groups(labels):
+            # Sort on density
+            didx = idx[np.argsort(z[idx])[::-1]] if np.all(np.isfinite(z[idx])) else idx
             # order colors correctly based Density
             density_colors[didx] = colors[idx]
-            # plt.figure()
-            # plt.scatter(X[didx,0], X[didx,1], color=colors[idx, :])
-            # plt.figure()
-            # plt.scatter(idx, idx, color=colors[idx, :])
         colors = density_colors
 
     # Return
     return colors
 
 
+def density_opacity(X, labels, method='auto', grid_size=128, logger=None):
+    """Opacity based on the density within the class label.
+
+    Points in dense areas get opacity 1 and points in the least dense area get opacity 0. Classes for which the
+    density can not be determined are fully opaque.
+
+    Parameters
+    ----------
+    X : np.ndarray
+        Coordinates of the points.
+    labels : array-like
+        Class label of every point.
+    method, grid_size, logger
+        See density().
+
+    Returns
+    -------
+    np.ndarray
+        Opacity in the range [0, 1].
+
+    """
+    labels = np.asarray(labels)
+    opacity = np.ones(X.shape[0])
+    if len(np.unique(labels))==len(labels): return opacity
+
+    z = density(X, labels, method=method, grid_size=grid_size, logger=logger)
+    for idx in _groups(labels):
+        if not np.all(np.isfinite(z[idx])): continue
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weights = (z[idx] - np.min(z[idx])) / (np.max(z[idx]) - np.min(z[idx]))
+        weights[np.isnan(weights)] = 1
+        opacity[idx] = weights
+    return opacity
+
+
+def density(X, labels=None, method='auto', grid_size=128, logger=None):
+    """Estimate the density at every point within its class label.
+
+    Parameters
+    ----------
+    X : np.ndarray
+        Coordinates of the points, with 2 or 3 columns.
+    labels : array-like, (default: None)
+        Class label of every point. None uses one class for all points.
+    method : str, (default: 'auto')
+        * 'exact': Gaussian kernel density estimate (scipy.stats.gaussian_kde). The costs are quadratic in the number of points.
+        * 'grid': The points are binned on a grid and convolved with the same Gaussian kernel using the FFT. The density is then interpolated at the points. The costs are linear in the number of points. Only for 2D coordinates.
+        * 'auto': 'exact' for classes up to DENSITY_EXACT_MAX points and 'grid' for larger classes.
+    grid_size : int, (default: 128)
+        Number of grid points per dimension for the 'grid' method. Larger grids are closer to the exact density.
+    logger : logger, (default: None)
+        Logger.
+
+    Returns
+    -------
+    np.ndarray
+        Density per point. NaN for the classes in which the density can not be determined, such as a single point
+        or points on a line.
+
+    """
+    if method not in ['auto', 'exact', 'grid']: raise Exception('density_method should be "auto", "exact" or "grid".')
+    X = np.asarray(X, dtype=float)
+    labels = np.repeat(0, X.shape[0]) if labels is None else np.asarray(labels)
+    z = np.full(X.shape[0], np.nan)
+
+    for idx in _groups(labels):
+        xy = np.ascontiguousarray(X[idx, :].T)
+        use_grid = (xy.shape[0]==2) and ((method=='grid') or (method=='auto' and len(idx) > DENSITY_EXACT_MAX))
+        try:
+            if use_grid:
+                z[idx] = _density_grid(xy, grid_size)
+            else:
+                from scipy.stats import gaussian_kde
+                z[idx] = gaussian_kde(xy)(xy)
+        except (np.linalg.LinAlgError, ValueError) as e:
+            if logger is not None: logger.warning('Density can not be determined for class [%s] with %d points: %s' %(labels[idx[0]], len(idx), e))
+    return z
+
+
+def _groups(labels):
+    """Positions of the points per class label, in ascending order."""
+    codes, _ = pd.factorize(labels, use_na_sentinel=False)
+    order = np.argsort(codes, kind='stable')
+    return np.split(order, np.cumsum(np.bincount(codes))[:-1])
+
+
+def _density_grid(xy, grid_size=128):
+    """Gaussian kernel density with linear binning on a grid and FFT convolution.
+
+    The bandwidth is the same as for scipy.stats.gaussian_kde (Scott's rule on the full covariance).
+
+    """
+    d, n = xy.shape
+    if n <= d: raise ValueError('Number of points should be larger than the number of dimensions.')
+    # Kernel covariance and normalization.
+    cov = np.atleast_2d(np.cov(xy)) * n ** (-2. / (d + 4))
+    if not np.linalg.det(cov) > 0: raise np.linalg.LinAlgError('The covariance matrix of the points is singular.')
+    inv = np.linalg.inv(cov)
+    norm = 1. / (2 * np.pi * np.sqrt(np.linalg.det(cov)))
+
+    # Linear binning: every point is divided over the four surrounding grid points.
+    lo, hi = xy.min(axis=1), xy.max(axis=1)
+    step = (hi - lo) / (grid_size - 1)
+    pos = (xy - lo[:, None]) / step[:, None]
+    i0 = np.clip(np.floor(pos).astype(np.int64), 0, grid_size - 2)
+    frac = pos - i0
+    corners = [((i0[0] + a) * grid_size + (i0[1] + b), (frac[0] if a else 1 - frac[0]) * (frac[1] if b else 1 - frac[1])) for a in [0, 1] for b in [0, 1]]
+    counts = np.zeros(grid_size * grid_size)
+    for flat, weight in corners:
+        counts += np.bincount(flat, weights=weight, minlength=grid_size * grid_size)
+    counts = counts.reshape(grid_size, grid_size)
+
+    # Kernel at all grid offsets.
+    offsets = np.arange(-(grid_size - 1), grid_size)
+    dx, dy = np.meshgrid(offsets * step[0], offsets * step[1], indexing='ij')
+    kernel = norm * np.exp(-0.5 * (inv[0, 0] * dx**2 + 2 * inv[0, 1] * dx * dy + inv[1, 1] * dy**2))
+
+    # Linear convolution with the FFT and keep the part that overlaps with the grid.
+    shape = [2 * grid_size + kernel.shape[0] - 1] * 2
+    full = np.fft.irfft2(np.fft.rfft2(counts, shape) * np.fft.rfft2(kernel, shape), shape)
+    grid = np.maximum(full[grid_size - 1:2 * grid_size - 1, grid_size - 1:2 * grid_size - 1], 0).ravel() / n
+
+    # Bilinear interpolation of the density at the points.
+    return sum(grid[flat] * weight for flat, weight in corners)
+
+
 # %% Pre processing
+@profile_stage('pre_processing')
 def pre_processing(df, labels=['source', 'target'], clean_source_target=False, logger=None):
     """Pre-processing of the input dataframe.
 
@@ -728,7 +1137,7 @@ def pre_processing(df, labels=['source', 'target'], clean_source_target=False, l
 
         for label in labels:
             # Convert NumPy types to regular Python types for proper JSON serialization
-            df[label] = df[label].apply(str)
+            df[label] = map_unique(str, df[label])
     else:
         if isinstance(df, list):
             df = np.array(df)
@@ -757,30 +1166,43 @@ def remove_quotes(df):
     """
     if isinstance(df, pd.DataFrame):
         Iloc = df.dtypes==object
-        df.loc[:, Iloc] = df.loc[:, Iloc].apply(lambda s: s.str.replace("'", ""))
+        df.loc[:, Iloc] = df.loc[:, Iloc].apply(_remove_quotes_series)
         try:
             if not pd.api.types.is_numeric_dtype(df.index):
-                df.columns = np.array(list(map(lambda x: x.replace("'", ""), df.columns)))
+                df.columns = np.array(map_unique(_remove_quotes, df.columns))
             if not pd.api.types.is_numeric_dtype(df.index):
-                df.index = np.array(list(map(lambda x: x.replace("'", ""), df.index)))
+                df.index = np.array(map_unique(_remove_quotes, df.index))
             if np.all(np.isin(['source', 'target'], df.columns.values)):
-                df['source'] = list(map(lambda x: x.replace("'", ""), df['source']))
-                df['target'] = list(map(lambda x: x.replace("'", ""), df['target']))
+                df['source'] = map_unique(_remove_quotes, df['source'])
+                df['target'] = map_unique(_remove_quotes, df['target'])
         except:
             pass
         return df
     else:
-        return np.array(list(map(lambda x: x.replace("'", ""), df)))
+        return np.array(map_unique(_remove_quotes, df))
+
+
+def _remove_quotes(x):
+    return x.replace("'", "")
+
+
+def _remove_quotes_series(s):
+    if _is_unique_mappable(s.to_numpy(dtype=object)):
+        return pd.Series(map_unique(_remove_quotes, s), index=s.index, dtype=object)
+    # Non-string values become NaN.
+    return s.str.replace("'", "")
 
 
 # %% Remove special characters from column names
 def trim_spaces(df):
     """Trim spaces at the start and end of strings in the 'source' and 'target' columns."""
     if isinstance(df, pd.DataFrame):
-        if df.get('source', None) is not None:
-            df['source'] = df['source'].str.strip()
-        if df.get('target', None) is not None:
-            df['target'] = df['target'].str.strip()
+        for label in ['source', 'target']:
+            if df.get(label, None) is not None:
+                if (not isinstance(df[label].dtype, pd.CategoricalDtype)) and _is_unique_mappable(df[label].to_numpy(dtype=object)):
+                    df[label] = pd.array(map_unique(str.strip, df[label]), dtype=df[label].dtype)
+                else:
+                    df[label] = df[label].str.strip()
     return df
 
 
@@ -799,32 +1221,146 @@ def remove_special_chars(df, clean_source_target=False):
     """
     if isinstance(df, pd.DataFrame):
         # Convert NumPy types to regular Python types for proper JSON serialization
-        df.columns = clean_text([str(x) for x in df.columns.values])
-        df.index = clean_text([str(x) for x in df.index.values])
+        df.columns = map_unique(_clean_str, df.columns.values)
+        # Integers do not contain characters that are cleaned.
+        if pd.api.types.is_integer_dtype(df.index):
+            df.index = df.index.astype(str)
+        else:
+            df.index = map_unique(_clean_str, df.index.values)
         # df.columns = list(map(lambda x: unicodedata.normalize('NFD', x).encode('ascii', 'ignore').decode("utf-8").replace(' ', '_'), df.columns.values.astype(str)))
         # df.index = list(map(lambda x: unicodedata.normalize('NFD', x).encode('ascii', 'ignore').decode("utf-8").replace(' ', '_'), df.index.values.astype(str)))
 
     if isinstance(df, pd.DataFrame) and clean_source_target:
         if df.get('source', None) is not None:
             # Convert NumPy types to regular Python types for proper JSON serialization
-            df['source'] = clean_text([str(x) for x in df['source'].values])
+            df['source'] = map_unique(_clean_str, df['source'].values)
         if df.get('target', None) is not None:
             # Convert NumPy types to regular Python types for proper JSON serialization
-            df['target'] = clean_text([str(x) for x in df['target'].values])
+            df['target'] = map_unique(_clean_str, df['target'].values)
 
     return df
 
 
 # %% Remove special characters from column names
 def clean_text(X):
-    return list(map(lambda x: unicodedata.normalize('NFD', x).encode('ascii', 'ignore').decode("utf-8").replace(' ', '_'), X))
+    return map_unique(_clean_text, X)
+
+
+def _clean_text(x):
+    return unicodedata.normalize('NFD', x).encode('ascii', 'ignore').decode("utf-8").replace(' ', '_')
+
+
+def _clean_str(x):
+    return _clean_text(str(x))
+
+
+def _is_unique_mappable(values):
+    # Only strings and integers are safe: values such as 1, 1.0 and True are equal but have a different str().
+    return (values.dtype.kind in 'iuU') or (values.dtype == object and pd.api.types.infer_dtype(values, skipna=False) == 'string')
+
+
+def map_unique(func, values):
+    """Apply the function once per distinct value.
+
+    Labels are repeated many times in source-target data. The distinct values are mapped and the results are reused
+    for every occurrence.
+
+    Parameters
+    ----------
+    func : function
+        Function that is applied to a single value.
+    values : array-like
+        Values.
+
+    Returns
+    -------
+    list
+        func(value) for every value, in the original order.
+
+    """
+    # Series and Index are converted with to_numpy() because np.asarray() probes attributes that search the index.
+    array = values.to_numpy() if isinstance(values, (pd.Series, pd.Index)) else np.asarray(values)
+    if array.dtype.kind not in 'iuU': array = array.astype(object)
+    if (array.size == 0) or (not _is_unique_mappable(array)):
+        return list(map(func, values))
+    codes, uniques = pd.factorize(array)
+    mapped = np.empty(len(uniques), dtype=object)
+    mapped[:] = list(map(func, uniques))
+    return mapped[codes].tolist()
+
+
+# %% Memory budget
+_MEMORY_UNITS = {'b': 1, 'kb': 1024, 'mb': 1024**2, 'gb': 1024**3, 'tb': 1024**4}
+
+
+def parse_memory(max_memory):
+    """Convert the memory budget into bytes.
+
+    Parameters
+    ----------
+    max_memory : int, float or str
+        Number of bytes or a string with a unit, such as '500MB' or '2GB'. None means no budget.
+
+    Returns
+    -------
+    int or None
+
+    """
+    if max_memory is None: return None
+    if isinstance(max_memory, str):
+        value = max_memory.strip().lower().replace(' ', '')
+        unit = value.lstrip('0123456789.')
+        number = value[:len(value) - len(unit)]
+        if unit + 'b' in _MEMORY_UNITS: unit = unit + 'b'
+        if (number == '') or (unit not in _MEMORY_UNITS):
+            raise Exception('max_memory [%s] is not valid. Use the number of bytes or a string such as "500MB" or "2GB".' %(max_memory))
+        return int(float(number) * _MEMORY_UNITS[unit])
+    return int(max_memory)
+
+
+def data_size(*objects):
+    """Estimate the number of bytes of DataFrames, Series and arrays. Other objects are not counted."""
+    nbytes = 0
+    for obj in objects:
+        if isinstance(obj, pd.DataFrame):
+            nbytes += int(obj.memory_usage(index=True, deep=True).sum())
+        elif isinstance(obj, pd.Series):
+            nbytes += int(obj.memory_usage(index=True, deep=True))
+        elif isinstance(obj, np.ndarray):
+            nbytes += obj.nbytes
+    return nbytes
+
+
+def check_memory(nbytes, max_memory, what, hint='', logger=None):
+    """Raise an error when the estimated memory exceeds the budget.
+
+    Parameters
+    ----------
+    nbytes : int
+        Estimated number of bytes.
+    max_memory : int, str or None
+        Memory budget (see parse_memory). None means no budget.
+    what : str
+        Description of what needs the memory, used in the error message.
+    hint : str, (default: '')
+        Suggestion that is added to the error message.
+    logger : logging.Logger, optional
+        A logger object to output log messages (optional)
+
+    """
+    budget = parse_memory(max_memory)
+    if budget is None: return
+    if logger is not None: logger.debug('Estimated memory of %s: %.1f MB (max_memory: %.1f MB)' %(what, nbytes / 1024**2, budget / 1024**2))
+    if nbytes > budget:
+        raise Exception('The estimated memory of %s is %.1f MB which exceeds max_memory (%.1f MB). Reduce the data or increase max_memory.%s' %(what, nbytes / 1024**2, budget / 1024**2, hint))
 
 
 def write_html_file(config, html, logger):
     """Write html file.
 
     This function writes an HTML file specified in the config dictionary to the file path specified in the 'filepath' key of the config dictionary.
-    If the 'overwrite' key of the config dictionary is set to True and the file already exists, the file will be overwritten.
+    The html is first written to a temporary file in the same directory that atomically replaces the existing file.
+    Readers therefore never see a partially written file and no delay is required when the file is overwritten.
     If a logger object is provided, log messages will be output to the logger.
 
     Parameters
@@ -843,16 +1379,76 @@ def write_html_file(config, html, logger):
     -------
     None
     """
-    index_file = config['filepath']
-    if index_file:
+    if config['filepath']:
+        _write_atomic(config, [html], logger)
+
 
-        if config['overwrite'] and os.path.isfile(index_file):
-            if (logger is not None): logger.info('File already exists and will be overwritten: [%s]' %(index_file))
-            os.remove(index_file)
-            time.sleep(0.5)
+def write_html_stream(config, template, content, logger):
+    """Render the template and stream the html to disk.
 
-        with open(index_file, "w", encoding="utf-8") as f:
-            f.write(html)
+    The chunks of template.generate() are directly written to a temporary file in the target directory, which
+    atomically replaces the existing file. The full html is only kept in memory when it needs to be returned.
+
+    Parameters
+    ----------
+    config : dict
+        A dictionary containing the following keys:
+            'filepath': (str) The file path to write the HTML file to. The html is only rendered when None.
+            'overwrite': (bool) If true, existing file will be overwritten.
+            'notebook': (bool) If true, the html is always returned.
+            'return_html': (bool, default: True) If false, the html is not kept in memory and None is returned.
+            'max_memory': (int or str, default: None) Raise an error before rendering when the html would exceed this number of bytes.
+    template : jinja2.Template
+        Compiled template.
+    content : dict
+        Variables that are passed to the template.
+    logger : logging.Logger, optional
+        A logger object to output log messages (optional)
+
+    Returns
+    -------
+    html : str or None
+
+    """
+    keep_html = (not config['filepath']) or config.get('return_html', True) or config.get('notebook', False)
+    if config.get('max_memory', None) is not None:
+        # The html is about the size of the content. Kept html is stored twice: as chunks and as the joined string.
+        nbytes = sum(len(value) for value in content.values() if isinstance(value, str))
+        hint = ' The html is not kept in memory when it is written to disk with return_html=False.' if keep_html and config['filepath'] else ''
+        check_memory(nbytes * (2 if keep_html else 1), config['max_memory'], 'the rendered html', hint=hint, logger=logger)
+
+    if not config['filepath']:
+        with stage('render'):
+            return template.render(content)
+
+    chunks = [] if keep_html else None
+    _write_atomic(config, timed_iter('render', template.generate(content)), logger, keep=chunks)
+    return ''.join(chunks) if keep_html else None
+
+
+@profile_stage('write')
+def _write_atomic(config, chunks, logger, keep=None):
+    """Write the chunks of text to a temporary file that replaces the filepath."""
+    index_file = config['filepath']
+    if config['overwrite'] and os.path.isfile(index_file):
+        if (logger is not None): logger.info('File already exists and will be overwritten: [%s]' %(index_file))
+
+    tmpfile = '%s.%s.tmp' %(index_file, uuid.uuid4().hex[:12])
+    try:
+        try:
+            f = open(tmpfile, "x", encoding="utf-8", buffering=1 << 16)
+        except FileNotFoundError:
+            # The directory is removed after set_path().
+            os.makedirs(os.path.dirname(os.path.abspath(tmpfile)), exist_ok=True)
+            f = open(tmpfile, "x", encoding="utf-8", buffering=1 << 16)
+        with f:
+            for chunk in chunks:
+                f.write(chunk)
+                if keep is not None: keep.append(chunk)
+        os.replace(tmpfile, index_file)
+    except BaseException:
+        if os.path.isfile(tmpfile): os.remove(tmpfile)
+        raise
 
 
 def get_support(support):
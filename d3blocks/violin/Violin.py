@@ -7,17 +7,21 @@ Github      : https://github.com/d3blocks/d3blocks
 Licensed    : GPL3
 """
 
-import colourmap
 import numpy as np
 import pandas as pd
-from jinja2 import Environment, PackageLoader
 from pathlib import Path
 import os
 import time
 try:
-    from .. utils import convert_dataframe_dict, set_path, update_config, write_html_file, include_save_to_svg_script
+    from .. utils import convert_dataframe_dict, set_path, update_config, write_html_stream, include_save_to_svg_script
+    from .. render import get_template, write_assets
+    from .. colors import fromlist
+    from .. profiler import profile_stage
 except:
-    from utils import convert_dataframe_dict, set_path, update_config, write_html_file, include_save_to_svg_script
+    from utils import convert_dataframe_dict, set_path, update_config, write_html_stream, include_save_to_svg_script
+    from render import get_template, write_assets
+    from colors import fromlist
+    from profiler import profile_stage
 
 
 # %% Set configuration properties
@@ -26,7 +30,7 @@ def set_config(config={}, **kwargs):
     logger = kwargs.get('logger', None)
     config['chart'] ='violin'
     config['title'] = kwargs.get('title', 'Violin - D3blocks')
-    config['filepath'] = set_path(kwargs.get('filepath', 'violin.html'), logger)
+    config['filepath'] = set_path(kwargs.get('filepath', 'violin.html'), logger, unique=config.get('unique_filename', False))
     config['figsize'] = kwargs.get('figsize', [None, None])
     config['showfig'] = kwargs.get('showfig', True)
     config['overwrite'] = kwargs.get('overwrite', True)
@@ -160,7 +164,7 @@ def set_edge_properties(*args, **kwargs):
 
     # Color on values and cmap (after cleaning and filtering)
     if color is None:
-        df['color'] = colourmap.fromlist(df['y'].values, scheme='hex', cmap=cmap)[0]
+        df['color'] = fromlist(df['y'].values, cmap=cmap)
 
     df.reset_index(inplace=True, drop=True)
     if logger is not None: logger.info('Number of samples: %d' %(df.shape[0]))
@@ -272,22 +276,18 @@ def write_html(X, config, logger=None):
         'SAVE_TO_SVG_SCRIPT': save_script,
         'SAVE_BUTTON_START': show_save_button[0],
         'SAVE_BUTTON_STOP': show_save_button[1],
+        'ASSETS': write_assets('violin', config, logger=logger),
     }
 
-    try:
-        jinja_env = Environment(loader=PackageLoader(package_name=__name__, package_path='d3js'))
-    except:
-        jinja_env = Environment(loader=PackageLoader(package_name='d3blocks.violin', package_path='d3js'))
+    index_template = get_template('violin', 'violin.html.j2')
 
-    index_template = jinja_env.get_template('violin.html.j2')
-
-    # Generate html content
-    html = index_template.render(content)
-    write_html_file(config, html, logger)
+    # Generate html content and stream it to disk
+    html = write_html_stream(config, index_template, content, logger)
     # Return html
     return html
 
 
+@profile_stage('get_data_ready_for_d3')
 def get_data_ready_for_d3(df):
     """Convert the source-target data into d3 compatible data.
 